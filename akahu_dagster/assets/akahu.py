@@ -39,7 +39,41 @@ def _get_accounts() -> List[Dict[str, Any]]:
     return data.get("items") or data.get("result") or []
 
 
-@dlt.resource(name="accounts", write_disposition="merge", primary_key="_id")
+# Column type hints so dlt writes typed columns instead of inferring them from
+# the first payload it sees (which left some loan fields as text and forced the
+# staging models to cast on every read). Nested `meta.loan_details.*` fields are
+# hinted by their flattened names. DECIMAL(18, 3) matches the `numeric` type the
+# dbt models use for amounts, so the staging casts are no-ops on new loads.
+# Interest rates get their own scale (the staging model casts to the same type)
+# rather than being truncated to three decimal places.
+_MONEY = {"data_type": "decimal", "precision": 18, "scale": 3}
+_RATE = {"data_type": "decimal", "precision": 18, "scale": 6}
+_TIMESTAMP = {"data_type": "timestamp"}
+
+ACCOUNT_COLUMN_HINTS: Dict[str, Dict[str, Any]] = {
+    "meta__loan_details__interest__rate": _RATE,
+    "meta__loan_details__interest__expires_at": _TIMESTAMP,
+    "meta__loan_details__is_interest_only": {"data_type": "bool"},
+    "meta__loan_details__term__years": {"data_type": "bigint"},
+    "meta__loan_details__term__months": {"data_type": "bigint"},
+    "meta__loan_details__matures_at": _TIMESTAMP,
+    "meta__loan_details__initial_principal": _MONEY,
+    "meta__loan_details__repayment__next_date": _TIMESTAMP,
+    "meta__loan_details__repayment__next_amount": _MONEY,
+}
+
+BALANCE_COLUMN_HINTS: Dict[str, Dict[str, Any]] = {
+    "snapshot_at": _TIMESTAMP,
+    "snapshot_date": {"data_type": "date"},
+    "current": _MONEY,
+    "available": _MONEY,
+    "limit": _MONEY,
+    "overdrawn": {"data_type": "bool"},
+    "refreshed_balance_at": _TIMESTAMP,
+}
+
+
+@dlt.resource(name="accounts", write_disposition="merge", primary_key="_id", columns=ACCOUNT_COLUMN_HINTS)
 def akahu_accounts() -> Iterator[Dict[str, Any]]:
     """
     Loads Akahu accounts metadata (merged on Akahu account _id).
@@ -88,6 +122,7 @@ def akahu_accounts() -> Iterator[Dict[str, Any]]:
     name="account_balances",
     write_disposition="merge",
     primary_key=("account_id", "snapshot_date"),
+    columns=BALANCE_COLUMN_HINTS,
 )
 def akahu_account_balances(account: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
     """
@@ -1,7 +1,7 @@
 from pathlib import Path
 
 from dagster_dbt import DbtCliResource, dbt_assets, DbtProject, DagsterDbtTranslator
-from dagster import AssetExecutionContext, AssetKey
+from dagster import AssetExecutionContext, AssetKey, Config
 
 DBT_PROJECT_DIR = Path(__file__).joinpath("..", "..", "..", "dbt_project").resolve()
 dbt_project = DbtProject(project_dir=DBT_PROJECT_DIR)
@@ -81,10 +81,16 @@ if manifest_path.exists():
         # separate tuple for every source found in the manifest.
         source_assets.append((name, _src_asset))
 
+    class DbtBuildConfig(Config):
+        # The fct_* models are incremental; set this in the run config to
+        # rebuild them from all raw history (needed after schema changes).
+        full_refresh: bool = False
+
     @dbt_assets(manifest=manifest_path, dagster_dbt_translator=translator)
-    def dbt_models(context: AssetExecutionContext, dbt: DbtCliResource):
+    def dbt_models(context: AssetExecutionContext, dbt: DbtCliResource, config: DbtBuildConfig):
         # Stream the dbt build output (this runs models in dependency order).
-        yield from dbt.cli(["build"], context=context).stream()
+        args = ["build", "--full-refresh"] if config.full_refresh else ["build"]
+        yield from dbt.cli(args, context=context).stream()
 
     # Export both the dbt-generated assets and the synthetic source assets so
     # Dagster discovers them together when this module is imported.
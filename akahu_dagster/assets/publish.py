@@ -0,0 +1,171 @@
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from typing import List, Optional
+
+import duckdb
+from dagster import AssetExecutionContext, AssetKey, asset
+
+# The pipeline database written by dlt and dbt (see akahu.py / profiles.yml).
+SOURCE_DB_PATH = os.environ.get("DUCKDB_PATH") or "/data/akahu.duckdb"
+
+# Published snapshots live next to the pipeline database unless overridden:
+#   <snapshot dir>/<version>/akahu.duckdb   one immutable copy per publish
+#   <snapshot dir>/current -> <version>     symlink swapped atomically
+# The dashboard resolves `current/akahu.duckdb` first, so it never opens the
+# file the pipeline is writing to.
+SNAPSHOT_DIR = os.environ.get("DUCKDB_SNAPSHOT_DIR") or os.path.join(os.path.dirname(SOURCE_DB_PATH), "snapshots")
+SNAPSHOT_DB_NAME = "akahu.duckdb"
+CURRENT_LINK = "current"
+KEEP_SNAPSHOTS = 3
+
+# Written after a successful run (see definitions.py); the dashboard watches it
+# to drop its caches and precompute the hot payloads for the new data.
+DATA_VERSION_SENTINEL = os.environ.get("DATA_VERSION_SENTINEL") or os.path.join(
+    os.path.dirname(SOURCE_DB_PATH), "data_version.json"
+)
+
+# Relations the dashboard reads: every mart plus the latest account metadata.
+PUBLISHED_MODELS = [
+    "stg_akahu_accounts",
+    "dim_loan_accounts",
+    "fct_account_daily_balances",
+    "fct_mortgage_over_time",
+    "fct_loan_kpis",
+    "fct_mortgage_over_time_weekly",
+    "fct_mortgage_over_time_monthly",
+    "fct_account_balances_weekly",
+    "fct_account_balances_monthly",
+]
+
+# Sort order each model is written in. DuckDB keeps min/max zone maps per row
+# group, so clustering on the filter columns lets the per-account and date-range
+# queries skip row groups. Incremental dbt runs append new dates at the end of
+# the table, so the snapshot re-sorts on every publish.
+CLUSTER_KEYS = {
+    "stg_akahu_accounts": ["account_id"],
+    "dim_loan_accounts": ["account_id"],
+    "fct_account_daily_balances": ["account_id", "snapshot_date"],
+    "fct_mortgage_over_time": ["snapshot_date"],
+    "fct_loan_kpis": ["snapshot_date"],
+    "fct_mortgage_over_time_weekly": ["snapshot_date"],
+    "fct_mortgage_over_time_monthly": ["snapshot_date"],
+    "fct_account_balances_weekly": ["account_id", "snapshot_date"],
+    "fct_account_balances_monthly": ["account_id", "snapshot_date"],
+}
+
+
+def _find_relations(conn: duckdb.DuckDBPyConnection, names: List[str], source_path: str) -> List[str]:
+    """Schema-qualified name for each model in `names` found in the source database."""
+    rows = conn.execute(
+        """
+        select table_name, table_schema
+        from information_schema.tables
+        where table_catalog = current_database() and table_name in (select unnest(?))
+        order by table_schema = 'main' desc, table_schema
+        """,
+        [names],
+    ).fetchall()
+    found = {}
+    for name, schema in rows:
+        found.setdefault(name, f'"{schema}"."{name}"')
+    missing = [n for n in names if n not in found]
+    if missing:
+        raise RuntimeError(f"Cannot publish snapshot: models not found in {source_path}: {', '.join(missing)}")
+    return [found[n] for n in names]
+
+
+def _prune(snapshot_dir: str, keep: int, current: str) -> None:
+    """Delete all but the newest `keep` snapshot versions (never the current one).
+
+    Readers still holding an older file open keep working: the file is only
+    unlinked, and its space is reclaimed once they close it.
+    """
+    versions = sorted(
+        d for d in os.listdir(snapshot_dir)
+        if not d.startswith(".") and d != CURRENT_LINK and os.path.isdir(os.path.join(snapshot_dir, d))
+    )
+    for d in versions[:-keep] if keep > 0 else []:
+        if d != current:
+            shutil.rmtree(os.path.join(snapshot_dir, d), ignore_errors=True)
+
+
+def publish_snapshot(
+    source_path: str = SOURCE_DB_PATH,
+    snapshot_dir: str = SNAPSHOT_DIR,
+    models: Optional[List[str]] = None,
+    keep: int = KEEP_SNAPSHOTS,
+) -> str:
+    """Copy the marts into a new DuckDB snapshot and point `current` at it.
+
+    The snapshot is written under a hidden temporary name, renamed into place
+    once complete, and only then published by replacing the `current` symlink
+    with os.replace (atomic on POSIX). Returns the published version.
+    """
+    models = models or PUBLISHED_MODELS
+    os.makedirs(snapshot_dir, exist_ok=True)
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%fZ")
+    tmp_dir = os.path.join(snapshot_dir, f".tmp-{version}")
+    os.makedirs(tmp_dir)
+    try:
+        conn = duckdb.connect()
+        try:
+            # Attach the source under its default catalog name (the file stem) so
+            # dbt views, which reference fully qualified names, still resolve.
+            conn.execute(f"attach '{source_path}' (read_only)")
+            conn.execute(f"use \"{os.path.splitext(os.path.basename(source_path))[0]}\"")
+            conn.execute(f"attach '{os.path.join(tmp_dir, SNAPSHOT_DB_NAME)}' as snapshot")
+            for name, relation in zip(models, _find_relations(conn, models, source_path)):
+                order_sql = f"order by {', '.join(CLUSTER_KEYS[name])}" if name in CLUSTER_KEYS else ""
+                conn.execute(f'create table snapshot.main."{name}" as select * from {relation} {order_sql}')
+            conn.execute("detach snapshot")
+        finally:
+            conn.close()
+        os.rename(tmp_dir, os.path.join(snapshot_dir, version))
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    link_tmp = os.path.join(snapshot_dir, f".{CURRENT_LINK}-{version}")
+    os.symlink(version, link_tmp)
+    os.replace(link_tmp, os.path.join(snapshot_dir, CURRENT_LINK))
+    _prune(snapshot_dir, keep, version)
+    return version
+
+
+def write_data_version_sentinel(
+    run_id: str,
+    path: str = DATA_VERSION_SENTINEL,
+    snapshot_dir: str = SNAPSHOT_DIR,
+) -> dict:
+    """Record the completed run and the snapshot it published in `path`.
+
+    Written to a temporary file and renamed over the old one, so readers never
+    see a partial sentinel. Returns what was written.
+    """
+    link = os.path.join(snapshot_dir, CURRENT_LINK)
+    sentinel = {
+        "run_id": run_id,
+        "snapshot_version": os.readlink(link) if os.path.islink(link) else None,
+        "completed_at": datetime.now(timezone.utc).isoformat(),
+    }
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = f"{path}.tmp-{run_id}"
+    with open(tmp, "w") as f:
+        json.dump(sentinel, f)
+    os.replace(tmp, path)
+    return sentinel
+
+
+@asset(
+    group_name="publish",
+    compute_kind="duckdb",
+    deps=[AssetKey(name) for name in PUBLISHED_MODELS],
+)
+def akahu_published_snapshot(context: AssetExecutionContext):
+    """
+    Publishes the dbt marts as a read-only DuckDB snapshot for the dashboard.
+    """
+    version = publish_snapshot()
+    context.log.info("Published snapshot %s to %s", version, os.path.join(SNAPSHOT_DIR, CURRENT_LINK))
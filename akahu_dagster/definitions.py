@@ -1,10 +1,20 @@
-from dagster import Definitions, load_assets_from_modules, define_asset_job, ScheduleDefinition
+from dagster import (
+    DagsterRunStatus,
+    DefaultSensorStatus,
+    Definitions,
+    RunStatusSensorContext,
+    ScheduleDefinition,
+    define_asset_job,
+    load_assets_from_modules,
+    run_status_sensor,
+)
 from dagster_dbt import DbtCliResource
 
-from .assets import akahu, dbt
+from .assets import akahu, dbt, publish
 
 akahu_assets = load_assets_from_modules([akahu])
 dbt_assets = load_assets_from_modules([dbt])
+publish_assets = load_assets_from_modules([publish])
 
 all_assets_job = define_asset_job(name="materialize_all_assets", selection="*")
 
@@ -16,11 +26,25 @@ daily_materialize_schedule = ScheduleDefinition(
     execution_timezone="UTC",
 )
 
+
+# Once a run has built (dbt) and published the marts, tell the dashboard: it
+# watches this sentinel, drops its cached payloads and precomputes the hot ones.
+@run_status_sensor(
+    run_status=DagsterRunStatus.SUCCESS,
+    monitored_jobs=[all_assets_job],
+    default_status=DefaultSensorStatus.RUNNING,
+)
+def data_version_sentinel(context: RunStatusSensorContext):
+    sentinel = publish.write_data_version_sentinel(context.dagster_run.run_id)
+    context.log.info("Wrote data version sentinel %s: %s", publish.DATA_VERSION_SENTINEL, sentinel)
+
+
 defs = Definitions(
-    assets=[*akahu_assets, *dbt_assets],
+    assets=[*akahu_assets, *dbt_assets, *publish_assets],
     resources={
         "dbt": DbtCliResource(project_dir=dbt.dbt_project),
     },
     jobs=[all_assets_job],
     schedules=[daily_materialize_schedule],
+    sensors=[data_version_sentinel],
 )
@@ -1,279 +1,1754 @@
+import contextvars
+import functools
+import hashlib
+import hmac
+import itertools
+import json
 import os
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import date, timedelta
+from urllib.parse import quote
+
 import duckdb
-from flask import Flask, jsonify, render_template
+from flask import Flask, Response, g, has_request_context, jsonify, make_response, render_template, request
 from dotenv import load_dotenv
 import logging
 
-# Configure basic logging
-logging.basicConfig(level=logging.DEBUG)
+from .amortization import FREQUENCIES, MAX_YEARS, evaluate_scenarios, loan_terms, project
+from .cache import ResponseCache, SharedCache
+from .downsample import parse_downsample_args, select_indices, to_x, to_y
+from .marts import MartBudget, MartCache, MartSnapshot
+from .montecarlo import SimulationRunner, loan_plan, parse_simulation_args
+from .tenants import TenantRegistry, valid_tenant_name
+from .formats import (ARROW_MIMETYPE, NDJSON_MIMETYPE, arrow_ipc_bytes, columnar_payload, dumps,
+                      grouped_columnar_payload, ndjson_chunks, parse_format, record_batch_reader)
 
 # Load environment variables from .env file.
 load_dotenv()
 
+
+def log_level(name):
+    """Return the numeric logging level called `name` (case-insensitive), or None if there is none."""
+    level = logging.getLevelName(str(name).strip().upper())
+    return level if isinstance(level, int) else None
+
+
+# Configure basic logging (LOG_LEVEL, INFO by default; an unknown name falls back to INFO)
+LOG_LEVEL = os.environ.get('LOG_LEVEL') or 'INFO'
+logging.basicConfig(level=logging.INFO if log_level(LOG_LEVEL) is None else log_level(LOG_LEVEL))
+if log_level(LOG_LEVEL) is None:
+    logging.warning(f"Unknown LOG_LEVEL {LOG_LEVEL!r}; using INFO")
+
 # Initialize the Flask app
 app = Flask(__name__)
 
 
 # --- Database Connection ---
-def get_db_connection():
-    """Establishes a connection to the database."""
-    # Try multiple likely locations for the DuckDB file:
-    # 1. Environment variable DUCKDB_PATH
-    # 2. repo-local ./data/akahu.duckdb (useful for local dev)
-    # 3. container-mounted /data/akahu.duckdb (default in docker-compose)
-    candidates = []
+def snapshot_dir(db_path=None):
+    """Directory the pipeline publishes read-only snapshots to.
+
+    DUCKDB_SNAPSHOT_DIR, or a `snapshots` directory next to the pipeline database.
+    For a tenant's database (`db_path`) always the directory next to it.
+    """
+    if db_path:
+        return os.path.join(os.path.dirname(db_path), 'snapshots')
+    env_dir = os.environ.get('DUCKDB_SNAPSHOT_DIR')
+    if env_dir:
+        return env_dir
+    return os.path.join(os.path.dirname(os.environ.get('DUCKDB_PATH') or '/data/akahu.duckdb'), 'snapshots')
+
+
+def db_candidates(db_path=None):
+    """Return the candidate DuckDB paths in priority order.
+
+    1. The latest published snapshot (<snapshot dir>/current/akahu.duckdb)
+    2. Environment variable DUCKDB_PATH
+    3. repo-local ./data/akahu.duckdb (useful for local dev)
+    4. container-mounted /data/akahu.duckdb (default in docker-compose)
+
+    Once the pipeline has published a snapshot the dashboard never opens the
+    file it writes to; the live database is only a fallback for fresh installs
+    and mock data. A tenant's database (`db_path`) has just its own snapshot
+    and live file as candidates.
+    """
+    if db_path:
+        return [os.path.join(snapshot_dir(db_path), 'current', 'akahu.duckdb'), db_path]
+    candidates = [os.path.join(snapshot_dir(), 'current', 'akahu.duckdb')]
     env_path = os.environ.get('DUCKDB_PATH')
     if env_path:
         candidates.append(env_path)
-    # repo-local data folder
-    repo_data = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'akahu.duckdb')
-    candidates.append(repo_data)
-    # system/container path
+    candidates.append(os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'akahu.duckdb'))
     candidates.append('/data/akahu.duckdb')
+    return candidates
+
+
+def find_existing_db_path(db_path=None):
+    """Return the first existing candidate path or None."""
+    for p in db_candidates(db_path):
+        if p and os.path.exists(p):
+            return p
+    return None
+
+
+def _file_signature(path):
+    """Identity of the file at `path`: changes when it is replaced or rewritten."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+
+class ConnectionPool:
+    """Process-wide pool of read-only DuckDB cursors.
+
+    The database path and schema prefix are resolved once, when the first
+    connection is opened. Cursors are handed out per request and returned
+    afterwards. At most every `check_interval` seconds a checkout compares
+    the file's inode/mtime against the one seen at open time.
+
+    The snapshot path goes through the `current` symlink, so publishing a new
+    snapshot changes the file's identity; the connection itself is opened on
+    the resolved path, so each snapshot version gets its own DuckDB instance.
+    The pool then opens the new snapshot straight away (re-running schema
+    detection) and retires the old connection, which is closed once the
+    cursors still reading it (say a long NDJSON stream) are handed back. A
+    live database replaced under the same resolved path cannot be opened twice
+    (DuckDB shares one instance per path), so for it the pool waits for
+    in-flight cursors to come back and then reopens.
+
+    `db_path` pins the pool to one tenant's database (see db_candidates); the
+    default follows DUCKDB_PATH. The detected schema prefix and relation names
+    are kept on the pool, per database.
 
-    for path in candidates:
+    All cursors share one underlying read-only connection, which holds a shared
+    file lock. The pool closes it after `idle_timeout` seconds without traffic
+    (checked by the process-wide IDLE_REAPER thread against the time the last
+    cursor came back) so the pipeline can take its write lock when the
+    dashboard is reading the live database. Published snapshots are never
+    written to, so a pool reading one keeps its cursors open (and warm)
+    however long it sits idle.
+    """
+
+    def __init__(self, size=4, timeout=10.0, idle_timeout=30.0, db_path=None, check_interval=1.0):
+        self.size = max(1, int(size))
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.check_interval = check_interval
+        self.db_path = db_path
+        self.path = None
+        self.schema_prefix = None
+        self.available_tables = frozenset()
+        self._base = None
+        self._signature = None
+        self._realpath = None
+        self._checked_at = None
+        self._stale = False
+        self._idle = []
+        self._in_use = 0
+        self._owner = {}  # id(checked-out cursor) -> the connection it came from
+        self._retired = {}  # id(old connection) -> [connection, cursors still checked out]
+        self._cond = threading.Condition()
+        self._released_at = None
+        self.closed = False
+
+    def _close_locked(self):
+        for cur in self._idle:
+            try:
+                cur.close()
+            except Exception:
+                pass
+        self._idle = []
+        if self._base is not None:
+            try:
+                self._base.close()
+            except Exception:
+                pass
+        self._base = None
+        self._signature = None
+        self._stale = False
+
+    def _open_locked(self):
+        path = find_existing_db_path(self.db_path)
+        if not path:
+            logging.error(f"Database connection failed: none of candidate paths exist: {db_candidates(self.db_path)}")
+            return False
+        try:
+            logging.debug(f"Opening DuckDB connection pool at {path}")
+            signature = _file_signature(path)
+            self._base = duckdb.connect(os.path.realpath(path), read_only=True)
+        except Exception as e:
+            logging.error(f"Database connection attempt to {path} failed: {e}")
+            return False
+        self.path = path
+        self._signature = signature
+        self._realpath = os.path.realpath(path)
+        self._checked_at = time.monotonic()
+        if self.idle_timeout:
+            IDLE_REAPER.watch(self)
+        # schema detection runs once per opened database file
+        self.schema_prefix = ''
+        self.available_tables = frozenset()
         try:
-            if path and os.path.exists(path):
-                logging.debug(f"Attempting to connect to DuckDB at {path}")
-                conn = duckdb.connect(path, read_only=True)
-                # detect schema once per successful connection
+            self.schema_prefix = detect_schema(self._base)
+            self.available_tables = detect_tables(self._base, self.schema_prefix)
+        except Exception:
+            # non-fatal: continue with default behavior
+            pass
+        return True
+
+    def _check_stale_locked(self):
+        """Whether the open database has been replaced, re-stat()ing at most every check_interval."""
+        if self._base is None:
+            return False
+        now = time.monotonic()
+        if not self._stale and (self._checked_at is None or now - self._checked_at >= self.check_interval):
+            self._checked_at = now
+            # a first snapshot published while reading the live database also counts
+            path = find_existing_db_path(self.db_path)
+            self._stale = path != self.path or _file_signature(self.path) != self._signature
+        return self._stale
+
+    def _retire_locked(self):
+        """Swap out a replaced database: close it now if unused, else once its cursors come back."""
+        base = self._base
+        outstanding = sum(1 for owner in self._owner.values() if owner is base)
+        if outstanding:
+            for cur in self._idle:
                 try:
-                    detect_schema(conn)
+                    cur.close()
                 except Exception:
-                    # non-fatal: continue with default behavior
                     pass
-                return conn
-        except Exception as e:
-            logging.error(f"Database connection attempt to {path} failed: {e}")
+            self._idle = []
+            self._retired[id(base)] = [base, outstanding]
+            self._base = None
+            self._signature = None
+            self._stale = False
+        else:
+            self._close_locked()
 
-    logging.error(f"Database connection failed: none of candidate paths exist: {candidates}")
-    return None
+    def _checkout_locked(self, cur):
+        self._in_use += 1
+        self._owner[id(cur)] = self._base
+        return cur
 
+    def acquire(self):
+        """Check out a cursor, or return None if the database is unavailable."""
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self.closed:
+                    return None
+                if self._check_stale_locked():
+                    moved = find_existing_db_path(self.db_path)
+                    if self._in_use == 0 or (moved and os.path.realpath(moved) != self._realpath):
+                        logging.info(f"DuckDB file {self.path} changed; reopening connection pool")
+                        self._retire_locked()
+                        continue
+                    # same file replaced in place: wait for in-flight requests to hand their cursors back
+                elif self._idle:
+                    return self._checkout_locked(self._idle.pop())
+                elif self._in_use < self.size:
+                    if self._base is None and not self._open_locked():
+                        return None
+                    try:
+                        cur = self._base.cursor()
+                    except Exception as e:
+                        logging.error(f"Failed to open DuckDB cursor: {e}")
+                        return None
+                    return self._checkout_locked(cur)
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    logging.error("Timed out waiting for a DuckDB connection from the pool")
+                    return None
+                self._cond.wait(remaining)
+
+    def release(self, cur, discard=False):
+        """Return a cursor to the pool (or close it when `discard` is set)."""
+        with self._cond:
+            self._in_use -= 1
+            owner = self._owner.pop(id(cur), None)
+            current = owner is not None and owner is self._base
+            if discard or not current or self.closed or self._stale:
+                try:
+                    cur.close()
+                except Exception:
+                    pass
+            else:
+                self._idle.append(cur)
+            retired = self._retired.get(id(owner)) if owner is not None else None
+            if retired is not None:
+                retired[1] -= 1
+                if retired[1] == 0:
+                    del self._retired[id(owner)]
+                    try:
+                        owner.close()
+                    except Exception:
+                        pass
+            if self._in_use == 0:
+                self._released_at = time.monotonic()
+                if self.closed:
+                    self._close_locked()
+            self._cond.notify_all()
+
+    def reading_snapshot(self):
+        return self.path is not None and self.path.startswith(os.path.join(snapshot_dir(self.db_path), ''))
+
+    def close_idle(self):
+        """Close the database if no cursor is checked out (releases the file lock)."""
+        with self._cond:
+            if self._in_use == 0:
+                self._close_locked()
+
+    def close_if_idle(self, now=None):
+        """close_idle() once no cursor has been checked out for idle_timeout seconds.
+
+        Called by IDLE_REAPER; a pool reading a published snapshot stays open.
+        """
+        now = time.monotonic() if now is None else now
+        with self._cond:
+            idle = (self.idle_timeout and self._in_use == 0 and self._released_at is not None
+                    and now - self._released_at >= self.idle_timeout)
+            if self._base is not None and idle and not self.reading_snapshot():
+                logging.debug(f"Closing idle DuckDB connection pool at {self.path}")
+                self._close_locked()
+
+    def close(self):
+        """Close the database for good: now, or once the last checked-out cursor is released.
+
+        Unlike close_idle(), a closed pool never reopens; acquire() returns None.
+        """
+        with self._cond:
+            self.closed = True
+            if self._in_use == 0:
+                self._close_locked()
+            self._cond.notify_all()
+
+    def busy(self):
+        return self._in_use > 0
+
+    def data_version(self):
+        """Token identifying the current contents of this pool's database (see data_version()).
+
+        While a database is open this is the version it was opened at (after
+        the throttled staleness check), so a payload is always cached under
+        the version of the connection that will compute it.
+        """
+        with self._cond:
+            sig = None
+            if self._base is not None and not self._check_stale_locked():
+                sig = self._signature
+        if sig is None:
+            path = find_existing_db_path(self.db_path)
+            sig = _file_signature(path) if path else None
+        if sig is None:
+            return None
+        return '-'.join(str(p) for p in sig)
+
+
+class IdleReaper:
+    """One daemon thread that closes every watched pool idle for longer than its idle_timeout.
+
+    Pools register when they open a database and are held weakly, so a
+    discarded tenant's pool simply drops out.
+    """
+
+    def __init__(self, interval=1.0):
+        self.interval = interval
+        self._pools = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def watch(self, pool):
+        with self._lock:
+            self._pools.add(pool)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='duckdb-idle-reaper', daemon=True)
+                self._thread.start()
+
+    def reap(self):
+        with self._lock:
+            pools = list(self._pools)
+        for pool in pools:
+            pool.close_if_idle()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.reap()
+            except Exception as e:
+                logging.error(f"Idle pool reaper failed: {e}")
+
+
+def _env_float(name, default):
+    try:
+        return float(os.environ.get(name)) if os.environ.get(name) else default
+    except ValueError:
+        return default
 
-def find_existing_db_path():
-    """Return the first existing candidate path or None."""
-    env_path = os.environ.get('DUCKDB_PATH')
-    repo_data = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'akahu.duckdb')
-    candidates = [env_path] if env_path else []
-    candidates.append(repo_data)
-    candidates.append('/data/akahu.duckdb')
-    for p in candidates:
-        if p and os.path.exists(p):
-            return p
-    return None
 
+IDLE_REAPER = IdleReaper(interval=_env_float('DUCKDB_POOL_REAP_SECONDS', 1.0))
 
-# module-level chosen schema prefix ('' | 'dbt' | 'akahu')
-SCHEMA_PREFIX = None
+DB_POOL = ConnectionPool(
+    size=int(_env_float('DUCKDB_POOL_SIZE', 4)),
+    timeout=_env_float('DUCKDB_POOL_TIMEOUT', 10.0),
+    idle_timeout=_env_float('DUCKDB_POOL_IDLE_TIMEOUT', 30.0),
+    check_interval=_env_float('DUCKDB_POOL_CHECK_SECONDS', 1.0),
+)
+
+
+@contextmanager
+def db_connection():
+    """Check a pooled read-only cursor out for the duration of a request.
+
+    Yields None if no database could be opened. Cursors that raised are
+    discarded rather than returned to the pool. The pool is the current
+    tenant's (DB_POOL outside multi-tenant requests).
+    """
+    pool = current_tenant().pool
+    conn = pool.acquire()
+    try:
+        yield conn
+    except Exception:
+        if conn is not None:
+            pool.release(conn, discard=True)
+            conn = None
+        raise
+    finally:
+        if conn is not None:
+            pool.release(conn)
 
 
 def detect_schema(conn):
-    """Set the module-level SCHEMA_PREFIX to the first matching schema that contains our expected tables.
+    """The schema prefix ('' | 'dbt' | 'akahu') of the first schema that contains our expected tables.
 
     We check for 'dbt' then 'akahu' and fall back to empty string (no prefix).
     """
-    global SCHEMA_PREFIX
-    if SCHEMA_PREFIX is not None:
-        return SCHEMA_PREFIX
     try:
         cur = conn.cursor()
-        # check for dbt.fct_mortgage_over_time
-        cur.execute("select count(*) from information_schema.tables where table_schema = 'dbt' and table_name = 'fct_mortgage_over_time'")
-        row = cur.fetchone()
-        if row and row[0] and int(row[0]) > 0:
-            SCHEMA_PREFIX = 'dbt'
+        try:
+            for schema in ('dbt', 'akahu'):
+                cur.execute(
+                    "select count(*) from information_schema.tables where table_schema = ? and table_name = 'fct_mortgage_over_time'",
+                    [schema],
+                )
+                row = cur.fetchone()
+                if row and row[0] and int(row[0]) > 0:
+                    return schema
+        finally:
             cur.close()
-            return SCHEMA_PREFIX
+    except Exception:
+        # if anything goes wrong, use no prefix so unqualified names are used
+        pass
+    return ''
 
-        # check for akahu.fct_mortgage_over_time
-        cur.execute("select count(*) from information_schema.tables where table_schema = 'akahu' and table_name = 'fct_mortgage_over_time'")
-        row = cur.fetchone()
-        if row and row[0] and int(row[0]) > 0:
-            SCHEMA_PREFIX = 'akahu'
-            cur.close()
-            return SCHEMA_PREFIX
 
-        # fallback: no schema prefix
-        SCHEMA_PREFIX = ''
-        cur.close()
-        return SCHEMA_PREFIX
-    except Exception:
-        # if anything goes wrong, leave prefix as empty to let unqualified names be used
-        SCHEMA_PREFIX = ''
-        try:
-            cur.close()
-        except Exception:
-            pass
-        return SCHEMA_PREFIX
+def detect_tables(conn, prefix=''):
+    """Relation names in schema `prefix`; optional models (rollups) are only used when listed."""
+    rows = conn.execute(
+        "select table_name from information_schema.tables where table_schema = coalesce(nullif(?, ''), current_schema())",
+        [prefix or ''],
+    ).fetchall()
+    return frozenset(r[0] for r in rows)
 
 
 def table(name: str) -> str:
-    """Return a schema-qualified table name using detected SCHEMA_PREFIX.
+    """Return a schema-qualified table name using the schema prefix detected for the current tenant's database.
 
     Example: table('fct_mortgage_over_time') -> 'dbt.fct_mortgage_over_time' (if prefix is 'dbt')
     """
-    prefix = SCHEMA_PREFIX if SCHEMA_PREFIX is not None else ''
+    prefix = current_tenant().pool.schema_prefix or ''
     if prefix:
         return f"{prefix}.{name}"
     return name
 
 
+# --- Response cache ---
+def data_version():
+    """Token identifying the current contents of the DuckDB file, or None if there is no DB.
+
+    The pipeline rewrites the file on every load, so its inode/size/mtime change
+    exactly when a new `_dlt_load_id` lands. This costs one stat() per request.
+    Each tenant's database has its own version.
+    """
+    return current_tenant().pool.data_version()
+
+
+# RESPONSE_CACHE_PATH adds a second tier shared by every worker on the host
+# (see SharedCache); without it each process only has its own LRU.
+RESPONSE_CACHE = ResponseCache(
+    max_entries=int(_env_float('RESPONSE_CACHE_SIZE', 256)),
+    shared=SharedCache(
+        os.environ['RESPONSE_CACHE_PATH'], max_bytes=int(_env_float('RESPONSE_CACHE_MAX_MB', 256) * 2 ** 20),
+    ) if os.environ.get('RESPONSE_CACHE_PATH') else None,
+)
+
+
+def cache_key(path, args, tenant=None):
+    """RESPONSE_CACHE key for a request path and its query parameters (a MultiDict).
+
+    Keys of a named tenant start with its name, so tenants never share entries
+    in the shared tier.
+    """
+    key = (path, tuple(sorted(args.items(multi=True))))
+    return (tenant, *key) if tenant else key
+
+
+def cached_response(view):
+    """Serve a JSON view from RESPONSE_CACHE, with a strong ETag and 304 support.
+
+    The cache key is the request path plus its query parameters; entries are
+    scoped to the current data_version(). Only GET requests are cached, and
+    error or pending (202) responses never are. Each tenant has its own cache.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        tenant = current_tenant()
+        cache = tenant.cache
+        version = data_version()
+        if version is None or not cache.enabled or request.method != 'GET':
+            return view(*args, **kwargs)
+
+        key = cache_key(request.path, request.args, tenant.name)
+        entry = cache.get(key, version)
+        status = 'HIT'
+        if entry is None:
+            status = 'MISS'
+            resp = make_response(view(*args, **kwargs))
+            if resp.status_code != 200 or resp.is_streamed:
+                return resp
+            entry = cache.put(key, version, resp.get_data(), resp.mimetype)
+
+        body, etag, mimetype = entry
+        if request.if_none_match.contains(etag):
+            cache.record_not_modified()
+            resp = Response(status=304)
+        else:
+            resp = Response(body, mimetype=mimetype)
+        resp.set_etag(etag)
+        resp.headers['Cache-Control'] = 'no-cache'
+        resp.headers['X-Cache'] = status
+        return resp
+    return wrapper
+
+
+# --- Time-series query helpers ---
+GRANULARITIES = ('day', 'week', 'month')
+
+
+def parse_series_args(args):
+    """Validate the `granularity`, `from` and `to` query parameters.
+
+    Returns (granularity, date_from, date_to); the dates are `datetime.date` or
+    None. Raises ValueError with a client-facing message on bad input.
+    """
+    granularity = (args.get('granularity') or 'day').lower()
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+    bounds = []
+    for name in ('from', 'to'):
+        raw = args.get(name)
+        try:
+            bounds.append(date.fromisoformat(raw) if raw else None)
+        except ValueError:
+            raise ValueError(f"'{name}' must be an ISO date (YYYY-MM-DD)") from None
+    date_from, date_to = bounds
+    if date_from and date_to and date_from > date_to:
+        raise ValueError("'from' must not be after 'to'")
+    return granularity, date_from, date_to
+
+
+def series_sql(source, columns, granularity='day', date_from=None, date_to=None, filters=(), params=(), partition_by=()):
+    """Build a snapshot_date-ordered query over `source`, bucketed by `granularity`.
+
+    Week and month buckets keep the last daily row in each bucket (the same
+    "closing balance" semantics the chart used to apply in the browser), so the
+    returned snapshot_date is the last observed day of the bucket. `filters` are
+    extra SQL predicates whose placeholders are bound by `params`. Rows are
+    bucketed and ordered within each `partition_by` group (e.g. account_id).
+    Returns (sql, params).
+    """
+    where = list(filters)
+    params = list(params)
+    if date_from:
+        where.append('snapshot_date >= ?')
+        params.append(date_from)
+    if date_to:
+        where.append('snapshot_date <= ?')
+        params.append(date_to)
+    where_sql = f"where {' and '.join(where)}" if where else ''
+    qualify_sql = ''
+    if granularity != 'day':
+        partition = ', '.join([*partition_by, f"date_trunc('{granularity}', snapshot_date)"])
+        qualify_sql = f"qualify row_number() over (partition by {partition} order by snapshot_date desc) = 1"
+    sql = f"""
+        select {', '.join(columns)}
+        from {source}
+        {where_sql}
+        {qualify_sql}
+        order by {', '.join([*partition_by, 'snapshot_date'])}
+    """
+    return sql, params
+
+
+# Precomputed week/month rollups of the daily marts (built by dbt). Each row is
+# the last day of its bucket, so it matches what series_sql's bucketing returns.
+ROLLUPS = {
+    'fct_mortgage_over_time': {'week': 'fct_mortgage_over_time_weekly', 'month': 'fct_mortgage_over_time_monthly'},
+    'fct_account_daily_balances': {'week': 'fct_account_balances_weekly', 'month': 'fct_account_balances_monthly'},
+}
+
+
+def _bucket_start(d, granularity):
+    return d - timedelta(days=d.weekday()) if granularity == 'week' else d.replace(day=1)
+
+
+def series_source(model, granularity, date_from=None, date_to=None):
+    """(source, granularity) to pass to series_sql for a daily `model`.
+
+    Uses the model's rollup at `granularity` when it has been built and the
+    range only cuts at bucket boundaries (a bucket clipped by `from`/`to` has a
+    different last day than the precomputed one); otherwise buckets the daily
+    rows at query time.
+    """
+    rollup = ROLLUPS.get(model, {}).get(granularity)
+    if rollup and rollup in current_tenant().pool.available_tables:
+        aligned_from = date_from is None or _bucket_start(date_from, granularity) == date_from
+        aligned_to = date_to is None or _bucket_start(date_to + timedelta(days=1), granularity) == date_to + timedelta(days=1)
+        if aligned_from and aligned_to:
+            return table(rollup), 'day'
+    return table(model), granularity
+
+
+# --- Queries ---
+# Each takes an open connection and returns plain Python data, so a single
+# request can combine several of them on one pooled cursor.
+BALANCE_COLUMNS = ['snapshot_date', 'current_balance', 'available_balance', 'credit_limit', 'currency']
+OVERALL_COLUMNS = ['snapshot_date', 'total_mortgage_balance', 'total_creditcard_balance',
+                   'total_net_debt', 'total_available', 'total_limit']
+
+
+def _fetch_dicts(cur):
+    cols = [d[0] for d in cur.description]
+    return [dict(zip(cols, r)) for r in cur.fetchall()]
+
+
+# Columns the charts plot; downsampling preserves the shape of each of them.
+OVERALL_CHART_COLUMNS = ['total_mortgage_balance', 'total_creditcard_balance', 'total_net_debt']
+BALANCE_CHART_COLUMNS = ['current_balance']
+
+
+def parse_chart_args(args, y_columns, fmt='json'):
+    """Return a (y_columns, max_points, method) downsampling spec, or None when `max_points` is absent."""
+    max_points, method = parse_downsample_args(args)
+    if max_points is None:
+        return None
+    if fmt not in ('json', 'columnar'):
+        raise ValueError(f"max_points is not supported with format={fmt}")
+    return y_columns, max_points, method
+
+
+def downsample_rows(rows, y_columns, max_points, method):
+    """Downsample a list of row dicts ordered by snapshot_date."""
+    if not max_points or len(rows) <= max_points:
+        return rows
+    x = to_x([r['snapshot_date'] for r in rows])
+    idx = select_indices(x, [to_y([r[c] for r in rows]) for c in y_columns], max_points, method)
+    return [rows[i] for i in idx]
+
+
+def downsample_columns(columns, y_columns, max_points, method):
+    """Downsample a {column: [values]} series, applying one row selection to every column."""
+    dates = columns['snapshot_date']
+    if not max_points or len(dates) <= max_points:
+        return columns
+    idx = select_indices(to_x(dates), [to_y(columns[c]) for c in y_columns], max_points, method)
+    return {name: [values[i] for i in idx] for name, values in columns.items()}
+
+
+def render_result(cur, fmt, chart=None):
+    """Encode an executed cursor as a response in the requested `format`.
+
+    json: list of row objects (the original shape); columnar: one array per
+    column plus DuckDB types; arrow: Arrow IPC stream. `chart` is an optional
+    downsampling spec from parse_chart_args().
+    """
+    if fmt == 'arrow':
+        return Response(arrow_ipc_bytes(cur), mimetype=ARROW_MIMETYPE)
+    if fmt == 'columnar':
+        payload = columnar_payload(cur)
+        if chart and payload['row_count']:
+            payload['columns'] = downsample_columns(payload['columns'], *chart)
+            payload['row_count'] = len(payload['columns']['snapshot_date'])
+        return Response(dumps(payload), mimetype='application/json')
+    rows = _fetch_dicts(cur)
+    if chart:
+        rows = downsample_rows(rows, *chart)
+    return jsonify(rows)
+
+
+STREAM_BATCH_ROWS = int(_env_float('STREAM_BATCH_ROWS', 10000))
+
+
+def stream_result(build):
+    """Stream the query `build()` returns as (sql, params) as NDJSON, `STREAM_BATCH_ROWS` rows at a time.
+
+    The query is built only once the cursor is checked out, since table() and
+    series_source() depend on the schema and tables detected when the pool
+    (re)opens. The cursor stays checked out until Werkzeug closes the response
+    (body fully sent or client gone), so it cannot be used via db_connection().
+    """
+    pool = current_tenant().pool
+    conn = pool.acquire()
+    if conn is None:
+        return jsonify({"error": "Database connection failed"}), 500
+    try:
+        sql, params = build()
+        reader = record_batch_reader(conn.execute(sql, params), STREAM_BATCH_ROWS)
+    except Exception as e:
+        pool.release(conn)
+        logging.error(f"Error starting streamed query: {e}")
+        return jsonify({"error": "Failed to query database."}), 500
+    resp = Response(ndjson_chunks(reader), mimetype=NDJSON_MIMETYPE)
+    resp.call_on_close(lambda: pool.release(conn))
+    return resp
+
+
+def accounts_sql():
+    # Query from staging to get ALL accounts, then get latest version per account
+    return f"""
+        with latest as (
+            select *,
+                row_number() over (partition by account_id order by _dlt_load_id desc) as rn
+            from {table('stg_akahu_accounts')}
+        )
+        select account_id, account_name, account_type, is_credit_card, status,
+            loan_interest_rate, loan_interest_type, loan_interest_expires_at,
+            is_interest_only, term_years, term_months,
+            loan_matures_at, loan_initial_principal,
+            repayment_frequency, repayment_next_date, repayment_next_amount
+        from latest
+        where rn = 1
+        order by account_name
+    """
+
+
+def accounts_cursor(conn):
+    return conn.cursor('accounts') if isinstance(conn, MartSnapshot) else conn.execute(accounts_sql())
+
+
+def query_accounts(conn):
+    """Latest version of every account (loans, credit cards and others)."""
+    return _fetch_dicts(accounts_cursor(conn))
+
+
+def overall_series_sql(granularity='day', date_from=None, date_to=None):
+    source, granularity = series_source('fct_mortgage_over_time', granularity, date_from, date_to)
+    return series_sql(source, OVERALL_COLUMNS, granularity, date_from, date_to)
+
+
+def overall_series_cursor(conn, granularity='day', date_from=None, date_to=None):
+    if isinstance(conn, MartSnapshot):
+        return conn.series('overall', OVERALL_COLUMNS, granularity, date_from, date_to)
+    return conn.execute(*overall_series_sql(granularity, date_from, date_to))
+
+
+def query_overall_series(conn, granularity='day', date_from=None, date_to=None, chart=None):
+    """Rows of fct_mortgage_over_time, optionally bucketed, range-filtered and downsampled."""
+    rows = _fetch_dicts(overall_series_cursor(conn, granularity, date_from, date_to))
+    return downsample_rows(rows, *chart) if chart else rows
+
+
+def account_series_sql(account_ids=None, granularity='day', date_from=None, date_to=None):
+    """(sql, params) for balances of `account_ids` (None means all), ordered by account_id."""
+    filters, params = [], []
+    if account_ids:
+        filters.append(f"account_id in ({', '.join('?' for _ in account_ids)})")
+        params.extend(account_ids)
+    source, granularity = series_source('fct_account_daily_balances', granularity, date_from, date_to)
+    return series_sql(
+        source,
+        ['account_id', *BALANCE_COLUMNS],
+        granularity, date_from, date_to,
+        filters=filters, params=params, partition_by=['account_id'],
+    )
+
+
+def account_series_cursor(conn, account_ids=None, granularity='day', date_from=None, date_to=None, columns=None):
+    """Balances of `account_ids` (None means all) ordered by account_id, snapshot_date.
+
+    `columns` defaults to account_id plus BALANCE_COLUMNS.
+    """
+    columns = columns or ['account_id', *BALANCE_COLUMNS]
+    if isinstance(conn, MartSnapshot):
+        return conn.series('balances', columns, granularity, date_from, date_to, account_ids)
+    if columns[0] == 'account_id':
+        return conn.execute(*account_series_sql(account_ids, granularity, date_from, date_to))
+    source, granularity = series_source('fct_account_daily_balances', granularity, date_from, date_to)
+    return conn.execute(*series_sql(
+        source, columns, granularity, date_from, date_to,
+        filters=[f"account_id in ({', '.join('?' for _ in account_ids)})"], params=list(account_ids),
+    ))
+
+
+def query_account_series(conn, account_ids=None, granularity='day', date_from=None, date_to=None, chart=None):
+    """Balances for `account_ids` (None means all) from one scan, as {account_id: {column: [values]}}.
+
+    `chart` is an optional downsampling spec applied to each account's series.
+    """
+    accounts = {}
+    cur = account_series_cursor(conn, account_ids, granularity, date_from, date_to)
+    for account_id, rows in itertools.groupby(cur.fetchall(), key=lambda r: r[0]):
+        columns = list(zip(*(r[1:] for r in rows)))
+        accounts[account_id] = {c: list(v) for c, v in zip(BALANCE_COLUMNS, columns)}
+        if chart:
+            accounts[account_id] = downsample_columns(accounts[account_id], *chart)
+    return accounts
+
+
+KPI_COLUMNS = ['total_net_debt', 'monthly_change', 'weighted_interest_rate']
+
+
+def kpis_sql():
+    return f"""
+        select {', '.join(KPI_COLUMNS)}
+        from {table('fct_loan_kpis')}
+        order by snapshot_date desc
+        limit 1
+    """
+
+
+def query_kpis(conn):
+    """Latest row of the fct_loan_kpis mart (built by dbt once per pipeline run)."""
+    cur = conn.cursor('kpis') if isinstance(conn, MartSnapshot) else conn.execute(kpis_sql())
+    row = cur.fetchone()
+    if not row:
+        return {"total_net_debt": 0, "monthly_change": 0, "weighted_interest_rate": None}
+    return dict(zip(KPI_COLUMNS, row))
+
+
+LOAN_COLUMNS = ['account_id', 'account_name', 'current_balance', 'snapshot_date', 'loan_interest_rate',
+                'loan_interest_type', 'loan_interest_expires_at', 'is_interest_only', 'loan_matures_at', 'repayment_frequency',
+                'repayment_next_date', 'repayment_next_amount']
+
+
+def loans_sql():
+    return f"""
+        with latest as (
+            select account_id, max(snapshot_date) as snapshot_date, arg_max(current_balance, snapshot_date) as current_balance
+            from {table('fct_account_daily_balances')}
+            group by account_id
+        )
+        select {', '.join(f'l.{c}' if c not in ('current_balance', 'snapshot_date') else f'b.{c}' for c in LOAN_COLUMNS)}
+        from {table('dim_loan_accounts')} l
+        join latest b using (account_id)
+        order by l.account_id
+    """
+
+
+def query_loans(conn):
+    """Loans from dim_loan_accounts with their latest balance, the inputs for projections."""
+    cur = conn.cursor('loans') if isinstance(conn, MartSnapshot) else conn.execute(loans_sql())
+    return _fetch_dicts(cur)
+
+
+# --- In-memory marts ---
+def mart_queries():
+    """What MART_CACHE keeps in memory: the tables behind the accounts, balances, series and KPI endpoints."""
+    return {
+        'accounts': accounts_sql(),
+        'overall': f"select {', '.join(OVERALL_COLUMNS)} from {table('fct_mortgage_over_time')} order by snapshot_date",
+        'balances': f"""
+            select account_id, {', '.join(BALANCE_COLUMNS)}
+            from {table('fct_account_daily_balances')}
+            order by account_id, snapshot_date
+        """,
+        'kpis': kpis_sql(),
+        'loans': loans_sql(),
+    }
+
+
+def _load_marts(version):
+    with db_connection() as conn:
+        return MartSnapshot.load(conn, version, mart_queries()) if conn else None
+
+
+# MART_CACHE_MAX_MB caps one database's marts; MART_CACHE_TOTAL_MB caps all
+# tenants' marts together in this process.
+MART_BUDGET = MartBudget(max_bytes=int(_env_float('MART_CACHE_TOTAL_MB', 1024) * 2 ** 20))
+
+MARTS = MartCache(
+    _load_marts,
+    enabled=os.environ.get('MART_CACHE', '0').lower() in ('1', 'true', 'yes'),
+    max_bytes=int(_env_float('MART_CACHE_MAX_MB', 512) * 2 ** 20),
+    budget=MART_BUDGET,
+)
+
+
+# --- Tenants ---
+# With TENANTS_DIR set, every request must name its tenant in TENANT_HEADER
+# and prove it with TENANT_SIGNATURE_HEADER, the hex HMAC-SHA256 of the name
+# under TENANT_SECRET. Both are set by the reverse proxy that authenticates
+# the household, so a client cannot pick another household's database. The
+# request is then served from <TENANTS_DIR>/<tenant>/akahu.duckdb (or the
+# snapshots published next to it) with that tenant's own pool, schema prefix,
+# data version and caches. Without TENANTS_DIR every request reads the single
+# database configured above.
+TENANTS_DIR = os.environ.get('TENANTS_DIR')
+TENANT_HEADER = os.environ.get('TENANT_HEADER', 'X-Tenant')
+TENANT_SIGNATURE_HEADER = os.environ.get('TENANT_SIGNATURE_HEADER', 'X-Tenant-Signature')
+TENANT_SECRET = os.environ.get('TENANT_SECRET', '')
+# probes and static files answer without a tenant
+TENANT_EXEMPT_ENDPOINTS = frozenset({'live', 'ready', 'health', 'static'})
+if TENANTS_DIR and not TENANT_SECRET:
+    logging.error("TENANTS_DIR is set without TENANT_SECRET: every tenant request will be rejected")
+
+
+class Tenant:
+    """One household's database: its connection pool, response cache and mart cache."""
+
+    def __init__(self, name, pool, cache, marts):
+        self.name = name
+        self.pool = pool
+        self.cache = cache
+        self.marts = marts
+
+    def busy(self):
+        return self.pool.busy()
+
+    @property
+    def closed(self):
+        return self.pool.closed
+
+    def close(self):
+        """Release the database and drop the in-memory caches (the shared tier keeps its entries).
+
+        The pool is closed for good, so a request that resolved this tenant
+        before it was evicted cannot reopen (and leak) its database; see
+        current_tenant().
+        """
+        self.pool.close()
+        self.cache.clear()
+        self.marts.clear()
+
+
+DEFAULT_TENANT = Tenant(None, DB_POOL, RESPONSE_CACHE, MARTS)
+_ACTIVE_TENANT = contextvars.ContextVar('tenant', default=None)
+
+
+def current_tenant():
+    """The tenant of the current `for_tenant` call or request; DEFAULT_TENANT otherwise.
+
+    A tenant evicted since it was resolved is looked up again in the registry,
+    which reopens it as a new Tenant.
+    """
+    tenant = _ACTIVE_TENANT.get() or (g.get('tenant') if has_request_context() else None) or DEFAULT_TENANT
+    if tenant.closed:
+        tenant = tenant_for(tenant.name) or tenant
+    return tenant
+
+
+def for_tenant(tenant, fn, *args):
+    """Call `fn(*args)` with `tenant` as the current tenant (for work outside a request)."""
+    token = _ACTIVE_TENANT.set(tenant)
+    try:
+        return fn(*args)
+    finally:
+        _ACTIVE_TENANT.reset(token)
+
+
+def open_tenant(name):
+    """A Tenant for <TENANTS_DIR>/<name>/akahu.duckdb, or None if it has no database."""
+    if not TENANTS_DIR or not valid_tenant_name(name):
+        return None
+    db_path = os.path.join(TENANTS_DIR, name, 'akahu.duckdb')
+    if find_existing_db_path(db_path) is None:
+        return None
+    return Tenant(
+        name,
+        ConnectionPool(
+            size=int(_env_float('TENANT_POOL_SIZE', 2)),
+            timeout=DB_POOL.timeout,
+            idle_timeout=DB_POOL.idle_timeout,
+            db_path=db_path,
+            check_interval=DB_POOL.check_interval,
+        ),
+        ResponseCache(max_entries=int(_env_float('TENANT_CACHE_SIZE', 64)), shared=RESPONSE_CACHE.shared),
+        MartCache(_load_marts, enabled=MARTS.enabled, max_bytes=MARTS.max_bytes, budget=MART_BUDGET),
+    )
+
+
+TENANTS = TenantRegistry(
+    open_tenant,
+    max_open=int(_env_float('TENANT_MAX_OPEN', 64)),
+    idle_timeout=_env_float('TENANT_IDLE_SECONDS', 300.0),
+)
+
+
+def tenant_for(name):
+    """The tenant called `name` (None or '' means the default one); None if unknown.
+
+    Does no authentication: `name` must come from authenticate_tenant().
+    """
+    if not name or not TENANTS_DIR:
+        return DEFAULT_TENANT
+    return TENANTS.get(name)
+
+
+def tenant_signature(name, secret=None):
+    """What the authenticating proxy sends in TENANT_SIGNATURE_HEADER for tenant `name`."""
+    key = (TENANT_SECRET if secret is None else secret).encode()
+    return hmac.new(key, name.encode(), hashlib.sha256).hexdigest()
+
+
+def authenticate_tenant(name, signature):
+    """(tenant, None) for a request's tenant headers, or (None, (status, error)) to reject it.
+
+    Without TENANTS_DIR every request gets the default database. With it the
+    tenant is required and must carry a valid signature; the default database
+    is not served to requests then (nor is anything, if TENANT_SECRET is unset).
+    """
+    if not TENANTS_DIR:
+        return DEFAULT_TENANT, None
+    if not (name and signature and TENANT_SECRET) or not hmac.compare_digest(signature, tenant_signature(name)):
+        return None, (401, "Missing or unauthenticated tenant")
+    tenant = TENANTS.get(name)
+    if tenant is None:
+        return None, (404, "Unknown tenant")
+    return tenant, None
+
+
+@app.before_request
+def resolve_tenant():
+    if request.endpoint in TENANT_EXEMPT_ENDPOINTS:
+        return None
+    tenant, error = authenticate_tenant(request.headers.get(TENANT_HEADER), request.headers.get(TENANT_SIGNATURE_HEADER))
+    if tenant is None:
+        status, message = error
+        return jsonify({"error": message}), status
+    g.tenant = tenant
+
+
+@contextmanager
+def read_connection():
+    """Source for the query functions above: the in-memory marts when MART_CACHE
+    holds the current data version, otherwise a pooled DuckDB cursor (or None).
+    """
+    marts = current_tenant().marts.get(data_version())
+    if marts is not None:
+        yield marts
+        return
+    with db_connection() as conn:
+        yield conn
+
+
+def stream_marts(cur):
+    """NDJSON response from an in-memory result (see stream_result)."""
+    return Response(ndjson_chunks(record_batch_reader(cur, STREAM_BATCH_ROWS)), mimetype=NDJSON_MIMETYPE)
+
+
+def parse_projection_args(args):
+    """Validate `years` (projection horizon) and `schedule` (0 omits per-period rows)."""
+    raw = args.get('years')
+    try:
+        years = int(raw) if raw else MAX_YEARS
+    except ValueError:
+        raise ValueError("years must be an integer") from None
+    if not 1 <= years <= MAX_YEARS:
+        raise ValueError(f"years must be between 1 and {MAX_YEARS}")
+    return years, args.get('schedule', '1') != '0'
+
+
+MAX_SCENARIOS = 5000
+
+
+def _list_arg(args, name):
+    """Comma-separated (or repeated) query parameter as a list of strings."""
+    return [v.strip() for raw in args.getlist(name) for v in raw.split(',') if v.strip()]
+
+
+def parse_scenario_args(args):
+    """Validate the scenario axes; returns the keyword arguments for evaluate_scenarios.
+
+    Each axis is a comma-separated list; an omitted axis means "no change".
+    `refix_rate` and `frequency` accept `current` to keep the loan's own value.
+    """
+    def amounts(name):
+        try:
+            values = [float(v) for v in _list_arg(args, name)] or [0.0]
+        except ValueError:
+            raise ValueError(f"{name} must be a comma-separated list of numbers") from None
+        if any(v < 0 for v in values):
+            raise ValueError(f"{name} must not be negative")
+        return values
+
+    try:
+        rates = [None if v == 'current' else float(v) for v in _list_arg(args, 'refix_rate')] or [None]
+    except ValueError:
+        raise ValueError("refix_rate must be a comma-separated list of annual rates in percent (or 'current')") from None
+    frequencies = [None if v.lower() == 'current' else v.lower() for v in _list_arg(args, 'frequency')] or [None]
+    unknown = [f for f in frequencies if f is not None and f not in FREQUENCIES]
+    if unknown:
+        raise ValueError(f"frequency must be one of {', '.join(FREQUENCIES)} or current")
+    axes = {'extra': amounts('extra'), 'lump_sum': amounts('lump_sum'), 'refix_rate': rates, 'frequency': frequencies}
+    size = 1
+    for values in axes.values():
+        size *= len(values)
+    if size > MAX_SCENARIOS:
+        raise ValueError(f"at most {MAX_SCENARIOS} scenarios per request (got {size})")
+    return axes
+
+
+def is_fixed_rate(loan):
+    """Whether a loan refixes: a fixed interest type or a known fixed-rate expiry."""
+    return (loan.get('loan_interest_type') or '').lower() == 'fixed' or loan.get('loan_interest_expires_at') is not None
+
+
+# Simulations run on a process pool shared by every request in this server
+# process; finished results are kept per (data version, loan, parameters).
+MONTE_CARLO = SimulationRunner(
+    max_workers=int(_env_float('MONTE_CARLO_WORKERS', 0)) or None,
+    max_results=int(_env_float('MONTE_CARLO_CACHE_SIZE', 32)),
+    max_jobs=int(_env_float('MONTE_CARLO_MAX_JOBS', 4)),
+    failure_ttl=_env_float('MONTE_CARLO_FAILURE_TTL', 300.0),
+)
+
+
 # --- Akahu finance APIs ---
 @app.route('/api/akahu/accounts')
+@cached_response
 def akahu_accounts():
-    """List all accounts (loans and credit cards) with details."""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            # Query from staging to get ALL accounts, then get latest version per account
-            cur.execute(f"""
-                with latest as (
-                    select *,
-                        row_number() over (partition by account_id order by _dlt_load_id desc) as rn
-                    from {table('stg_akahu_accounts')}
-                )
-                select account_id, account_name, account_type, is_credit_card, status,
-                    loan_interest_rate, loan_interest_type, loan_interest_expires_at,
-                    is_interest_only, term_years, term_months,
-                    loan_matures_at, loan_initial_principal,
-                    repayment_frequency, repayment_next_date, repayment_next_amount
-                from latest
-                where rn = 1
-                order by account_name
-            """)
-            cols = [d[0] for d in cur.description]
-            rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-            cur.close()
-            conn.close()
-            return jsonify(rows)
-        except Exception as e:
-            logging.error(f"Error fetching akahu accounts: {e}")
+    """List all accounts (loans and credit cards) with details.
+
+    `format=json|columnar|arrow` selects the encoding (see render_result).
+    """
+    try:
+        fmt = parse_format(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with read_connection() as conn:
+        if conn:
             try:
-                conn.close()
-            except Exception:
-                pass
-            return jsonify({"error": "Failed to query database."}), 500
+                return render_result(accounts_cursor(conn), fmt)
+            except Exception as e:
+                logging.error(f"Error fetching akahu accounts: {e}")
+                return jsonify({"error": "Failed to query database."}), 500
+    return jsonify({"error": "Database connection failed"}), 500
+
+
+@app.route('/api/akahu/account_balances')
+@cached_response
+def akahu_account_balances_bulk():
+    """Balances for many accounts in one scan, as a columnar payload per account.
+
+    `account_ids` is a comma-separated list (or repeated parameter) of ids, or
+    `all` (the default). Also accepts `granularity`/`from`/`to`. Response shape:
+    {"accounts": {"<id>": {"snapshot_date": [...], "current_balance": [...], ...}}}
+    `format=columnar` builds the same shape from fetchnumpy() (ISO dates, plus a
+    "types" map); `format=arrow` returns one flat Arrow table with account_id.
+    `max_points` (with `downsample=lttb|minmax`) thins each account's series.
+    """
+    try:
+        granularity, date_from, date_to = parse_series_args(request.args)
+        fmt = parse_format(request.args)
+        chart = parse_chart_args(request.args, BALANCE_CHART_COLUMNS, fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    account_ids = [a for raw in request.args.getlist('account_ids') for a in raw.split(',') if a]
+    if 'all' in account_ids:
+        account_ids = []
+    with read_connection() as conn:
+        if conn:
+            try:
+                if fmt == 'json':
+                    accounts = query_account_series(conn, account_ids, granularity, date_from, date_to, chart)
+                    return jsonify({"accounts": accounts})
+                cur = account_series_cursor(conn, account_ids, granularity, date_from, date_to)
+                if fmt == 'arrow':
+                    return render_result(cur, fmt)
+                accounts, types = grouped_columnar_payload(cur, 'account_id')
+                if chart:
+                    accounts = {a: downsample_columns(cols, *chart) for a, cols in accounts.items()}
+                return Response(dumps({"accounts": accounts, "types": types}), mimetype='application/json')
+            except Exception as e:
+                logging.error(f"Error fetching akahu account balances: {e}")
+                return jsonify({"error": "Failed to query database."}), 500
     return jsonify({"error": "Database connection failed"}), 500
 
 
 @app.route('/api/akahu/account_balances/<account_id>')
+@cached_response
 def akahu_account_balances(account_id: str):
-    """Daily balances for a specific account."""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
+    """Daily balances for a specific account.
+
+    Optional query parameters: `granularity` (day|week|month, last value per
+    bucket), an inclusive `from`/`to` snapshot_date range and `format`.
+    `format=ndjson` streams one row per line without buffering the history.
+    `max_points` (with `downsample=lttb|minmax`) thins the series for charting.
+    """
+    try:
+        granularity, date_from, date_to = parse_series_args(request.args)
+        fmt = parse_format(request.args, streaming=True)
+        chart = parse_chart_args(request.args, BALANCE_CHART_COLUMNS, fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if fmt == 'ndjson':
+        marts = current_tenant().marts.get(data_version())
+        if marts is not None:
+            return stream_marts(account_series_cursor(marts, [account_id], granularity, date_from, date_to, BALANCE_COLUMNS))
+
+        def build():
             # Use '?' parameter style for duckdb
-            cur.execute(f"""
-                select snapshot_date, current_balance, available_balance, credit_limit, currency
-                from {table('fct_account_daily_balances')}
-                where account_id = ?
-                order by snapshot_date
-            """, (account_id,))
-            cols = [d[0] for d in cur.description]
-            rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-            cur.close()
-            conn.close()
-            return jsonify(rows)
-        except Exception as e:
-            logging.error(f"Error fetching akahu account balances: {e}")
+            source, series_granularity = series_source('fct_account_daily_balances', granularity, date_from, date_to)
+            return series_sql(
+                source,
+                BALANCE_COLUMNS,
+                series_granularity, date_from, date_to,
+                filters=['account_id = ?'], params=[account_id],
+            )
+        return stream_result(build)
+    with read_connection() as conn:
+        if conn:
             try:
-                conn.close()
-            except Exception:
-                pass
-            return jsonify({"error": "Failed to query database."}), 500
+                cur = account_series_cursor(conn, [account_id], granularity, date_from, date_to, BALANCE_COLUMNS)
+                return render_result(cur, fmt, chart)
+            except Exception as e:
+                logging.error(f"Error fetching akahu account balances: {e}")
+                return jsonify({"error": "Failed to query database."}), 500
     return jsonify({"error": "Database connection failed"}), 500
 
 
 @app.route('/api/akahu/mortgage_over_time')
+@cached_response
 def akahu_mortgage_over_time():
-    """Aggregated mortgage balance over time (sum over LOAN accounts)."""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute(f"""
-                select snapshot_date,
-                       total_mortgage_balance,
-                       total_creditcard_balance,
-                       total_net_debt,
-                       total_available,
-                       total_limit
-                from {table('fct_mortgage_over_time')}
-                order by snapshot_date
-            """)
-            cols = [d[0] for d in cur.description]
-            rows = [dict(zip(cols, r)) for r in cur.fetchall()]
-            cur.close()
-            conn.close()
-            return jsonify(rows)
-        except Exception as e:
-            logging.error(f"Error fetching akahu mortgage over time: {e}")
+    """Aggregated mortgage balance over time (sum over LOAN accounts).
+
+    Accepts the same `granularity`/`from`/`to`/`format`/`max_points` parameters
+    as account_balances.
+    """
+    try:
+        granularity, date_from, date_to = parse_series_args(request.args)
+        fmt = parse_format(request.args, streaming=True)
+        chart = parse_chart_args(request.args, OVERALL_CHART_COLUMNS, fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if fmt == 'ndjson':
+        marts = current_tenant().marts.get(data_version())
+        if marts is not None:
+            return stream_marts(overall_series_cursor(marts, granularity, date_from, date_to))
+        return stream_result(lambda: overall_series_sql(granularity, date_from, date_to))
+    with read_connection() as conn:
+        if conn:
             try:
-                conn.close()
-            except Exception:
-                pass
-            return jsonify({"error": "Failed to query database."}), 500
+                return render_result(overall_series_cursor(conn, granularity, date_from, date_to), fmt, chart)
+            except Exception as e:
+                logging.error(f"Error fetching akahu mortgage over time: {e}")
+                return jsonify({"error": "Failed to query database."}), 500
     return jsonify({"error": "Database connection failed"}), 500
 
 
 @app.route('/api/akahu/loan_kpis')
+@cached_response
 def akahu_loan_kpis():
     """KPI summary: total net-debt (mortgage + credit cards), change vs previous month, weighted interest rate on loans."""
-    conn = get_db_connection()
-    if conn:
-        try:
-            cur = conn.cursor()
-            cur.execute(f"""
-                with latest_date as (
-                    select max(snapshot_date) as d from {table('fct_mortgage_over_time')}
-                ), prev_date as (
-                    select max(snapshot_date) as d
-                    from {table('fct_mortgage_over_time')}, latest_date
-                    where snapshot_date < date_trunc('month', (select d from latest_date))
-                ), curr as (
-                    select total_net_debt from {table('fct_mortgage_over_time')}
-                    where snapshot_date = (select d from latest_date)
-                ), prev as (
-                    select total_net_debt from {table('fct_mortgage_over_time')}
-                    where snapshot_date = (select d from prev_date)
-                ), latest_bal as (
-                    select distinct on (account_id)
-                           account_id, current_balance
-                    from {table('fct_account_daily_balances')}
-                    where upper(coalesce(account_type,'')) = 'LOAN' and coalesce(is_credit_card,false) = false
-                    order by account_id, snapshot_date desc, _dlt_load_id desc, last_snapshot_at desc
-                ), weighted as (
-                    select
-                      sum(abs(b.current_balance)) as total_balance_pos,
-                      case when sum(abs(b.current_balance)) > 0
-                           then sum((l.loan_interest_rate)::numeric * abs(b.current_balance)) / sum(abs(b.current_balance))
-                           else null end as weighted_rate
-                    from {table('dim_loan_accounts')} l
-                    join latest_bal b using (account_id)
+    with read_connection() as conn:
+        if conn:
+            try:
+                return jsonify(query_kpis(conn))
+            except Exception as e:
+                logging.error(f"Error fetching akahu loan KPIs: {e}")
+                return jsonify({"error": "Failed to query KPIs."}), 500
+    return jsonify({"error": "Database connection failed"}), 500
+
+
+@app.route('/api/akahu/loan_kpis/history')
+@cached_response
+def akahu_loan_kpis_history():
+    """KPI history from fct_loan_kpis, one row per snapshot_date.
+
+    Accepts `granularity`/`from`/`to`/`format`/`max_points` like mortgage_over_time.
+    """
+    try:
+        granularity, date_from, date_to = parse_series_args(request.args)
+        fmt = parse_format(request.args)
+        chart = parse_chart_args(request.args, ['total_net_debt'], fmt)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with db_connection() as conn:
+        if conn:
+            try:
+                sql, params = series_sql(
+                    table('fct_loan_kpis'),
+                    ['snapshot_date', *KPI_COLUMNS, 'total_loan_balance'],
+                    granularity, date_from, date_to,
                 )
-                select
-                  abs(coalesce((select total_net_debt from curr), 0)) as total_net_debt,
-                  abs(coalesce((select total_net_debt from curr), 0)) - abs(coalesce((select total_net_debt from prev), 0)) as monthly_change,
-                  (select weighted_rate from weighted) as weighted_interest_rate
-                """)
-            row = cur.fetchone()
-            cols = [d[0] for d in cur.description]
-            result = dict(zip(cols, row)) if row else {}
-            cur.close()
-            conn.close()
-            return jsonify(result)
-        except Exception as e:
-            logging.error(f"Error fetching akahu loan KPIs: {e}")
+                return render_result(conn.execute(sql, params), fmt, chart)
+            except Exception as e:
+                logging.error(f"Error fetching akahu loan KPI history: {e}")
+                return jsonify({"error": "Failed to query KPIs."}), 500
+    return jsonify({"error": "Database connection failed"}), 500
+
+
+@app.route('/api/akahu/projection')
+@cached_response
+def akahu_projection():
+    """Payoff projection for every loan from its latest balance.
+
+    Each loan gets its repayment, payoff date, remaining repayments and total
+    interest, plus the per-period schedule (date/balance/interest/principal
+    columns) unless `schedule=0`. `years` caps the horizon (default 50). All
+    loans are amortized together as one array computation (see amortization.py);
+    responses are cached per data version like every other endpoint.
+    """
+    try:
+        years, schedule = parse_projection_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    with read_connection() as conn:
+        if conn:
             try:
-                conn.close()
-            except Exception:
-                pass
-            return jsonify({"error": "Failed to query KPIs."}), 500
+                loans = query_loans(conn)
+                as_of = max((loan['snapshot_date'] for loan in loans), default=None)
+                return jsonify({
+                    "as_of": as_of.isoformat() if as_of else None,
+                    "loans": project(loans, as_of, years, schedule),
+                })
+            except Exception as e:
+                logging.error(f"Error projecting loans: {e}")
+                return jsonify({"error": "Failed to project loans."}), 500
     return jsonify({"error": "Database connection failed"}), 500
 
 
+@app.route('/api/akahu/scenarios')
+@cached_response
+def akahu_scenarios():
+    """What-if repayment scenarios, the whole grid evaluated as one batch.
+
+    Query parameters (comma-separated lists; every combination is evaluated):
+    `extra` (added to each repayment), `lump_sum` (paid off each loan now),
+    `refix_rate` (annual %, applied from `loan_interest_expires_at`) and
+    `frequency` (weekly|fortnightly|monthly|..., yearly repayments kept equal).
+    `account_ids` restricts the loans (default all), `years` caps the horizon.
+    Each scenario reports total interest, `interest_saved` and
+    `time_saved_days` (for the last loan to be repaid) against the baseline.
+    """
+    try:
+        axes = parse_scenario_args(request.args)
+        years, _ = parse_projection_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    account_ids = set(_list_arg(request.args, 'account_ids'))
+    with read_connection() as conn:
+        if conn:
+            try:
+                loans = [loan for loan in query_loans(conn) if not account_ids or loan['account_id'] in account_ids]
+                as_of = max((loan['snapshot_date'] for loan in loans), default=None)
+                baseline, scenarios = evaluate_scenarios(loans, as_of, years, **axes)
+                return jsonify({
+                    "as_of": as_of.isoformat() if as_of else None,
+                    "account_ids": [loan['account_id'] for loan in loans],
+                    "baseline": baseline,
+                    "scenarios": scenarios,
+                })
+            except Exception as e:
+                logging.error(f"Error evaluating scenarios: {e}")
+                return jsonify({"error": "Failed to evaluate scenarios."}), 500
+    return jsonify({"error": "Database connection failed"}), 500
+
+
+@app.route('/api/akahu/montecarlo/<account_id>', methods=['GET', 'DELETE'])
+@cached_response
+def akahu_montecarlo(account_id: str):
+    """Monte Carlo projection of a fixed-rate loan across its future refixes.
+
+    Query parameters: `mean`, `volatility` (annual %, mean defaults to the
+    loan's current rate), `reversion` (per year), `refix_years`, `paths`,
+    `seed` and `years`. The first request starts a job on the process pool
+    and returns 202 with its progress; poll the same URL until it returns 200
+    with percentile bands of total interest, payoff date and the rate and
+    repayment at each refix. Results are deterministic for a given seed.
+    DELETE cancels a running job. A failed simulation is reported (500) until
+    the parameters or the data version change, or MONTE_CARLO_FAILURE_TTL
+    passes. With MONTE_CARLO_MAX_JOBS jobs already running a new one gets 503.
+    """
+    try:
+        params = parse_simulation_args(request.args)
+        years, _ = parse_projection_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    key = (current_tenant().name, data_version(), account_id, years, tuple(sorted(params.items())))
+    if request.method == 'DELETE':
+        if not MONTE_CARLO.cancel(key):
+            return jsonify({"error": "No running simulation for these parameters"}), 404
+        return jsonify({"state": "cancelled"}), 200
+
+    status = MONTE_CARLO.status(key)
+    if status is None:
+        with read_connection() as conn:
+            if not conn:
+                return jsonify({"error": "Database connection failed"}), 500
+            try:
+                loans = [loan for loan in query_loans(conn) if loan['account_id'] == account_id]
+            except Exception as e:
+                logging.error(f"Error fetching loan {account_id}: {e}")
+                return jsonify({"error": "Failed to query database."}), 500
+        if not loans:
+            return jsonify({"error": f"Unknown loan: {account_id}"}), 404
+        if not is_fixed_rate(loans[0]):
+            return jsonify({"error": "Only fixed-rate loans refix; this loan is floating"}), 400
+        # drop this tenant's results computed against older data
+        MONTE_CARLO.clear(keep=lambda k: k[0] != key[0] or k[1] == key[1])
+        plan = loan_plan(loan_terms(loans), loans[0]['snapshot_date'], years)
+        status = MONTE_CARLO.submit(key, plan, params)
+        if status is None:
+            return jsonify({"error": "Too many simulations running; retry shortly"}), 503, {'Retry-After': '5'}
+
+    if status['state'] == 'done':
+        return jsonify({"account_id": account_id, "params": params, "years": years, **status['result']})
+    if status['state'] == 'failed':
+        # the exception was logged by the runner; it is not for clients
+        return jsonify({"error": "Simulation failed."}), 500
+    return jsonify({"state": status['state'], "progress": status['progress']}), 202
+
+
+@app.route('/api/akahu/dashboard')
+@cached_response
+def akahu_dashboard():
+    """Everything the mortgage page needs for first paint, from one pooled connection.
+
+    Returns the KPIs (one row from the fct_loan_kpis mart), the daily overall
+    series, the account list and (unless `include_balances=0`) every account's
+    series. `granularity`/`from`/`to`/`max_points` shape the
+    chart series: the per-account series and, when any of them is given,
+    `mortgage_over_time_chart` (`mortgage_over_time` stays complete and daily).
+    """
+    try:
+        granularity, date_from, date_to = parse_series_args(request.args)
+        overall_chart = parse_chart_args(request.args, OVERALL_CHART_COLUMNS)
+        balance_chart = parse_chart_args(request.args, BALANCE_CHART_COLUMNS)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    include_balances = request.args.get('include_balances', '1').lower() not in ('0', 'false', 'no')
+    with read_connection() as conn:
+        if conn:
+            try:
+                daily = query_overall_series(conn)
+                payload = {
+                    "ok": True,
+                    "latest_snapshot_date": str(daily[-1]['snapshot_date']) if daily else None,
+                    "kpis": query_kpis(conn),
+                    "mortgage_over_time": daily,
+                    "accounts": query_accounts(conn),
+                }
+                if granularity != 'day' or date_from or date_to:
+                    payload["mortgage_over_time_chart"] = query_overall_series(conn, granularity, date_from, date_to, overall_chart)
+                elif overall_chart:
+                    payload["mortgage_over_time_chart"] = downsample_rows(daily, *overall_chart)
+                if include_balances:
+                    payload["account_balances"] = query_account_series(conn, None, granularity, date_from, date_to, balance_chart)
+                return jsonify(payload)
+            except Exception as e:
+                logging.error(f"Error fetching akahu dashboard: {e}")
+                return jsonify({"error": "Failed to query database."}), 500
+    return jsonify({"error": "Database connection failed"}), 500
+
+
+def data_changes(since=None):
+    """The rows the mortgage page needs to catch up from `since` (a date, inclusive).
+
+    The overall and per-account series are daily and start at `since`, so a
+    client holding data up to that date replaces its last day (which a later
+    load may have revised) and appends the rest. None when there is no database.
+    """
+    with read_connection() as conn:
+        if not conn:
+            return None
+        overall = query_overall_series(conn, 'day', since)
+        return {
+            "data_version": data_version(),
+            "since": since.isoformat() if since else None,
+            "latest_snapshot_date": str(overall[-1]['snapshot_date']) if overall else None,
+            "kpis": query_kpis(conn),
+            "mortgage_over_time": overall,
+            "account_balances": query_account_series(conn, None, 'day', since),
+        }
+
+
+def latest_snapshot_date():
+    """The latest snapshot_date of the overall series (a date), or None."""
+    with db_connection() as conn:
+        if not conn:
+            return None
+        row = conn.execute(f"select max(snapshot_date) from {table('fct_mortgage_over_time')}").fetchone()
+        return row[0] if row else None
+
+
+@app.route('/api/akahu/changes')
+@cached_response
+def akahu_changes():
+    """Daily rows (overall and per account) and KPIs from `since` (inclusive) on.
+
+    The polling counterpart of /api/akahu/events, which pushes the same payload
+    when the data version changes.
+    """
+    try:
+        _, since, _ = parse_series_args({'from': request.args.get('since')})
+    except ValueError:
+        return jsonify({"error": "'since' must be an ISO date (YYYY-MM-DD)"}), 400
+    try:
+        payload = data_changes(since)
+    except Exception as e:
+        logging.error(f"Error fetching akahu changes: {e}")
+        return jsonify({"error": "Failed to query database."}), 500
+    if payload is None:
+        return jsonify({"error": "Database connection failed"}), 500
+    return jsonify(payload)
+
+
+# --- Health monitor ---
+STARTED_AT = time.monotonic()
+
+
+class HealthMonitor:
+    """Database health kept up to date by a background thread, so probes are memory reads.
+
+    Every `interval` seconds the thread stat()s the database (data_version());
+    only when the file changed, or the last check failed, does it check a
+    cursor out and re-read the DB path, schema and latest snapshot_date.
+    Polling never holds the database open, so the pool's idle close still
+    lets the pipeline write to a live database.
+    """
+
+    def __init__(self, interval=15.0, max_data_age_days=2):
+        self.interval = interval
+        self.max_data_age_days = max_data_age_days
+        self._state = None
+        self._version = None
+        self._last_error = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def _check(self, version):
+        if version is None:
+            return {"ok": False, "reason": "no_db_found", "candidates": db_candidates()}
+        with db_connection() as conn:
+            if not conn:
+                return {"ok": False, "reason": "db_connection_failed", "db_path": find_existing_db_path()}
+            try:
+                row = conn.execute(f"select max(snapshot_date) from {table('fct_mortgage_over_time')}").fetchone()
+            except Exception as e:
+                logging.error(f"Health check DB query failed: {e}")
+                return {"ok": False, "reason": "db_query_failed", "error": str(e), "db_path": DB_POOL.path}
+            latest = row[0] if row else None
+            return {"ok": True, "db_path": DB_POOL.path, "schema": DB_POOL.schema_prefix,
+                    "latest_snapshot_date": str(latest) if latest is not None else None}
+
+    def refresh(self, force=False):
+        """Re-check the database if its version changed (or the last check failed)."""
+        # probes describe the default database, whichever tenant a request is for
+        return for_tenant(DEFAULT_TENANT, self._refresh, force)
+
+    def _refresh(self, force):
+        version = data_version()
+        with self._lock:
+            unchanged = self._state is not None and self._state['ok'] and version == self._version
+        if unchanged and not force:
+            with self._lock:
+                self._state['checked_at'] = time.time()
+            return
+        try:
+            state = self._check(version)
+        except Exception as e:
+            state = {"ok": False, "reason": "health_check_failed", "error": str(e)}
+        with self._lock:
+            if not state['ok']:
+                self._last_error = {"reason": state['reason'], "error": state.get('error'), "at": time.time()}
+                # keep the last good details, with the error alongside
+                previous = self._state if self._state and self._state.get('latest_snapshot_date') else {}
+                state = {**{k: previous[k] for k in ('db_path', 'latest_snapshot_date') if k in previous}, **state}
+            state['data_version'] = version
+            state['checked_at'] = time.time()
+            self._state = state
+            self._version = version
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Health refresher failed: {e}")
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='health-monitor', daemon=True)
+                self._thread.start()
+
+    def snapshot(self):
+        """Latest state plus its age and the data's staleness; checks synchronously only once."""
+        if self._state is None:
+            self.refresh()
+        self.start()
+        with self._lock:
+            state = dict(self._state)
+            last_error = dict(self._last_error) if self._last_error else None
+        if last_error:
+            last_error['seconds_ago'] = round(time.time() - last_error.pop('at'), 1)
+        state['last_error'] = last_error
+        latest = state.get('latest_snapshot_date')
+        if latest:
+            age = (date.today() - date.fromisoformat(latest)).days
+            state['data_age_days'] = age
+            state['data_stale'] = age > self.max_data_age_days
+        state['checked_seconds_ago'] = round(time.time() - state.pop('checked_at'), 1)
+        return state
+
+
+HEALTH = HealthMonitor(
+    interval=_env_float('HEALTH_REFRESH_SECONDS', 15.0),
+    max_data_age_days=_env_float('HEALTH_MAX_DATA_AGE_DAYS', 2),
+)
+
+
+# --- Warm-up and readiness ---
+# The requests mortgage.html makes (first paint and each granularity toggle),
+# computed into RESPONSE_CACHE when a worker starts and whenever a new snapshot
+# lands, so users never pay for the cold queries.
+CHART_MAX_POINTS = 600  # MAX_CHART_POINTS in mortgage.html
+WARM_PATHS = (
+    f'/api/akahu/dashboard?granularity=day&max_points={CHART_MAX_POINTS}',
+    *(f'/api/akahu/mortgage_over_time?granularity={g}&max_points={CHART_MAX_POINTS}' for g in GRANULARITIES),
+    *(f'/api/akahu/account_balances?account_ids=all&granularity={g}&max_points={CHART_MAX_POINTS}' for g in GRANULARITIES),
+    '/api/akahu/loan_kpis',
+    '/api/akahu/accounts',
+)
+# Plus each account's own series (the account drill-down), per granularity.
+ACCOUNT_WARM_PATH = '/api/akahu/account_balances/{account_id}?granularity={granularity}&max_points=' + str(CHART_MAX_POINTS)
+
+# The pipeline writes this file once a run has built and published the marts
+# (see akahu_dagster/definitions.py); a change means every cached payload is
+# from the previous load.
+DATA_VERSION_SENTINEL = os.environ.get('DATA_VERSION_SENTINEL') or os.path.join(
+    os.path.dirname(os.environ.get('DUCKDB_PATH') or '/data/akahu.duckdb'), 'data_version.json')
+
+# Under `python -m dashboard.serve` every worker process registers here once
+# warm; /ready only passes when all DASHBOARD_WORKERS of them have.
+READY_DIR = os.environ.get('DASHBOARD_READY_DIR')
+WORKERS = max(1, int(_env_float('DASHBOARD_WORKERS', 1)))
+# Set while a warm-up this process committed to (ASGI startup) has not finished.
+WARM_UP_PENDING = threading.Event()
+
+
+def warm_up():
+    """Open every pooled cursor and precompute WARM_PATHS; returns the data version warmed.
+
+    Returns None (and leaves the worker unready) when there is no database yet.
+    """
+    version = data_version()
+    cursors = []
+    try:
+        for _ in range(DB_POOL.size):
+            cur = DB_POOL.acquire()
+            if cur is None:
+                return None
+            cursors.append(cur)
+    finally:
+        for cur in cursors:
+            DB_POOL.release(cur)
+    with app.test_client() as client:
+        for path in WARM_PATHS:
+            status = client.get(path).status_code
+            if status != 200:
+                logging.warning(f"Warm-up request {path} returned {status}")
+        accounts = client.get('/api/akahu/accounts').get_json()
+        for account in accounts if isinstance(accounts, list) else []:
+            for granularity in GRANULARITIES:
+                path = ACCOUNT_WARM_PATH.format(account_id=quote(str(account['account_id']), safe=''), granularity=granularity)
+                status = client.get(path).status_code
+                if status != 200:
+                    logging.warning(f"Warm-up request {path} returned {status}")
+    WARM_UP_PENDING.clear()
+    if READY_DIR:
+        os.makedirs(READY_DIR, exist_ok=True)
+        with open(os.path.join(READY_DIR, str(os.getpid())), 'w') as f:
+            f.write(version or '')
+    return version
+
+
+def pipeline_run():
+    """Contents of DATA_VERSION_SENTINEL (the last successful pipeline run), or None."""
+    try:
+        with open(DATA_VERSION_SENTINEL) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logging.warning(f"Unreadable data version sentinel {DATA_VERSION_SENTINEL}: {e}")
+        return None
+
+
+def invalidate_caches():
+    """Drop this process's cached payloads, marts and health state after a pipeline run.
+
+    Entries are keyed by data version, so this only releases memory early and
+    covers a run that rewrote the file in place; the shared tier is left to
+    its LRU since sibling workers are re-warming from it. The sentinel belongs
+    to the default database's pipeline, so other tenants' caches are left
+    alone: they are keyed by their own database's version, which that run
+    does not change.
+    """
+    RESPONSE_CACHE.clear()
+    MARTS.clear()
+    HEALTH.refresh(force=True)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def workers_ready():
+    """How many worker processes have warmed up (1 or 0 when running a single process)."""
+    if not READY_DIR:
+        return int(not WARM_UP_PENDING.is_set())
+    try:
+        names = os.listdir(READY_DIR)
+    except FileNotFoundError:
+        return 0
+    return sum(1 for n in names if n.isdigit() and _pid_alive(int(n)))
+
+
+def withdraw_ready():
+    """Unregister this worker (on shutdown) so /ready stops counting it."""
+    WARM_UP_PENDING.set()
+    if READY_DIR:
+        try:
+            os.remove(os.path.join(READY_DIR, str(os.getpid())))
+        except FileNotFoundError:
+            pass
+
+
+@app.route('/ready')
+def ready():
+    """Readiness probe: 200 once the database is reachable and this worker and
+    all its siblings are warm, else 503. Answered from memory (see HealthMonitor).
+    """
+    state = HEALTH.snapshot()
+    count = workers_ready()
+    ok = state['ok'] and not WARM_UP_PENDING.is_set() and count >= WORKERS
+    return jsonify({"ready": ok, "workers_ready": count, "workers": WORKERS, **state}), 200 if ok else 503
+
+
 # --- Frontend Routes ---
 @app.route('/')
 def home():
@@ -291,41 +1766,31 @@ def mortgage():
     return render_template('mortgage.html', house_value=house_value)
 
 
+@app.route('/api/cache/stats')
+def cache_stats():
+    """Hit/miss counters for the (current tenant's) response cache, what its mart
+    cache holds, and how many tenants are open.
+    """
+    tenant = current_tenant()
+    return jsonify({**tenant.cache.stats(), "marts": {**tenant.marts.stats(), "budget": MART_BUDGET.stats()},
+                    "tenants": TENANTS.stats()})
+
+
 @app.route('/health')
 def health():
-    """Health endpoint: reports DB path used and the latest snapshot_date if available."""
-    # prefer using get_db_connection() so schema detection runs in the same place
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({"ok": False, "reason": "no_db_found", "candidates": [os.environ.get('DUCKDB_PATH'), os.path.join(os.path.dirname(os.path.dirname(__file__)), 'data', 'akahu.duckdb'), '/data/akahu.duckdb']}), 200
+    """Health summary from the background monitor: DB path and latest snapshot_date (no DB work).
 
-    # try to read the latest snapshot_date using schema-aware table names
-    try:
-        # ensure schema is detected for this connection
-        try:
-            detect_schema(conn)
-        except Exception:
-            pass
-        cur = conn.cursor()
-        cur.execute(f"select max(snapshot_date) as latest from {table('fct_mortgage_over_time')}")
-        row = cur.fetchone()
-        cur.close()
-        # record path via find_existing_db_path (might be env or /data)
-        path = find_existing_db_path()
-        try:
-            conn.close()
-        except Exception:
-            pass
-        latest = row[0] if row and row[0] is not None else None
-        return jsonify({"ok": True, "db_path": path, "latest_snapshot_date": str(latest) if latest is not None else None}), 200
-    except Exception as e:
-        logging.error(f"Health check DB query failed: {e}")
-        path = find_existing_db_path()
-        try:
-            conn.close()
-        except Exception:
-            pass
-        return jsonify({"ok": False, "reason": "db_query_failed", "error": str(e), "db_path": path}), 200
+    Only the in-process cache counters are included; the shared tier's size
+    takes a SQLite scan and is reported by /api/cache/stats.
+    """
+    state = HEALTH.snapshot()
+    return jsonify({**state, "cache": RESPONSE_CACHE.stats(shared=False)}), 200
+
+
+@app.route('/live')
+def live():
+    """Liveness probe: the process is up and serving requests."""
+    return jsonify({"ok": True, "pid": os.getpid(), "uptime_seconds": round(time.monotonic() - STARTED_AT, 1)}), 200
 
 
 # --- Main Execution ---
@@ -1,9 +1,430 @@
+"""ASGI entry point: `uvicorn dashboard.asgi:asgi_app`.
+
+`/api/akahu/*` requests are served natively on the event loop:
+
+- cached responses (see `cached_response` in app.py) are answered straight
+  from the requesting tenant's response cache on the loop, including 304
+  revalidation, without touching a thread;
+- everything else is dispatched to the Flask view on a dedicated executor
+  with one thread per pooled DuckDB cursor, so threads never queue on the
+  pool. Only the view itself (query and serialization) runs there; the
+  response is written to the client from the loop, and streamed bodies pull
+  one chunk per executor call, so slow clients hold no thread;
+- at most ASYNC_MAX_PENDING requests wait for the executor; beyond that the
+  request is rejected with 503 and Retry-After instead of queueing unbounded.
+
+`/api/akahu/events` is a server-sent event stream: each connection is a
+coroutine waiting on a queue, so idle subscribers hold no thread. When the data
+version changes the rows added since the previous snapshot date are computed
+once per worker (see `data_changes` in app.py) and pushed to every subscriber.
+
+Other routes (pages, static files, /health) keep going through WsgiToAsgi.
+
+On startup each worker warms its DuckDB cursors and the hot payloads (see
+`warm_up` in app.py) and repeats that whenever the data version changes or
+the pipeline writes a new completion sentinel (DATA_VERSION_SENTINEL).
+"""
+import asyncio
+import io
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from urllib.parse import parse_qsl
+
 from asgiref.wsgi import WsgiToAsgi
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags
+
+from .app import (DB_POOL, HEALTH, TENANT_HEADER, TENANT_SIGNATURE_HEADER, TENANTS, WARM_UP_PENDING, _env_float,
+                  app as flask_app, authenticate_tenant, cache_key, data_changes, data_version, for_tenant,
+                  invalidate_caches, latest_snapshot_date, pipeline_run, tenant_for, warm_up, withdraw_ready)
+
+API_PREFIX = '/api/akahu/'
+EVENTS_PATH = '/api/akahu/events'
+
+
+def _environ(scope, body):
+    """PEP 3333 environ for an ASGI HTTP scope."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf8').decode('latin1'),
+        'PATH_INFO': scope['path'].encode('utf8').decode('latin1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'REMOTE_PORT': str(client[1]),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+    }
+    for raw_name, raw_value in scope.get('headers', []):
+        name, value = raw_name.decode('latin1').lower(), raw_value.decode('latin1')
+        if name in ('content-type', 'content-length'):
+            key = name.upper().replace('-', '_')
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        environ[key] = f"{environ[key]},{value}" if key in environ else value
+    return environ
+
+
+def _header(scope, name):
+    for raw_name, raw_value in scope.get('headers', []):
+        if raw_name.decode('latin1').lower() == name:
+            return raw_value.decode('latin1')
+    return None
+
+
+def _authenticate(scope):
+    """authenticate_tenant() for an ASGI request's headers."""
+    return authenticate_tenant(_header(scope, TENANT_HEADER.lower()), _header(scope, TENANT_SIGNATURE_HEADER.lower()))
+
+
+async def _read_body(receive):
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            return body
+
+
+async def _disconnected(receive):
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _respond(send, status, headers, body=b''):
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': [(k.encode('latin1'), v.encode('latin1')) for k, v in headers]})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+def _parse_date(raw):
+    try:
+        return date.fromisoformat(raw) if raw else None
+    except ValueError:
+        return None
+
+
+class DataEvents:
+    """Fan-out of data changes to server-sent event subscribers.
+
+    Each subscriber is an asyncio.Queue of encoded events. A payload is the
+    `data_changes` since the subscriber's latest snapshot date; the one for
+    the previous date is computed once per data version and shared by all
+    subscribers. Clients that fall more than `backlog` events behind lose the
+    oldest; the next event's `since` then no longer matches their data and
+    they reload.
+
+    `tenant` names the household whose data this stream carries (None for the
+    default database); each tenant gets its own DataEvents.
+    """
+
+    def __init__(self, heartbeat=15.0, backlog=4, tenant=None):
+        self.heartbeat = heartbeat
+        self.backlog = backlog
+        self.tenant = tenant
+        self.subscribers = set()
+        self.latest = None  # snapshot date the last event brought clients up to
+        self._published = None  # data version of that event
+        self._version = None
+        self._payloads = {}  # since -> encoded event, for self._version
+
+    @staticmethod
+    def encode(payload):
+        body = flask_app.json.dumps(payload)
+        return f"id: {payload['latest_snapshot_date']}\nevent: changes\ndata: {body}\n\n".encode()
+
+    async def _run(self, executor, fn, *args):
+        """Run `fn(*args)` on the executor against this stream's tenant (None if it is gone)."""
+        return await asyncio.get_running_loop().run_in_executor(executor, self._call, fn, *args)
+
+    def _call(self, fn, *args):
+        tenant = tenant_for(self.tenant)  # may open the tenant: file system work, off the loop
+        return None if tenant is None else for_tenant(tenant, fn, *args)
+
+    async def changes(self, since, executor):
+        """The encoded event catching a client up from `since`, or None if unavailable."""
+        version = await self._run(executor, data_version)
+        if version != self._version:
+            self._version, self._payloads = version, {}
+        if since not in self._payloads:
+            payload = await self._run(executor, data_changes, since)
+            if payload is None or payload['latest_snapshot_date'] is None:
+                return None
+            self._payloads[since] = self.encode(payload)
+        return self._payloads[since]
+
+    async def publish(self, executor):
+        """Push the rows added since the last event to every subscriber."""
+        version = await self._run(executor, data_version)
+        if version is None or version == self._published:
+            return
+        previous, self._published = self.latest, version
+        self.latest = await self._run(executor, latest_snapshot_date)
+        if previous is None or not self.subscribers:
+            return
+        event = await self.changes(previous, executor)
+        if event is None:
+            return
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def stream(self, scope, receive, send, executor):
+        """Serve one SSE connection until the client goes away."""
+        since = _parse_date(_header(scope, 'last-event-id') or
+                            dict(parse_qsl(scope.get('query_string', b'').decode('latin1'))).get('since'))
+        queue = asyncio.Queue(maxsize=self.backlog)
+        self.subscribers.add(queue)
+        disconnect = asyncio.ensure_future(_disconnected(receive))
+        try:
+            if self.latest is None:
+                await self.publish(executor)  # a tenant's first subscriber
+            await send({'type': 'http.response.start', 'status': 200, 'headers': [
+                (b'content-type', b'text/event-stream'), (b'cache-control', b'no-cache'),
+                (b'x-accel-buffering', b'no')]})
+            await send({'type': 'http.response.body', 'body': b'retry: 5000\n\n', 'more_body': True})
+            if since is not None and self.latest is not None and since < self.latest:
+                event = await self.changes(since, executor)
+                if event is not None:
+                    await send({'type': 'http.response.body', 'body': event, 'more_body': True})
+            while True:
+                pending = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({pending, disconnect}, timeout=self.heartbeat,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if disconnect in done:
+                    pending.cancel()
+                    return
+                if pending in done:
+                    await send({'type': 'http.response.body', 'body': pending.result(), 'more_body': True})
+                else:
+                    pending.cancel()
+                    await send({'type': 'http.response.body', 'body': b': keepalive\n\n', 'more_body': True})
+        finally:
+            self.subscribers.discard(queue)
+            disconnect.cancel()
+
+
+class AsyncDashboard:
+    """ASGI app serving /api/akahu/* natively and everything else through `fallback`."""
+
+    def __init__(self, wsgi_app, fallback, workers=4, max_pending=16, poll_interval=5.0, events=None):
+        self.wsgi_app = wsgi_app
+        self.fallback = fallback
+        self.poll_interval = poll_interval
+        self.events = events or DataEvents()
+        self.tenant_events = {}  # tenant name -> DataEvents, while it has subscribers
+        self.workers = max(1, int(workers))
+        self.max_pending = max(0, int(max_pending))
+        self._executor = None
+        self._in_flight = 0
+        self.rejected = 0
+
+    def executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='duckdb')
+        return self._executor
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self._lifespan(receive, send)
+        elif scope['type'] == 'http' and scope['path'] == EVENTS_PATH:
+            events, error = await self._events_for(scope)
+            if events is None:
+                status, message = error
+                await _respond(send, status, [('Content-Type', 'application/json')],
+                               flask_app.json.dumps({"error": message}).encode())
+            else:
+                await events.stream(scope, receive, send, self.executor())
+        elif scope['type'] == 'http' and scope['path'].startswith(API_PREFIX):
+            await self._api(scope, receive, send)
+        else:
+            await self.fallback(scope, receive, send)
+
+    async def _lifespan(self, receive, send):
+        watcher = None
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                self.executor()
+                WARM_UP_PENDING.set()
+                HEALTH.start()
+                watcher = asyncio.create_task(self._watch_snapshots())
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                withdraw_ready()
+                if watcher is not None:
+                    watcher.cancel()
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def _events_for(self, scope):
+        """(DataEvents, None) for the request's tenant, or (None, (status, error)) to reject it."""
+        tenant, error = await asyncio.get_running_loop().run_in_executor(None, _authenticate, scope)
+        if tenant is None:
+            return None, error
+        if tenant.name is None:
+            return self.events, None
+        if tenant.name not in self.tenant_events:
+            self.tenant_events[tenant.name] = DataEvents(self.events.heartbeat, self.events.backlog, tenant=tenant.name)
+        return self.tenant_events[tenant.name], None
+
+    async def _publish_tenant_events(self):
+        for name, events in list(self.tenant_events.items()):
+            if not events.subscribers:
+                del self.tenant_events[name]
+                continue
+            try:
+                await events.publish(self.executor())
+            except Exception as e:
+                logging.error(f"Publishing changes for tenant {name} failed: {e}")
+
+    async def _watch_snapshots(self):
+        """Warm this worker up, then re-warm whenever the data version changes.
+
+        The server accepts connections straight away; /ready holds traffic back
+        until the first warm-up. When a new snapshot lands the pool lets
+        in-flight requests finish on the old file before reopening, and the hot
+        payloads are recomputed here rather than by the next user. A new
+        pipeline-completion sentinel also drops the cached payloads first.
+        """
+        loop = asyncio.get_running_loop()
+        warmed = None
+        run = seen_run = await loop.run_in_executor(self.executor(), pipeline_run)
+        while True:
+            version = await loop.run_in_executor(self.executor(), data_version)
+            if version is not None and (version != warmed or run != seen_run):
+                try:
+                    if run != seen_run:
+                        logging.info(f"Pipeline run completed: {run}")
+                        await loop.run_in_executor(self.executor(), invalidate_caches)
+                    warmed = await loop.run_in_executor(self.executor(), warm_up)
+                    seen_run = run
+                    logging.info(f"Worker {os.getpid()} warmed for data version {warmed}")
+                    await self.events.publish(self.executor())
+                except Exception as e:
+                    logging.error(f"Warm-up failed: {e}")
+            # other tenants are not warmed; their subscribers still get changes
+            await self._publish_tenant_events()
+            await loop.run_in_executor(self.executor(), TENANTS.evict_idle)
+            await asyncio.sleep(self.poll_interval)
+            run = await loop.run_in_executor(self.executor(), pipeline_run)
+
+    def _cached(self, scope):
+        """(status, headers, body) from the tenant's response cache for a GET, or None on a miss.
+
+        Resolving the tenant and its data version touch the file system, so this
+        runs on the loop's default executor (not the DuckDB one, where a hit
+        would queue behind running queries).
+        """
+        if scope['method'] != 'GET':
+            return None
+        tenant, _ = _authenticate(scope)
+        if tenant is None or not tenant.cache.enabled:
+            return None  # rejected requests get their 401/404 from the Flask app
+        version = tenant.pool.data_version()
+        if version is None:
+            return None
+        args = MultiDict(parse_qsl(scope.get('query_string', b'').decode('latin1'), keep_blank_values=True))
+        # local tier only: the shared store is file I/O, left to the executor
+        entry = tenant.cache.get(cache_key(scope['path'], args, tenant.name), version,
+                                 record_miss=False, use_shared=False)
+        if entry is None:
+            return None
+        body, etag, mimetype = entry
+        headers = [('ETag', f'"{etag}"'), ('Cache-Control', 'no-cache'), ('X-Cache', 'HIT')]
+        if parse_etags(_header(scope, 'if-none-match')).contains(etag):
+            tenant.cache.record_not_modified()
+            return 304, headers, b''
+        content_type = f"{mimetype}; charset=utf-8" if mimetype.startswith('text/') else mimetype
+        return 200, headers + [('Content-Type', content_type), ('Content-Length', str(len(body)))], body
+
+    async def _api(self, scope, receive, send):
+        hit = await asyncio.get_running_loop().run_in_executor(None, self._cached, scope)
+        if hit is not None:
+            await _respond(send, *hit)
+            return
+        if self._in_flight >= self.workers + self.max_pending:
+            self.rejected += 1
+            await _respond(send, 503, [('Content-Type', 'application/json'), ('Retry-After', '1')],
+                           b'{"error": "Server busy, retry shortly"}')
+            return
+        # counted before the first await, so requests still sending their body count too
+        self._in_flight += 1
+        try:
+            body = await _read_body(receive)
+            if body is None:
+                return
+            await self._dispatch(scope, body, send)
+        finally:
+            self._in_flight -= 1
+
+    async def _dispatch(self, scope, body, send):
+        loop = asyncio.get_running_loop()
+        executor = self.executor()
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        def call():
+            result = self.wsgi_app(_environ(scope, body), start_response)
+            if not any(k.lower() == 'content-length' for k, _ in started['headers']):
+                return result  # streamed: pulled chunk by chunk below
+            try:
+                return b''.join(result)
+            finally:
+                if hasattr(result, 'close'):
+                    result.close()
+
+        result = await loop.run_in_executor(executor, call)
+        await send({'type': 'http.response.start', 'status': started['status'],
+                    'headers': [(k.lower().encode('latin1'), v.encode('latin1')) for k, v in started['headers']]})
+        if isinstance(result, bytes):
+            await send({'type': 'http.response.body', 'body': result})
+            return
+        chunks = iter(result)
+        try:
+            # each chunk (e.g. one Arrow batch for NDJSON) is produced on the executor
+            while True:
+                chunk = await loop.run_in_executor(executor, next, chunks, None)
+                if chunk is None:
+                    break
+                if chunk:
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body', 'body': b''})
+        except Exception as e:
+            logging.error(f"Error streaming {scope['path']}: {e}")
+        finally:
+            if hasattr(result, 'close'):
+                await loop.run_in_executor(executor, result.close)
 
-# Import the Flask app instance
-from .app import app as flask_app
 
-# Wrap the WSGI Flask app as an ASGI app
-asgi_app = WsgiToAsgi(flask_app)
+asgi_app = AsyncDashboard(
+    flask_app.wsgi_app,
+    WsgiToAsgi(flask_app),
+    workers=int(_env_float('ASYNC_DB_WORKERS', DB_POOL.size)),
+    max_pending=int(_env_float('ASYNC_MAX_PENDING', 4 * DB_POOL.size)),
+    poll_interval=_env_float('SNAPSHOT_POLL_SECONDS', 5.0),
+    events=DataEvents(heartbeat=_env_float('SSE_HEARTBEAT_SECONDS', 15.0)),
+)
 
 __all__ = ["asgi_app"]
@@ -0,0 +1,240 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResponseCache:
+    """Bounded LRU cache of serialized API responses.
+
+    Entries are keyed by (endpoint, query parameters) and tagged with the data
+    version they were computed from. When a lookup arrives with a new data
+    version the whole cache is dropped, so a pipeline load invalidates every
+    endpoint at once and stale payloads never linger until LRU eviction.
+    """
+
+    def __init__(self, max_entries=256, shared=None):
+        self.max_entries = max(0, int(max_entries))
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.not_modified = 0
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    def _sync_version_locked(self, version):
+        if version != self._version:
+            self._entries.clear()
+            self._version = version
+
+    def get(self, key, version, record_miss=True, use_shared=True):
+        """Return the cached entry for `key` at `version`, or None.
+
+        Local misses fall through to the `shared` store (unless `use_shared`
+        is off) and are copied into this process on a hit. `record_miss=False`
+        is for opportunistic lookups that fall through to a path doing its own
+        lookup, so a miss is not counted twice.
+        """
+        with self._lock:
+            self._sync_version_locked(version)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        entry = self.shared.get(key, version) if self.shared is not None and use_shared else None
+        with self._lock:
+            if entry is None:
+                if record_miss:
+                    self.misses += 1
+                return None
+            self.shared_hits += 1
+            self._store_locked(key, version, entry)
+            return entry
+
+    def put(self, key, version, body, mimetype):
+        """Store a response body and return the (body, etag, mimetype) entry."""
+        etag = make_etag(body, version)
+        entry = (body, etag, mimetype)
+        if not self.enabled:
+            return entry
+        with self._lock:
+            self._store_locked(key, version, entry)
+        if self.shared is not None:
+            self.shared.put(key, version, entry)
+        return entry
+
+    def _store_locked(self, key, version, entry):
+        self._sync_version_locked(version)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def record_not_modified(self):
+        with self._lock:
+            self.not_modified += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._version = None
+
+    def stats(self, shared=True):
+        """Counters of this process's cache; with `shared`, also the shared tier's (a SQLite scan)."""
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "not_modified": self.not_modified,
+                "shared_hits": self.shared_hits,
+                "data_version": self._version,
+            }
+        if shared:
+            stats["shared"] = self.shared.stats() if self.shared is not None else None
+        return stats
+
+
+def make_etag(body, version):
+    """Strong ETag derived from the payload bytes and the data version."""
+    h = hashlib.sha256()
+    h.update(str(version).encode())
+    h.update(body)
+    return h.hexdigest()[:32]
+
+
+class SharedCache:
+    """Response store shared by every worker process on the host, in a SQLite file.
+
+    Entries are (key, data version) -> (body, etag, mimetype). Any process may
+    read and write concurrently (WAL mode; each thread has its own
+    connection), so the first worker to compute a payload serves it to the
+    others, and the file outlives restarts. Beyond `max_bytes` the least
+    recently used bodies are evicted, which is also how entries for earlier
+    data versions (never read again) go away: deleting them eagerly would race
+    with a worker still finishing a request on the previous version. The byte
+    total is kept in a one-row table by triggers, so a write never sums the
+    store. Errors are logged and treated as misses: the store is only ever an
+    optimization.
+    """
+
+    TOUCH_INTERVAL = 60  # seconds between last-used updates for the same entry
+
+    def __init__(self, path, max_bytes=256 * 2 ** 20):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        conn = self._conn()
+        if conn is not None:
+            with conn:
+                conn.execute("begin immediate")
+                conn.execute("""
+                    create table if not exists responses (
+                        key text not null, version text not null, body blob not null, etag text not null,
+                        mimetype text not null, size integer not null, used real not null,
+                        primary key (key, version)
+                    )
+                """)
+                conn.execute("create index if not exists responses_used on responses (used)")
+                conn.execute("create table if not exists response_bytes (total integer not null)")
+                if conn.execute("select count(*) from response_bytes").fetchone()[0] == 0:
+                    conn.execute("insert into response_bytes select coalesce(sum(size), 0) from responses")
+                for event, change in (("insert", "+ new.size"), ("delete", "- old.size"),
+                                      ("update of size", "- old.size + new.size")):
+                    conn.execute(f"""
+                        create trigger if not exists responses_{event.split()[0]} after {event} on responses
+                        begin update response_bytes set total = total {change}; end
+                    """)
+
+    def _conn(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None)
+                conn.execute("pragma journal_mode=wal")
+                conn.execute("pragma synchronous=normal")
+            except sqlite3.Error as e:
+                logging.error(f"Shared response cache unavailable at {self.path}: {e}")
+                return None
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _key(key):
+        return json.dumps(key, default=str, separators=(',', ':'))
+
+    def get(self, key, version):
+        conn = self._conn()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "select body, etag, mimetype, used from responses where key = ? and version = ?",
+                (self._key(key), str(version)),
+            ).fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            if now - row[3] > self.TOUCH_INTERVAL:
+                conn.execute("update responses set used = ? where key = ? and version = ?", (now, self._key(key), str(version)))
+            return bytes(row[0]), row[1], row[2]
+        except sqlite3.Error as e:
+            logging.warning(f"Shared response cache read failed: {e}")
+            return None
+
+    def put(self, key, version, entry):
+        conn = self._conn()
+        if conn is None:
+            return
+        body, etag, mimetype = entry
+        if self.max_bytes and len(body) > self.max_bytes:
+            return
+        try:
+            with conn:
+                conn.execute("begin immediate")
+                # an upsert, not `insert or replace`: REPLACE skips the delete trigger
+                conn.execute(
+                    "insert into responses values (?, ?, ?, ?, ?, ?, ?) on conflict (key, version) do update set "
+                    "body = excluded.body, etag = excluded.etag, mimetype = excluded.mimetype, "
+                    "size = excluded.size, used = excluded.used",
+                    (self._key(key), str(version), body, etag, mimetype, len(body), time.time()),
+                )
+                total = conn.execute("select total from response_bytes").fetchone()[0]
+                if self.max_bytes and total > self.max_bytes:
+                    excess = total - self.max_bytes
+                    doomed = []
+                    for k, v, size in conn.execute("select key, version, size from responses order by used"):
+                        if excess <= 0:
+                            break
+                        doomed.append((k, v))
+                        excess -= size
+                    conn.executemany("delete from responses where key = ? and version = ?", doomed)
+        except sqlite3.Error as e:
+            logging.warning(f"Shared response cache write failed: {e}")
+
+    def stats(self):
+        conn = self._conn()
+        if conn is None:
+            return {"path": self.path, "available": False}
+        try:
+            entries = conn.execute("select count(*) from responses").fetchone()[0]
+            size = conn.execute("select total from response_bytes").fetchone()[0]
+        except sqlite3.Error:
+            return {"path": self.path, "available": False}
+        return {"path": self.path, "available": True, "entries": entries, "bytes": size, "max_bytes": self.max_bytes}
@@ -0,0 +1,100 @@
+"""Shape-preserving downsampling of time series for charting.
+
+Both methods return the *indices* of the rows to keep, so the same selection
+can be applied to every column of a result (dates, balances, currency, ...)
+with one fancy-indexing step per column.
+
+- `lttb`: Largest-Triangle-Three-Buckets. Keeps the first and last points and,
+  for every bucket in between, the point forming the largest triangle with the
+  previously kept point and the mean of the next bucket. The per-bucket work is
+  vectorized; only the walk across buckets is a Python loop (max_points steps).
+- `minmax`: keeps the minimum and maximum of every bucket, fully vectorized.
+  Guarantees peaks and troughs survive, at up to two points per bucket.
+"""
+import numpy as np
+
+METHODS = ('lttb', 'minmax')
+MIN_POINTS = 3
+
+
+def parse_downsample_args(args):
+    """Return (max_points, method) from the query string; max_points is None when absent."""
+    method = (args.get('downsample') or 'lttb').lower()
+    if method not in METHODS:
+        raise ValueError(f"downsample must be one of {', '.join(METHODS)}")
+    raw = args.get('max_points')
+    if not raw:
+        return None, method
+    try:
+        max_points = int(raw)
+    except ValueError:
+        raise ValueError("max_points must be an integer") from None
+    if max_points < MIN_POINTS:
+        raise ValueError(f"max_points must be at least {MIN_POINTS}")
+    return max_points, method
+
+
+def to_x(dates):
+    """Numeric x axis (days since epoch) from dates or ISO date strings."""
+    return np.asarray(dates, dtype='datetime64[D]').astype(np.float64)
+
+
+def to_y(values):
+    """Float array from balances that may contain None/Decimal; missing values become 0."""
+    return np.nan_to_num(np.array([np.nan if v is None else v for v in values], dtype=np.float64))
+
+
+def lttb_indices(x, y, n):
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    # n - 2 buckets over the interior points [1, size - 1)
+    edges = np.linspace(1, size - 1, n - 1).astype(np.int64)
+    # mean x/y of every bucket, computed up front; the last "next bucket" is the final point
+    starts, stops = edges[:-1], edges[1:]
+    counts = np.maximum(stops - starts, 1)
+    cx = np.concatenate(([0.0], np.cumsum(x)))
+    cy = np.concatenate(([0.0], np.cumsum(y)))
+    mean_x = np.append((cx[stops] - cx[starts]) / counts, x[-1])
+    mean_y = np.append((cy[stops] - cy[starts]) / counts, y[-1])
+
+    out = np.empty(n, dtype=np.int64)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = starts[i], max(stops[i], starts[i] + 1)
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - mean_x[i + 1]) * (by - y[a]) - (x[a] - bx) * (mean_y[i + 1] - y[a]))
+        a = lo + int(np.argmax(area))
+        out[i + 1] = a
+    return out
+
+
+def minmax_indices(x, y, n):
+    size = len(y)
+    if n >= size:
+        return np.arange(size)
+    buckets = max(1, (n - 2) // 2)
+    bucket = np.minimum((np.arange(size) * buckets) // size, buckets - 1)
+    order = np.lexsort((y, bucket))
+    bounds = np.flatnonzero(np.diff(bucket[order])) + 1
+    firsts = order[np.concatenate(([0], bounds))]
+    lasts = order[np.concatenate((bounds - 1, [size - 1]))]
+    return np.unique(np.concatenate(([0, size - 1], firsts, lasts)))
+
+
+def select_indices(x, ys, max_points, method='lttb'):
+    """Sorted row indices to keep, about `max_points` of them.
+
+    `ys` is a list of y arrays sharing the x axis; the point budget is split
+    between them and the selections are merged, so every charted column keeps
+    its shape. Each column gets at least MIN_POINTS, so very small budgets
+    over many columns can return slightly more than `max_points`.
+    """
+    size = len(x)
+    if not max_points or size <= max_points:
+        return np.arange(size)
+    pick = lttb_indices if method == 'lttb' else minmax_indices
+    budget = max(MIN_POINTS, max_points // max(1, len(ys)))
+    selected = [pick(x, y, budget) for y in ys]
+    return np.unique(np.concatenate(selected))
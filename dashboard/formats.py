@@ -0,0 +1,122 @@
+"""Response encodings for query results that avoid building one dict per row.
+
+`columnar` turns DuckDB's `fetchnumpy()` output into one JSON array per column
+(numpy's `tolist()` does the per-value conversion in C); `arrow` writes the
+result's record batches straight into an Arrow IPC stream; `ndjson` yields one
+line per row, one record batch at a time, so memory stays bounded.
+"""
+import json
+from datetime import date, datetime
+from decimal import Decimal
+
+import numpy as np
+import pyarrow as pa
+
+FORMATS = ('json', 'columnar', 'arrow')
+STREAMING_FORMATS = ('ndjson',)
+ARROW_MIMETYPE = 'application/vnd.apache.arrow.stream'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+
+def parse_format(args, streaming=False):
+    """Return the requested `format` query parameter, defaulting to json.
+
+    Streaming formats are only accepted when the endpoint supports them.
+    """
+    allowed = FORMATS + STREAMING_FORMATS if streaming else FORMATS
+    fmt = (args.get('format') or 'json').lower()
+    if fmt not in allowed:
+        raise ValueError(f"format must be one of {', '.join(allowed)}")
+    return fmt
+
+
+def column_types(cur):
+    """DuckDB type name per result column, e.g. {'snapshot_date': 'DATE'}."""
+    return {d[0]: str(d[1]) for d in cur.description}
+
+
+def _column_values(arr, type_name):
+    """Convert one fetchnumpy() column to a JSON-ready list (NULL/NaN -> None)."""
+    mask = np.ma.getmaskarray(arr) if isinstance(arr, np.ma.MaskedArray) else None
+    data = np.ma.getdata(arr)
+    if data.dtype.kind == 'f':
+        nan = np.isnan(data)
+        if nan.any():
+            mask = nan if mask is None else (mask | nan)
+    if data.dtype.kind == 'M':
+        # DATE comes back as datetime64[us]; keep it a plain ISO date
+        if type_name == 'DATE':
+            data = np.datetime_as_string(data, unit='D')
+        elif type_name.endswith('WITH TIME ZONE'):
+            data = np.datetime_as_string(data, unit='us', timezone='UTC')
+        else:
+            data = np.datetime_as_string(data, unit='us')
+    values = data.tolist()
+    if mask is not None and mask.any():
+        for i in np.flatnonzero(mask):
+            values[i] = None
+    return values
+
+
+def columnar_payload(cur):
+    """{"columns": {name: [...]}, "types": {name: duckdb_type}, "row_count": n} for an executed cursor."""
+    types = column_types(cur)
+    arrays = cur.fetchnumpy()
+    columns = {name: _column_values(arr, types[name]) for name, arr in arrays.items()}
+    row_count = len(next(iter(arrays.values()))) if arrays else 0
+    return {"columns": columns, "types": types, "row_count": row_count}
+
+
+def grouped_columnar_payload(cur, key):
+    """Like columnar_payload, but split into one column set per value of `key`.
+
+    The result must be ordered by `key`; groups are cut at the positions where
+    the key changes rather than by iterating rows.
+    """
+    types = column_types(cur)
+    arrays = cur.fetchnumpy()
+    keys = np.ma.getdata(arrays.pop(key))
+    types.pop(key, None)
+    groups = {}
+    if len(keys):
+        bounds = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1, [len(keys)]))
+        columns = {name: _column_values(arr, types[name]) for name, arr in arrays.items()}
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            groups[keys[start]] = {name: values[start:stop] for name, values in columns.items()}
+    return groups, types
+
+
+def dumps(payload):
+    """Compact JSON encoding for columnar payloads."""
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def record_batch_reader(cur, batch_size=65536):
+    """Arrow RecordBatchReader that pulls an executed cursor's result in chunks."""
+    # duckdb >= 1.4 renamed fetch_record_batch() to to_arrow_reader()
+    fetch = getattr(cur, 'to_arrow_reader', None) or cur.fetch_record_batch
+    return fetch(batch_size)
+
+
+def _json_default(value):
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def ndjson_chunks(reader):
+    """Yield NDJSON text one record batch at a time."""
+    for batch in reader:
+        yield ''.join(json.dumps(row, default=_json_default, separators=(',', ':')) + '\n' for row in batch.to_pylist())
+
+
+def arrow_ipc_bytes(cur, batch_size=65536):
+    """Serialize an executed cursor's result as an Arrow IPC stream."""
+    reader = record_batch_reader(cur, batch_size)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, reader.schema) as writer:
+        for batch in reader:
+            writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,277 @@
+"""In-process columnar copy of the serving marts (optional, MART_CACHE=1).
+
+The serving dataset is small and changes once per pipeline run, so each
+worker can hold it in memory as Arrow tables and answer the read endpoints by
+slicing instead of querying DuckDB:
+
+- series tables are kept in (account_id, snapshot_date) order, with an offset
+  index per account and the dates as int32 days, so a lookup is a dict access
+  plus two binary searches, and week/month bucketing keeps the last row of
+  each run of equal bucket keys;
+- results are returned as `ArrowCursor`s, which offer the subset of the
+  DuckDB cursor API the response encoders use (description, fetchall,
+  fetchnumpy, to_arrow_reader), so every `format` is rendered by the same code
+  as a database result.
+
+MartCache loads lazily on first use and again whenever the data version
+changes; the new snapshot replaces the old one in a single assignment. While a
+load is in progress, or when the marts exceed the memory cap, callers get None
+and fall back to DuckDB. Several MartCaches (one per tenant) can share a
+MartBudget, which bounds their total size for the whole process.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+WEEKDAY_OFFSET = 3  # 1970-01-01 was a Thursday; (days + 3) % 7 is the ISO weekday from Monday = 0
+
+
+def _arrow_table(cur):
+    # duckdb >= 1.4 renamed fetch_arrow_table() to to_arrow_table()
+    fetch = getattr(cur, 'to_arrow_table', None) or cur.fetch_arrow_table
+    return fetch()
+
+
+class ArrowCursor:
+    """Read-only cursor over an Arrow table, mimicking a DuckDB result."""
+
+    def __init__(self, table, types):
+        self.table = table
+        self.description = [(name, types[name], None, None, None, None, None) for name in table.column_names]
+        self._rows = None
+
+    def fetchall(self):
+        if self._rows is None:
+            self._rows = list(zip(*(column.to_pylist() for column in self.table.columns)))
+        rows, self._rows = self._rows, []
+        return rows
+
+    def fetchone(self):
+        rows = self.fetchall()
+        self._rows = rows[1:]
+        return rows[0] if rows else None
+
+    def fetchnumpy(self):
+        """Columns as numpy arrays the way DuckDB returns them: DECIMAL as float64, NULLs masked."""
+        arrays = {}
+        for name, column in zip(self.table.column_names, self.table.columns):
+            if pa.types.is_decimal(column.type):
+                column = column.cast(pa.float64())
+            if not column.null_count:
+                arrays[name] = column.to_numpy(zero_copy_only=False)
+                continue
+            mask = column.is_null().to_numpy(zero_copy_only=False)
+            if pa.types.is_integer(column.type) or pa.types.is_boolean(column.type):
+                # keep the integer/bool dtype instead of Arrow's float/object conversion
+                column = pc.fill_null(column, pa.scalar(0 if pa.types.is_integer(column.type) else False, column.type))
+            arrays[name] = np.ma.masked_array(column.to_numpy(zero_copy_only=False), mask=mask)
+        return arrays
+
+    def to_arrow_reader(self, batch_size=65536):
+        return pa.RecordBatchReader.from_batches(self.table.schema, self.table.to_batches(max_chunksize=batch_size))
+
+
+def _days(table):
+    return table.column('snapshot_date').cast(pa.date32()).to_numpy(zero_copy_only=False).astype('datetime64[D]').astype(np.int32)
+
+
+def _bucket_keys(days, granularity):
+    if granularity == 'week':
+        return days - (days + WEEKDAY_OFFSET) % 7
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int32)
+
+
+class MartSnapshot:
+    """The marts for one data version: lookup tables plus indexed series."""
+
+    def __init__(self, version, tables, types):
+        self.version = version
+        self.tables = tables
+        self.types = types
+        self.nbytes = sum(t.nbytes for t in tables.values())
+        self._days = {name: _days(t) for name, t in tables.items() if 'snapshot_date' in t.column_names}
+        # (start, stop) row range per account, in the table's account_id order
+        self._offsets = {}
+        for name, t in tables.items():
+            if 'account_id' in t.column_names and name in self._days:
+                ids = np.asarray(t.column('account_id').to_pylist(), dtype=object)
+                bounds = np.concatenate(([0], np.flatnonzero(ids[1:] != ids[:-1]) + 1, [len(ids)])) if len(ids) else [0]
+                self._offsets[name] = {ids[a]: (int(a), int(b)) for a, b in zip(bounds[:-1], bounds[1:])}
+
+    @classmethod
+    def load(cls, conn, version, queries):
+        """Run each {name: sql} in `queries` and keep the results as Arrow tables."""
+        tables, types = {}, {}
+        for name, sql in queries.items():
+            cur = conn.execute(sql)
+            types[name] = {d[0]: str(d[1]) for d in cur.description}
+            tables[name] = _arrow_table(cur)
+        return cls(version, tables, types)
+
+    def cursor(self, name, columns=None):
+        """The whole of table `name` (optionally only `columns`) as a cursor."""
+        t = self.tables[name]
+        return ArrowCursor(t.select(columns) if columns else t, self.types[name])
+
+    def series(self, name, columns, granularity='day', date_from=None, date_to=None, account_ids=None):
+        """Rows of series table `name`, like series_sql: range-filtered, bucketed to
+        the last day per `granularity`, ordered by (account_id,) snapshot_date.
+
+        `account_ids` (None means all) selects accounts in tables keyed by account_id.
+        """
+        days = self._days[name]
+        lo = -np.inf if date_from is None else np.datetime64(date_from, 'D').astype(np.int64)
+        hi = np.inf if date_to is None else np.datetime64(date_to, 'D').astype(np.int64)
+        offsets = self._offsets.get(name)
+        if offsets is None:
+            ranges = [(0, len(days))]
+        else:
+            wanted = offsets if not account_ids else set(account_ids)
+            ranges = [r for a, r in offsets.items() if a in wanted]
+        parts, groups = [], []
+        for group, (start, stop) in enumerate(ranges):
+            segment = days[start:stop]
+            first = start + int(np.searchsorted(segment, lo, side='left'))
+            last = start + int(np.searchsorted(segment, hi, side='right'))
+            parts.append(np.arange(first, last))
+            groups.append(np.full(last - first, group))
+        idx = np.concatenate(parts) if parts else np.zeros(0, dtype=np.int64)
+        if granularity != 'day' and len(idx):
+            group = np.concatenate(groups)
+            key = _bucket_keys(days[idx], granularity)
+            # the last row of each (account, bucket) run
+            keep = np.append((key[1:] != key[:-1]) | (group[1:] != group[:-1]), True)
+            idx = idx[keep]
+        return ArrowCursor(self.tables[name].select(columns).take(idx), self.types[name])
+
+
+class MartBudget:
+    """Process-wide byte budget shared by several MartCaches.
+
+    Installing a snapshot drops the least recently used snapshots of the other
+    caches until the total fits in `max_bytes`; a snapshot larger than the
+    whole budget is refused. Snapshots are only ever installed or dropped under
+    this lock, so the accounting cannot drift.
+    """
+
+    def __init__(self, max_bytes=None):
+        self.max_bytes = max_bytes
+        self._held = OrderedDict()  # cache -> bytes, least recently used first
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def admit(self, cache, snapshot):
+        """Install `snapshot` in `cache`, making room as needed; False if it can never fit."""
+        with self._lock:
+            self._held.pop(cache, None)
+            if self.max_bytes and snapshot.nbytes > self.max_bytes:
+                cache._snapshot = None
+                return False
+            total = sum(self._held.values())
+            while self.max_bytes and self._held and total + snapshot.nbytes > self.max_bytes:
+                victim, size = self._held.popitem(last=False)
+                victim._snapshot = None
+                total -= size
+                self.evictions += 1
+            self._held[cache] = snapshot.nbytes
+            cache._snapshot = snapshot
+            return True
+
+    def touch(self, cache):
+        with self._lock:
+            if cache in self._held:
+                self._held.move_to_end(cache)
+
+    def release(self, cache):
+        with self._lock:
+            self._held.pop(cache, None)
+            cache._snapshot = None
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": sum(self._held.values()),
+                "caches": len(self._held),
+                "evictions": self.evictions,
+            }
+
+
+class MartCache:
+    """Lazily loaded MartSnapshot for the current data version.
+
+    `loader(version)` builds a snapshot (it runs the queries on a pooled
+    cursor). Snapshots over `max_bytes`, or over the whole shared `budget`,
+    are dropped and the version is remembered, so an oversized dataset is not
+    reloaded on every request.
+    """
+
+    def __init__(self, loader, enabled=False, max_bytes=None, budget=None):
+        self.loader = loader
+        self.enabled = enabled
+        self.max_bytes = max_bytes
+        self.budget = budget
+        self._snapshot = None
+        self._rejected = None
+        self._lock = threading.Lock()
+
+    def get(self, version):
+        """The snapshot for `version`, or None when disabled, loading, failed or too large."""
+        if not self.enabled or version is None or version == self._rejected:
+            return None
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            if self.budget is not None:
+                self.budget.touch(self)
+            return snapshot
+        if not self._lock.acquire(blocking=False):
+            return None  # another request is loading; serve this one from DuckDB
+        try:
+            if self._snapshot is not None and self._snapshot.version == version:
+                return self._snapshot
+            try:
+                snapshot = self.loader(version)
+            except Exception as e:
+                logging.error(f"Loading the mart cache failed: {e}")
+                return None
+            if snapshot is None:
+                return None
+            if self.max_bytes and snapshot.nbytes > self.max_bytes:
+                logging.warning(f"Marts need {snapshot.nbytes} bytes, over the {self.max_bytes} byte cap; serving from DuckDB")
+                self._rejected = version
+                if self.budget is not None:
+                    self.budget.release(self)
+                else:
+                    self._snapshot = None
+                return None
+            if self.budget is None:
+                self._snapshot = snapshot
+            elif not self.budget.admit(self, snapshot):
+                logging.warning(f"Marts need {snapshot.nbytes} bytes, over the process-wide budget; serving from DuckDB")
+                self._rejected = version
+                return None
+            logging.info(f"Loaded marts for data version {version} ({snapshot.nbytes} bytes)")
+            return snapshot
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        if self.budget is not None:
+            self.budget.release(self)
+        else:
+            self._snapshot = None
+        self._rejected = None
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "enabled": self.enabled,
+            "data_version": snapshot.version if snapshot else None,
+            "bytes": snapshot.nbytes if snapshot else 0,
+            "max_bytes": self.max_bytes,
+            "rows": {name: t.num_rows for name, t in snapshot.tables.items()} if snapshot else {},
+        }
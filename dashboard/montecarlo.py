@@ -0,0 +1,338 @@
+"""Monte Carlo projection of fixed-rate loans across future refixes.
+
+The market rate follows a mean-reverting (Ornstein-Uhlenbeck / Vasicek) model,
+sampled exactly at each refix date:
+
+    x[t + dt] = mean + (x[t] - mean) * exp(-reversion * dt) + volatility * sqrt((1 - exp(-2 * reversion * dt)) / (2 * reversion)) * z
+
+When the current fixed term expires the loan refixes at the simulated rate
+for `refix_years`, then again at the end of every term. At each refix the
+repayment is reset to the level payment that clears the loan by maturity (or
+kept when the maturity is unknown). Within a term the rate is constant, so
+each term is amortized in closed form for all paths at once; the only Python
+loop is over refixes.
+
+Paths are simulated in fixed-size chunks with seeds spawned from one
+SeedSequence, so results depend on the seed but not on how many worker
+processes ran the chunks. SimulationRunner spreads chunks over a process
+pool, tracks jobs by key and keeps finished results in a small LRU.
+"""
+import logging
+import math
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import CancelledError, ProcessPoolExecutor
+
+import numpy as np
+
+from .amortization import MAX_YEARS, add_periods, amortize, annuity_payment, loan_grid, periods_until
+
+PERCENTILES = (5, 25, 50, 75, 95)
+CHUNK_PATHS = 2000
+MAX_PATHS = 200_000
+DEFAULTS = {'paths': 5000, 'seed': 0, 'reversion': 0.3, 'volatility': 1.0, 'mean': None, 'refix_years': 2}
+
+
+def parse_simulation_args(args):
+    """Validate the model parameters (rates in percent, `reversion` per year).
+
+    An omitted `mean` stays None: the rate reverts to the loan's current rate.
+    """
+    params = {}
+    for name, default in DEFAULTS.items():
+        raw = args.get(name)
+        if not raw:
+            params[name] = default
+            continue
+        try:
+            params[name] = int(raw) if name in ('paths', 'seed', 'refix_years') else float(raw)
+        except ValueError:
+            raise ValueError(f"{name} must be a number") from None
+    if not 1 <= params['paths'] <= MAX_PATHS:
+        raise ValueError(f"paths must be between 1 and {MAX_PATHS}")
+    if params['seed'] < 0:
+        raise ValueError("seed must not be negative")
+    if not 1 <= params['refix_years'] <= 10:
+        raise ValueError("refix_years must be between 1 and 10")
+    if params['reversion'] <= 0 or params['volatility'] < 0:
+        raise ValueError("reversion must be positive and volatility must not be negative")
+    return params
+
+
+def loan_plan(terms, as_of, years=MAX_YEARS):
+    """Deterministic inputs for one loan from `loan_terms` arrays of length 1.
+
+    Returns the opening balance, current rate, repayments per year, the
+    current repayment, how many repayments fall in the current fixed term,
+    the total number of repayments (to maturity, else `years`) and the first
+    repayment date.
+    """
+    grid = loan_grid(terms, as_of, years)
+    ppy = int(grid['periods_per_year'][0])
+    first = grid['first_date'][0]
+    matures = terms['matures'][0]
+    total = int(periods_until(first, ppy, matures)) if not np.isnat(matures) else years * ppy
+    # an unknown or past expiry refixes at the first repayment
+    expires = terms['rate_expires'][0]
+    fixed = 0 if np.isnat(expires) else int(periods_until(first, ppy, expires - np.timedelta64(1, 'D')))
+    return {
+        'balance': float(grid['balance'][0]),
+        'rate': float(terms['annual_rate'][0]),
+        'periods_per_year': ppy,
+        'payment': float(grid['payments'][0, 0]),
+        'interest_only': bool(terms['interest_only'][0]),
+        'fixed_periods': min(fixed, total),
+        'total_periods': max(total, 1),
+        'matures': not np.isnat(matures),
+        'first_date': str(first),
+    }
+
+
+def refix_periods(plan, params):
+    """0-based repayment index at which each refix takes effect."""
+    return np.arange(plan['fixed_periods'], plan['total_periods'], params['refix_years'] * plan['periods_per_year'])
+
+
+def _segment(balance, rate, payment, periods, balloon=False):
+    """amortize() every path for `periods` repayments at its own constant per-period `rate`.
+
+    Returns (closing balance, interest paid, repayments until payoff or -1).
+    """
+    rates = np.repeat(rate[:, None], periods, axis=1)
+    result = amortize(balance, rates, payment[:, None], balloon=np.full(len(balance), periods) if balloon else None,
+                      schedule=False)
+    closing = np.where(result['periods'] < 0, balance + result['total_interest'] - result['total_paid'], 0.0)
+    return closing, result['total_interest'], result['periods']
+
+
+def simulate_chunk(plan, params, paths, seed_seq):
+    """Simulate `paths` rate paths for one loan; per-path outcomes as arrays.
+
+    Returns a dict with `total_interest` and `payoff_period` (1-based, inf if
+    not repaid within the plan) per path, and the `rate` (percent) and
+    `repayment` (paths x refixes) each path refixes at; NaN once repaid.
+    """
+    rng = np.random.default_rng(seed_seq)
+    ppy, total = plan['periods_per_year'], plan['total_periods']
+    starts = refix_periods(plan, params)
+    ends = np.append(starts[1:], total)
+    mean = plan['rate'] if params['mean'] is None else params['mean'] / 100.0
+    kappa, sigma = params['reversion'], params['volatility'] / 100.0
+
+    balance = np.full(paths, plan['balance'])
+    payment = np.full(paths, plan['payment'])
+    rate = np.full(paths, plan['rate'])
+    interest = np.zeros(paths)
+    payoff = np.full(paths, np.inf)
+
+    def run(start, stop, balloon):
+        nonlocal balance, interest, payoff
+        balance, paid, periods = _segment(balance, rate / ppy, payment, stop - start, balloon)
+        interest += paid
+        payoff = np.where(np.isinf(payoff) & (periods > 0), start + periods, payoff)
+
+    # the current fixed term is the same for every path
+    if plan['fixed_periods']:
+        run(0, plan['fixed_periods'], plan['interest_only'] and plan['matures'] and not len(starts))
+
+    rates = np.full((paths, len(starts)), np.nan)
+    repayments = np.full((paths, len(starts)), np.nan)
+    x = rate.copy()
+    for j, (start, stop) in enumerate(zip(starts, ends)):
+        # exact transition of the mean-reverting rate over the time since the last refix
+        dt = (start if j == 0 else start - starts[j - 1]) / ppy
+        decay = math.exp(-kappa * dt)
+        x = mean + (x - mean) * decay + sigma * math.sqrt((1 - decay ** 2) / (2 * kappa)) * rng.standard_normal(paths)
+        rate = np.maximum(x, 0.0)
+        if plan['interest_only']:
+            payment = balance * rate / ppy
+        elif plan['matures']:
+            payment = annuity_payment(balance, rate / ppy, total - start)
+        owing = balance > 0
+        rates[:, j] = np.where(owing, rate * 100.0, np.nan)
+        repayments[:, j] = np.where(owing, payment, np.nan)
+        run(start, stop, plan['interest_only'] and plan['matures'] and stop == total)
+    return {'total_interest': interest, 'payoff_period': payoff, 'rate': rates, 'repayment': repayments}
+
+
+def summarize(plan, params, chunks):
+    """Percentile bands over every simulated path.
+
+    Payoff percentiles beyond the share of paths repaid within the plan are
+    None; refix bands only cover paths still owing at that refix.
+    """
+    combined = {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+    payoff = combined['payoff_period']
+    ppy, first = plan['periods_per_year'], np.datetime64(plan['first_date'])
+
+    def bands(values):
+        return {f"p{p}": round(float(v), 2) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))}
+
+    def dates(values):
+        # 'higher' picks an actual path's period, so unrepaid (inf) paths never interpolate
+        q = np.percentile(values, PERCENTILES, method='higher')
+        return {f"p{p}": None if np.isinf(v) else str(add_periods(first, ppy, int(v) - 1)) for p, v in zip(PERCENTILES, q)}
+
+    def refix_bands(values):
+        out = {f"p{p}": [] for p in PERCENTILES}
+        for column in values.T:
+            column = column[~np.isnan(column)]
+            for p, v in zip(PERCENTILES, np.percentile(column, PERCENTILES) if column.size else [None] * len(PERCENTILES)):
+                out[f"p{p}"].append(None if v is None else round(float(v), 4))
+        return out
+
+    starts = refix_periods(plan, params)
+    return {
+        'paths': int(payoff.size),
+        'share_repaid': round(float(np.isfinite(payoff).mean()), 4),
+        'total_interest': bands(combined['total_interest']),
+        'payoff_date': dates(payoff),
+        'refixes': {
+            'date': [str(d) for d in add_periods(first, ppy, starts)],
+            'rate': refix_bands(combined['rate']),
+            'repayment': refix_bands(combined['repayment']),
+        },
+    }
+
+
+class SimulationRunner:
+    """Runs simulations as chunked jobs on a process pool, keyed by the caller.
+
+    `submit` returns immediately; callers poll `status`. At most `max_jobs`
+    jobs run (or wait for a worker) at once; past that submit refuses new
+    ones. Finished results are kept in an LRU of `max_results` entries, and
+    failures for `failure_ttl` seconds (at most `max_results` of them).
+    `cancel` drops queued chunks (a chunk already running finishes but its
+    result is discarded). The pool uses the spawn start method so workers
+    never inherit the server's threads, DuckDB handles or locks.
+    """
+
+    def __init__(self, max_workers=None, max_results=32, max_jobs=4, failure_ttl=300.0):
+        self.max_workers = max_workers
+        self.max_results = max(1, int(max_results))
+        self.max_jobs = max(1, int(max_jobs))
+        self.failure_ttl = failure_ttl
+        self._executor = None
+        self._jobs = {}
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def _prune_locked(self):
+        """Forget failures older than failure_ttl, and the oldest beyond max_results."""
+        now = time.monotonic()
+        failed = sorted((job['finished'], k) for k, job in self._jobs.items() if job['state'] == 'failed')
+        for n, (finished, key) in enumerate(failed):
+            if now - finished > self.failure_ttl or len(failed) - n > self.max_results:
+                del self._jobs[key]
+
+    def status(self, key):
+        """{'state': 'done'|'running'|'failed'|'cancelled', ...} for `key`, or None if unknown."""
+        with self._lock:
+            self._prune_locked()
+            if key in self._results:
+                self._results.move_to_end(key)
+                return {'state': 'done', 'result': self._results[key]}
+            job = self._jobs.get(key)
+            if job is None:
+                return None
+            return {'state': job['state'], 'progress': round(job['done'] / job['total'], 3), 'error': job['error']}
+
+    def submit(self, key, plan, params):
+        """Start simulating unless `key` is already done, running or failed; returns status(key).
+
+        Returns None, without starting anything, when `max_jobs` jobs are
+        already running. A failed job is remembered (and reported by status)
+        for failure_ttl seconds or until clear() drops it, so a deterministic
+        failure is not rerun on every poll.
+        """
+        with self._lock:
+            self._prune_locked()
+            if key not in self._results and key not in self._jobs:
+                if sum(job['state'] == 'running' for job in self._jobs.values()) >= self.max_jobs:
+                    return None
+                sizes = [CHUNK_PATHS] * (params['paths'] // CHUNK_PATHS)
+                if params['paths'] % CHUNK_PATHS:
+                    sizes.append(params['paths'] % CHUNK_PATHS)
+                seeds = np.random.SeedSequence(params['seed']).spawn(len(sizes))
+                job = {'state': 'running', 'done': 0, 'total': len(sizes), 'error': None, 'finished': None,
+                       'chunks': [None] * len(sizes), 'futures': []}
+                self._jobs[key] = job
+                pool = self._pool()
+                for i, (size, seed) in enumerate(zip(sizes, seeds)):
+                    future = pool.submit(simulate_chunk, plan, params, size, seed)
+                    future.add_done_callback(lambda f, i=i: self._chunk_done(key, job, i, f, plan, params))
+                    job['futures'].append(future)
+        return self.status(key)
+
+    def _chunk_done(self, key, job, index, future, plan, params):
+        try:
+            chunk = future.result()
+        except CancelledError:
+            return
+        except Exception as e:
+            logging.error(f"Monte Carlo chunk failed for {key}: {e}")
+            self._fail(job, e)
+            return
+        with self._lock:
+            if job['state'] != 'running':
+                return
+            job['chunks'][index] = chunk
+            job['done'] += 1
+            if job['done'] < job['total']:
+                return
+            chunks = job['chunks']
+        try:
+            result = summarize(plan, params, chunks)
+        except Exception as e:
+            logging.error(f"Summarizing Monte Carlo paths failed for {key}: {e}")
+            self._fail(job, e)
+            return
+        with self._lock:
+            if job['state'] != 'running':
+                return
+            self._results[key] = result
+            while len(self._results) > self.max_results:
+                self._results.popitem(last=False)
+            if self._jobs.get(key) is job:
+                del self._jobs[key]
+
+    def _fail(self, job, error):
+        with self._lock:
+            if job['state'] != 'running':
+                return
+            job['state'], job['error'], job['finished'] = 'failed', str(error), time.monotonic()
+            for future in job['futures']:
+                future.cancel()
+
+    def cancel(self, key):
+        """Cancel a running job; returns False when there is none."""
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job['state'] != 'running':
+                return False
+            job['state'] = 'cancelled'
+            for future in job['futures']:
+                future.cancel()
+            del self._jobs[key]
+            return True
+
+    def clear(self, keep=lambda key: False):
+        """Drop finished results and failures whose key does not satisfy `keep` (e.g. an old data version)."""
+        with self._lock:
+            for key in [k for k in self._results if not keep(k)]:
+                del self._results[key]
+            for key in [k for k, job in self._jobs.items() if job['state'] != 'running' and not keep(k)]:
+                del self._jobs[key]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
@@ -0,0 +1,52 @@
+"""Production entry point: `python -m dashboard.serve`.
+
+Runs the ASGI app (dashboard/asgi.py) under uvicorn with DASHBOARD_WORKERS
+processes (default: one per CPU). Each worker opens its own DuckDB pool and
+response cache and warms them before it counts as ready; `/ready` only
+passes once every worker has, via a shared directory of per-worker markers.
+Computed responses also go to a SQLite store all workers share
+(RESPONSE_CACHE_PATH), so each payload is computed once per host.
+New snapshots are picked up and re-warmed inside each worker without a
+restart; `kill -HUP` on the supervisor restarts the workers one at a time
+for a code deploy.
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import uvicorn
+import uvicorn.config
+
+
+def main():
+    workers = int(os.environ.get('DASHBOARD_WORKERS') or os.cpu_count() or 1)
+    log_level = (os.environ.get('LOG_LEVEL') or 'INFO').strip().lower()
+    if log_level not in uvicorn.config.LOG_LEVELS:
+        print(f"Unknown LOG_LEVEL {os.environ['LOG_LEVEL']!r}; using INFO", file=sys.stderr)
+        log_level = 'info'
+    os.environ['LOG_LEVEL'] = log_level
+    # workers are spawned and import the app after this, so they inherit these
+    os.environ['DASHBOARD_WORKERS'] = str(workers)
+    # one response store for all workers, kept next to the database so restarts start warm
+    os.environ.setdefault('RESPONSE_CACHE_PATH', os.path.join(
+        os.path.dirname(os.environ.get('DUCKDB_PATH') or '/data/akahu.duckdb'), 'dashboard_cache.sqlite'))
+    ready_dir = tempfile.mkdtemp(prefix='dashboard-ready-')
+    os.environ['DASHBOARD_READY_DIR'] = ready_dir
+    try:
+        uvicorn.run(
+            'dashboard.asgi:asgi_app',
+            host=os.environ.get('HOST', '0.0.0.0'),
+            port=int(os.environ.get('PORT', 8001)),
+            workers=workers,
+            log_level=log_level,
+            access_log=os.environ.get('ACCESS_LOG', '0').lower() in ('1', 'true', 'yes'),
+            proxy_headers=True,
+            timeout_graceful_shutdown=int(os.environ.get('GRACEFUL_SHUTDOWN_SECONDS', 30)),
+        )
+    finally:
+        shutil.rmtree(ready_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""Per-household state for serving several DuckDB databases from one process.
+
+Each tenant (household) has its own database, and with it its own connection
+pool, schema prefix, data version, response cache and mart cache (see
+`Tenant` in app.py). TenantRegistry keeps the recently used ones open in an
+LRU bounded by `max_open`:
+
+- `get(name)` opens a tenant on first use (the factory returns None for an
+  unknown name) and marks it as most recently used;
+- tenants unused for `idle_timeout` seconds, and the least recently used ones
+  beyond `max_open`, are closed: their DuckDB connection is released and their
+  in-memory caches dropped. A tenant with a cursor checked out is skipped and
+  considered again on the next call.
+
+A closed tenant stays closed (its pool refuses to reopen), so code still
+holding it looks it up again here and gets a freshly opened one; the shared
+response tier (RESPONSE_CACHE_PATH) keeps its payloads across that.
+"""
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Tenant names become directory names: no separators, dots or empty strings.
+TENANT_NAME = re.compile(r'[A-Za-z0-9][A-Za-z0-9_-]{0,63}')
+
+
+def valid_tenant_name(name):
+    return bool(name) and TENANT_NAME.fullmatch(name) is not None
+
+
+class TenantRegistry:
+    """LRU of open tenants built by `factory(name)`, closing idle and excess ones."""
+
+    def __init__(self, factory, max_open=64, idle_timeout=300.0):
+        self.factory = factory
+        self.max_open = max(1, int(max_open))
+        self.idle_timeout = idle_timeout
+        self._open = OrderedDict()  # name -> (tenant, last used)
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.evictions = 0
+
+    def get(self, name):
+        """The open tenant `name`, opening it if needed; None for an unknown tenant."""
+        if not valid_tenant_name(name):
+            return None
+        now = time.monotonic()
+        with self._lock:
+            if name in self._open and self._open[name][0].closed:
+                del self._open[name]  # closed directly rather than evicted
+            if name in self._open:
+                tenant, _ = self._open[name]
+                self._open[name] = (tenant, now)
+                self._open.move_to_end(name)
+                closing = self._evict_locked(now)
+            else:
+                tenant, closing = None, []
+        if tenant is None:
+            tenant = self.factory(name)
+            if tenant is None:
+                return None
+            with self._lock:
+                if name in self._open:  # opened concurrently; keep the first one
+                    closing = [tenant]
+                    tenant, _ = self._open[name]
+                else:
+                    self.opened += 1
+                    closing = []
+                self._open[name] = (tenant, now)
+                self._open.move_to_end(name)
+                closing += self._evict_locked(now)
+        for stale in closing:
+            self._close(stale)
+        return tenant
+
+    def _evict_locked(self, now):
+        """Unregister idle tenants and those over max_open; returns them for closing."""
+        evicted = []
+        for name, (tenant, used) in list(self._open.items()):
+            over = len(self._open) > self.max_open
+            idle = self.idle_timeout and now - used > self.idle_timeout
+            if not over and not idle:
+                break  # the rest were used more recently
+            if tenant.busy():
+                continue
+            del self._open[name]
+            evicted.append(tenant)
+        self.evictions += len(evicted)
+        return evicted
+
+    def evict_idle(self):
+        """Close tenants idle for longer than idle_timeout (called periodically)."""
+        with self._lock:
+            closing = self._evict_locked(time.monotonic())
+        for tenant in closing:
+            self._close(tenant)
+        return len(closing)
+
+    @staticmethod
+    def _close(tenant):
+        try:
+            tenant.close()
+            logging.info(f"Closed tenant {tenant.name}")
+        except Exception as e:
+            logging.error(f"Closing tenant {tenant.name} failed: {e}")
+
+    def names(self):
+        with self._lock:
+            return list(self._open)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "open": len(self._open),
+                "max_open": self.max_open,
+                "idle_timeout": self.idle_timeout,
+                "opened": self.opened,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,29 @@
+{#
+  Roll a daily model up to `grain` ('week' or 'month') buckets.
+
+  Each bucket keeps its last observed day as `snapshot_date` and, for every
+  column in `measures`, the value on that day (same column name) plus
+  `<col>_min`, `<col>_max` and `<col>_avg` over the bucket. `carry` columns
+  only keep their last value. Rows are written sorted so the dashboard's
+  range and per-account filters can prune row groups.
+#}
+{% macro rollup(relation, grain, measures, carry=[], partition_by=[]) %}
+select
+  {% for col in partition_by %}{{ col }},
+  {% endfor %}date_trunc('{{ grain }}', snapshot_date)::date as bucket_start,
+  max(snapshot_date) as snapshot_date,
+  count(*) as day_count,
+  {%- for col in measures %}
+  arg_max_null({{ col }}, snapshot_date) as {{ col }},
+  min({{ col }}) as {{ col }}_min,
+  max({{ col }}) as {{ col }}_max,
+  avg({{ col }}) as {{ col }}_avg,
+  {%- endfor %}
+  {%- for col in carry %}
+  arg_max_null({{ col }}, snapshot_date) as {{ col }},
+  {%- endfor %}
+  max(_dlt_load_id) as _dlt_load_id
+from {{ relation }}
+group by {% for col in partition_by %}{{ col }}, {% endfor %}bucket_start
+order by {% for col in partition_by %}{{ col }}, {% endfor %}snapshot_date
+{% endmacro %}
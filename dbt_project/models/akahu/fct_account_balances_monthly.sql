@@ -0,0 +1,10 @@
+{{ config(materialized='table') }}
+
+-- Monthly rollup of fct_account_daily_balances: one row per account and month holding the
+-- closing (last day), min, max and average balances. The dashboard serves granularity=month from here.
+{{ rollup(
+    ref('fct_account_daily_balances'), 'month',
+    measures=['current_balance', 'available_balance', 'credit_limit'],
+    carry=['currency'],
+    partition_by=['account_id'],
+) }}
@@ -0,0 +1,10 @@
+{{ config(materialized='table') }}
+
+-- Weekly rollup of fct_account_daily_balances: one row per account and week holding the
+-- closing (last day), min, max and average balances. The dashboard serves granularity=week from here.
+{{ rollup(
+    ref('fct_account_daily_balances'), 'week',
+    measures=['current_balance', 'available_balance', 'credit_limit'],
+    carry=['currency'],
+    partition_by=['account_id'],
+) }}
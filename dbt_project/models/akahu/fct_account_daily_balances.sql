@@ -1,8 +1,25 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key=['account_id', 'snapshot_date'],
+    on_schema_change='fail'
+) }}
 
 -- If multiple loads happen within the same day, take the latest snapshot for that day/account to avoid double counting.
+-- Incremental runs rebuild only the (account_id, snapshot_date) pairs that received rows in a load newer than
+-- anything already in this table; all rows for those pairs are re-ranked so the dedup stays correct.
+-- Run `dbt build --full-refresh` (or the Dagster job with full_refresh: true) after schema changes.
+-- Rows are written sorted by (account_id, snapshot_date) so each row group covers a narrow account_id
+-- range and per-account lookups can skip the rest via DuckDB's min/max zone maps.
 with balances as (
   select * from {{ ref('stg_akahu_account_balances') }}
+  {% if is_incremental() %}
+  where (account_id, snapshot_date) in (
+    select (account_id, snapshot_date)
+    from {{ ref('stg_akahu_account_balances') }}
+    where _dlt_load_id > (select coalesce(max(_dlt_load_id), '') from {{ this }})
+  )
+  {% endif %}
 ), ranked as (
   select
     account_id,
@@ -42,3 +59,4 @@ select
   _dlt_load_id
 from ranked
 where rn = 1
+order by account_id, snapshot_date
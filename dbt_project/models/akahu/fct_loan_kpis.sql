@@ -0,0 +1,58 @@
+{{ config(materialized='table') }}
+
+-- Headline KPIs per snapshot_date, built once per pipeline run so the dashboard
+-- reads a single row instead of re-deriving them on every request.
+-- monthly_change compares against the last snapshot before the start of that
+-- snapshot's month (i.e. the closing value of the previous month with data).
+-- The loan balance and weighted rate carry each loan's last known balance
+-- forward to every snapshot_date (an asof join over a date spine), so a loan
+-- with no snapshot on a given day still counts and the latest row matches the
+-- latest balance per loan. dim_loan_accounts only holds each loan's current
+-- rate, so historical rows weight today's rates by that day's balances.
+with totals as (
+  select snapshot_date, total_net_debt from {{ ref('fct_mortgage_over_time') }}
+), month_close as (
+  select
+    date_trunc('month', snapshot_date) as month_start,
+    arg_max(total_net_debt, snapshot_date) as closing_net_debt
+  from totals
+  group by 1
+), prev_month as (
+  select
+    month_start,
+    lag(closing_net_debt) over (order by month_start) as prev_net_debt
+  from month_close
+), loan_balances as (
+  select b.account_id, b.snapshot_date, abs(b.current_balance) as balance, l.loan_interest_rate
+  from {{ ref('fct_account_daily_balances') }} b
+  join {{ ref('dim_loan_accounts') }} l using (account_id)
+  where upper(coalesce(b.account_type,'')) = 'LOAN' and coalesce(b.is_credit_card,false) = false
+), spine as (
+  select d.snapshot_date, a.account_id
+  from (select distinct snapshot_date from totals) d
+  cross join (select distinct account_id from loan_balances) a
+), carried as (
+  select s.snapshot_date, b.balance, b.loan_interest_rate
+  from spine s
+  asof join loan_balances b
+    on s.account_id = b.account_id and s.snapshot_date >= b.snapshot_date
+), weighted as (
+  select
+    snapshot_date,
+    sum(balance) as total_loan_balance,
+    case when sum(balance) > 0
+         then sum(loan_interest_rate * balance) / sum(balance)
+         else null end as weighted_interest_rate
+  from carried
+  group by snapshot_date
+)
+select
+  t.snapshot_date,
+  abs(coalesce(t.total_net_debt, 0)) as total_net_debt,
+  abs(coalesce(t.total_net_debt, 0)) - abs(coalesce(p.prev_net_debt, 0)) as monthly_change,
+  w.total_loan_balance,
+  w.weighted_interest_rate
+from totals t
+join prev_month p on p.month_start = date_trunc('month', t.snapshot_date)
+left join weighted w using (snapshot_date)
+order by t.snapshot_date
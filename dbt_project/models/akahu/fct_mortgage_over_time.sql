@@ -1,7 +1,21 @@
-{{ config(materialized='table') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key='snapshot_date',
+    on_schema_change='fail'
+) }}
 
+-- Incremental runs re-aggregate only the snapshot dates touched by loads newer than the latest
+-- _dlt_load_id already folded into this table (all accounts for those dates are re-summed).
 with daily as (
   select * from {{ ref('fct_account_daily_balances') }}
+  {% if is_incremental() %}
+  where snapshot_date in (
+    select snapshot_date
+    from {{ ref('fct_account_daily_balances') }}
+    where _dlt_load_id > (select coalesce(max(_dlt_load_id), '') from {{ this }})
+  )
+  {% endif %}
 )
 select
   snapshot_date,
@@ -9,7 +23,8 @@ select
   sum(case when coalesce(is_credit_card,false) = true then coalesce(current_balance,0) else 0 end) as total_creditcard_balance,
   sum(coalesce(current_balance,0)) as total_net_debt,
   sum(case when upper(coalesce(account_type,'')) = 'LOAN' and coalesce(is_credit_card,false) = false then coalesce(available_balance,0) else 0 end) as total_available,
-  sum(case when upper(coalesce(account_type,'')) = 'LOAN' and coalesce(is_credit_card,false) = false then coalesce(credit_limit,0) else 0 end) as total_limit
+  sum(case when upper(coalesce(account_type,'')) = 'LOAN' and coalesce(is_credit_card,false) = false then coalesce(credit_limit,0) else 0 end) as total_limit,
+  max(_dlt_load_id) as _dlt_load_id
 from daily
 group by snapshot_date
 order by snapshot_date
@@ -0,0 +1,8 @@
+{{ config(materialized='table') }}
+
+-- Monthly rollup of fct_mortgage_over_time: one row per month holding the closing (last day),
+-- min, max and average of each total. The dashboard serves granularity=month from here.
+{{ rollup(
+    ref('fct_mortgage_over_time'), 'month',
+    measures=['total_mortgage_balance', 'total_creditcard_balance', 'total_net_debt', 'total_available', 'total_limit'],
+) }}
@@ -1,7 +1,21 @@
-{{ config(materialized='view') }}
+{{ config(
+    materialized='incremental',
+    incremental_strategy='delete+insert',
+    unique_key=['account_id', 'snapshot_date', '_dlt_load_id'],
+    on_schema_change='fail'
+) }}
 
+-- Typed, persisted staging: balances are typed at load time by dlt column hints,
+-- so the casts below are no-ops for new loads (try_cast keeps older text/double
+-- columns readable). Incremental runs only pick up rows from loads newer than
+-- the latest one already staged. Every load's rows are kept (a restated day has
+-- one row per load), so the key includes `_dlt_load_id` and an incremental run
+-- matches a full refresh; `fct_account_daily_balances` picks the latest load.
 with src as (
     select * from {{ source('akahu_raw', 'account_balances') }}
+    {% if is_incremental() %}
+    where _dlt_load_id > (select coalesce(max(_dlt_load_id), '') from {{ this }})
+    {% endif %}
 )
 select
   account_id,
@@ -16,9 +30,9 @@ select
   connection_name,
   status,
   currency,
-  nullif(current::text,'')::numeric as current_balance,
-  nullif(available::text,'')::numeric as available_balance,
-  nullif("limit"::text,'')::numeric as credit_limit,
+  try_cast(current as numeric) as current_balance,
+  try_cast(available as numeric) as available_balance,
+  try_cast("limit" as numeric) as credit_limit,
   overdrawn::boolean as overdrawn,
   refreshed_balance_at::timestamptz as refreshed_balance_at,
   _dlt_load_id
@@ -1,6 +1,10 @@
-{{ config(materialized='view') }}
+{{ config(materialized='table') }}
 
--- Flatten key account fields; retain loan details for mortgage analysis
+-- Flatten key account fields; retain loan details for mortgage analysis.
+-- Persisted as a table so the casts run once per build instead of on every read
+-- (the dashboard's accounts endpoint queries this model directly). The loan
+-- fields are typed at load time by dlt column hints, so the casts below are
+-- no-ops for new loads; try_cast keeps older text/double columns readable.
 with src as (
     select * from {{ source('akahu_raw', 'accounts') }}
 )
@@ -14,17 +18,17 @@ select
   end as is_credit_card,
   status,
   -- Flattened loan details columns generated by dlt
-  nullif(meta__loan_details__interest__rate::text,'')::numeric as loan_interest_rate,
+  try_cast(meta__loan_details__interest__rate as decimal(18, 6)) as loan_interest_rate,
   meta__loan_details__interest__type as loan_interest_type,
-  nullif(meta__loan_details__interest__expires_at::text,'')::timestamptz as loan_interest_expires_at,
-  nullif(meta__loan_details__is_interest_only::text,'')::boolean as is_interest_only,
-  nullif(meta__loan_details__term__years::text,'')::int as term_years,
-  nullif(meta__loan_details__term__months::text,'')::int as term_months,
-  nullif(meta__loan_details__matures_at::text,'')::timestamptz as loan_matures_at,
-  nullif(meta__loan_details__initial_principal::text,'')::numeric as loan_initial_principal,
+  try_cast(meta__loan_details__interest__expires_at as timestamptz) as loan_interest_expires_at,
+  try_cast(meta__loan_details__is_interest_only as boolean) as is_interest_only,
+  try_cast(meta__loan_details__term__years as int) as term_years,
+  try_cast(meta__loan_details__term__months as int) as term_months,
+  try_cast(meta__loan_details__matures_at as timestamptz) as loan_matures_at,
+  try_cast(meta__loan_details__initial_principal as numeric) as loan_initial_principal,
   meta__loan_details__repayment__frequency as repayment_frequency,
-  nullif(meta__loan_details__repayment__next_date::text,'')::timestamptz as repayment_next_date,
-  coalesce(nullif(meta__loan_details__repayment__next_amount::text,'')::numeric, meta__loan_details__repayment__next_amount__v_double::numeric) as repayment_next_amount,
+  try_cast(meta__loan_details__repayment__next_date as timestamptz) as repayment_next_date,
+  coalesce(try_cast(meta__loan_details__repayment__next_amount as numeric), meta__loan_details__repayment__next_amount__v_double::numeric) as repayment_next_amount,
   _dlt_load_id
 from src
 where _id is not null
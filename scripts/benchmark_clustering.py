@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""Benchmark per-account balance lookups on clustered vs unclustered storage.
+
+Builds a synthetic `fct_account_daily_balances` for a range of history lengths,
+written twice: once in arbitrary (shuffled) order and once sorted by
+(account_id, snapshot_date) as the dbt model and published snapshot write it.
+It then times the query behind `/api/akahu/account_balances/<account_id>`
+against both, fetching columns as numpy arrays (the `format=columnar` path) so
+Python object conversion does not drown out the scan.
+
+DuckDB keeps min/max statistics per row group (~122k rows), so sorting only pays
+off once a table spans several row groups; with a shuffled table every row
+group holds every account and none can be skipped. Synthetic ids mimic Akahu's
+random `acc_...` ids; DuckDB's string statistics only cover a short prefix, so
+sequential ids like acc_00001 would defeat the zone maps.
+
+Usage: python3 scripts/benchmark_clustering.py [--accounts 200] [--years 1 5 10 20] [--runs 50]
+"""
+import argparse
+import hashlib
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+import duckdb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dashboard.app import account_series_sql  # noqa: E402
+
+
+def build(path, accounts, days, clustered):
+    order = "account_id, snapshot_date" if clustered else "random()"
+    conn = duckdb.connect(path)
+    conn.execute("select setseed(0.42)")
+    conn.execute(f"""
+        create table fct_account_daily_balances as
+        select
+          'acc_' || left(md5(a::varchar), 21) as account_id,
+          (date '2000-01-01' + d::int) as snapshot_date,
+          (-500000 + d * 10 + a)::decimal(18, 3) as current_balance,
+          0::decimal(18, 3) as available_balance,
+          0::decimal(18, 3) as credit_limit,
+          'NZD' as currency
+        from range({accounts}) t(a), range({days}) s(d)
+        order by {order}
+    """)
+    conn.close()
+
+
+def time_lookups(path, account_ids, runs):
+    conn = duckdb.connect(path, read_only=True)
+    samples = []
+    for account_id in account_ids[:runs]:
+        sql, params = account_series_sql([account_id])
+        start = time.perf_counter()
+        conn.execute(sql, params).fetchnumpy()
+        samples.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--years", type=int, nargs="+", default=[1, 5, 10, 20])
+    parser.add_argument("--runs", type=int, default=50)
+    args = parser.parse_args()
+
+    ids = [f"acc_{hashlib.md5(str(a).encode()).hexdigest()[:21]}" for a in range(args.accounts)]
+    print(f"{'years':>5} {'rows':>10} {'unclustered p50/max ms':>24} {'clustered p50/max ms':>22} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in args.years:
+            days = years * 365
+            results = []
+            for clustered in (False, True):
+                path = os.path.join(tmp, f"{years}_{int(clustered)}.duckdb")
+                build(path, args.accounts, days, clustered)
+                sample = random.Random(years).sample(ids, len(ids))
+                time_lookups(path, sample, 3)  # warm up
+                results.append(time_lookups(path, sample, args.runs))
+            (u50, umax), (c50, cmax) = results
+            print(f"{years:>5} {args.accounts * days:>10} {u50:>14.2f} / {umax:>7.2f} "
+                  f"{c50:>12.2f} / {cmax:>7.2f} {u50 / c50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,9 @@
 """Create minimal DBT-like views/tables in the DuckDB used by the dashboard for local/dev runs.
 
 This script is intended to be a convenience for development and testing: it creates
-`stg_akahu_accounts`, `fct_account_daily_balances`, `fct_mortgage_over_time`, and
-`dim_loan_accounts` derived from the mock `akahu_prod` schema produced by
-`scripts/generate_mock_data.py`.
+`stg_akahu_accounts`, `fct_account_daily_balances`, `fct_mortgage_over_time`,
+`dim_loan_accounts`, `fct_loan_kpis` and the week/month rollups derived from the
+mock `akahu_prod` schema produced by `scripts/generate_mock_data.py`.
 
 Run: python3 scripts/create_minimal_views.py
 """
@@ -79,16 +79,106 @@ def main():
     ORDER BY snapshot_date
     """)
 
-    # dim_loan_accounts: basic dim table with loan interest rate for loans only
+    # dim_loan_accounts: loan attributes for LOAN accounts only (same columns as the dbt model)
     conn.execute("""
     CREATE OR REPLACE VIEW dim_loan_accounts AS
     SELECT
       account_id,
-      loan_interest_rate::DOUBLE AS loan_interest_rate
+      account_name,
+      account_type,
+      status,
+      loan_interest_rate::DOUBLE AS loan_interest_rate,
+      loan_interest_type,
+      loan_interest_expires_at,
+      is_interest_only,
+      term_years,
+      term_months,
+      loan_matures_at,
+      loan_initial_principal,
+      repayment_frequency,
+      repayment_next_date,
+      repayment_next_amount
     FROM stg_akahu_accounts
     WHERE upper(coalesce(account_type,'')) = 'LOAN'
     """)
 
+    # fct_loan_kpis: per-date headline KPIs (same logic as the dbt model)
+    conn.execute("""
+    CREATE OR REPLACE VIEW fct_loan_kpis AS
+    WITH totals AS (
+      SELECT snapshot_date, total_net_debt FROM fct_mortgage_over_time
+    ), month_close AS (
+      SELECT date_trunc('month', snapshot_date) AS month_start,
+             arg_max(total_net_debt, snapshot_date) AS closing_net_debt
+      FROM totals
+      GROUP BY 1
+    ), prev_month AS (
+      SELECT month_start, lag(closing_net_debt) OVER (ORDER BY month_start) AS prev_net_debt
+      FROM month_close
+    ), loan_balances AS (
+      SELECT b.account_id, b.snapshot_date, abs(b.current_balance) AS balance, l.loan_interest_rate
+      FROM fct_account_daily_balances b
+      JOIN dim_loan_accounts l USING (account_id)
+      WHERE upper(coalesce(b.account_type,'')) = 'LOAN' AND coalesce(b.is_credit_card, false) = false
+    ), spine AS (
+      SELECT d.snapshot_date, a.account_id
+      FROM (SELECT DISTINCT snapshot_date FROM totals) d
+      CROSS JOIN (SELECT DISTINCT account_id FROM loan_balances) a
+    ), carried AS (
+      SELECT s.snapshot_date, b.balance, b.loan_interest_rate
+      FROM spine s
+      ASOF JOIN loan_balances b ON s.account_id = b.account_id AND s.snapshot_date >= b.snapshot_date
+    ), weighted AS (
+      SELECT snapshot_date,
+             SUM(balance) AS total_loan_balance,
+             CASE WHEN SUM(balance) > 0
+                  THEN SUM(loan_interest_rate * balance) / SUM(balance)
+                  ELSE NULL END AS weighted_interest_rate
+      FROM carried
+      GROUP BY snapshot_date
+    )
+    SELECT
+      t.snapshot_date,
+      abs(coalesce(t.total_net_debt, 0)) AS total_net_debt,
+      abs(coalesce(t.total_net_debt, 0)) - abs(coalesce(p.prev_net_debt, 0)) AS monthly_change,
+      w.total_loan_balance,
+      w.weighted_interest_rate
+    FROM totals t
+    JOIN prev_month p ON p.month_start = date_trunc('month', t.snapshot_date)
+    LEFT JOIN weighted w USING (snapshot_date)
+    ORDER BY t.snapshot_date
+    """)
+
+    # week/month rollups (same shape as the dbt `rollup` macro output)
+    measures = {
+        "fct_mortgage_over_time": ["total_mortgage_balance", "total_creditcard_balance", "total_net_debt", "total_available", "total_limit"],
+        "fct_account_daily_balances": ["current_balance", "available_balance", "credit_limit"],
+    }
+    rollups = [
+        ("fct_mortgage_over_time_weekly", "fct_mortgage_over_time", "week", []),
+        ("fct_mortgage_over_time_monthly", "fct_mortgage_over_time", "month", []),
+        ("fct_account_balances_weekly", "fct_account_daily_balances", "week", ["account_id"]),
+        ("fct_account_balances_monthly", "fct_account_daily_balances", "month", ["account_id"]),
+    ]
+    for name, source, grain, partition_by in rollups:
+        stats = ",\n      ".join(
+            f"arg_max_null({c}, snapshot_date) AS {c}, min({c}) AS {c}_min, max({c}) AS {c}_max, avg({c}) AS {c}_avg"
+            for c in measures[source]
+        )
+        carry = ",\n      arg_max_null(currency, snapshot_date) AS currency" if partition_by else ""
+        keys = "".join(f"{c}, " for c in partition_by)
+        conn.execute(f"""
+        CREATE OR REPLACE VIEW {name} AS
+        SELECT
+          {keys}date_trunc('{grain}', snapshot_date)::DATE AS bucket_start,
+          max(snapshot_date) AS snapshot_date,
+          count(*) AS day_count,
+          {stats}{carry}
+        FROM {source}
+        GROUP BY {keys}bucket_start
+        ORDER BY {keys}snapshot_date
+        """)
+
     conn.close()
     print(f"Created development views in {DB}")
 
@@ -0,0 +1,89 @@
+from datetime import date
+
+import numpy as np
+
+from dashboard.amortization import add_periods, amortize, evaluate_scenarios, project
+
+
+def _loop(balance, rates, payments):
+    """Reference per-period simulation for one loan."""
+    b, interest, periods = balance, 0.0, -1
+    for k, (r, p) in enumerate(zip(rates, payments), start=1):
+        i = b * r
+        interest += i
+        b = b + i - p
+        if b < 0.005:
+            periods = k
+            break
+    return periods, interest
+
+
+def test_amortize_matches_loop():
+    rng = np.random.default_rng(7)
+    balance = rng.uniform(50_000, 800_000, 20)
+    rates = np.repeat(rng.uniform(0.02, 0.09, 20)[:, None] / 12, 480, axis=1)
+    rates[:, 36:] += 0.01 / 12  # a rate change part way through
+    payments = np.repeat(rng.uniform(2_000, 6_000, 20)[:, None], 480, axis=1)
+    result = amortize(balance, rates, payments)
+    for i in range(len(balance)):
+        periods, interest = _loop(balance[i], rates[i], payments[i])
+        assert result['periods'][i] == periods
+        if periods > 0:
+            assert np.isclose(result['total_interest'][i], interest)
+            assert np.isclose(result['total_paid'][i], balance[i] + interest)
+
+
+def test_add_periods_clamps_month_end():
+    dates = add_periods(np.datetime64('2026-01-31'), 12, np.arange(3))
+    assert [str(d) for d in dates] == ['2026-01-31', '2026-02-28', '2026-03-31']
+    assert str(add_periods(np.datetime64('2026-01-31'), 26, 2)) == '2026-02-28'
+
+
+def test_project_annuity_and_interest_only():
+    loans = [
+        {'account_id': 'a', 'current_balance': -500000, 'loan_interest_rate': 6.0, 'repayment_frequency': 'MONTHLY',
+         'repayment_next_date': date(2026, 11, 15), 'loan_matures_at': date(2051, 10, 15)},
+        {'account_id': 'b', 'current_balance': -200000, 'loan_interest_rate': 5.2, 'repayment_frequency': 'weekly',
+         'is_interest_only': True, 'repayment_next_date': date(2026, 10, 20), 'loan_matures_at': date(2027, 10, 14)},
+    ]
+    annuity, interest_only = project(loans, as_of=date(2026, 10, 17))
+    assert annuity['payment'] == 3221.51
+    assert annuity['periods_remaining'] == 300 and annuity['payoff_date'] == '2051-10-15'
+    assert interest_only['payoff_date'] == '2027-10-12'
+    assert interest_only['schedule']['balance'][-2:] == [200000.0, 0.0]
+    assert np.isclose(interest_only['total_interest'], 200000 * 0.052 / 52 * interest_only['periods_remaining'])
+
+
+def test_scenarios_match_individual_projections():
+    as_of = date(2026, 10, 17)
+    loan = {'account_id': 'a', 'current_balance': -400000, 'loan_interest_rate': 6.5, 'repayment_frequency': 'monthly',
+            'repayment_next_amount': 2600, 'repayment_next_date': date(2026, 11, 1)}
+    baseline, scenarios = evaluate_scenarios(
+        [loan], as_of, extra=[0, 300], lump_sum=[0, 25000], refix_rate=[None, 5.0], frequency=[None, 'fortnightly'])
+    assert len(scenarios) == 16
+    assert baseline['total_interest'] == project([loan], as_of, schedule=False)[0]['total_interest']
+
+    for s in scenarios:
+        changed = dict(loan, current_balance=-(400000 - s['lump_sum']))
+        if s['refix_rate'] is not None:
+            changed['loan_interest_rate'] = s['refix_rate']  # no fixed-rate expiry: applies straight away
+        if s['frequency']:
+            changed['repayment_frequency'] = s['frequency']
+            changed['repayment_next_amount'] = 2600 * 12 / 26
+        changed['repayment_next_amount'] += s['extra']
+        expected = project([changed], as_of, schedule=False)[0]
+        assert np.isclose(s['total_interest'], expected['total_interest'])
+        assert s['payoff_date'] == expected['payoff_date']
+        assert np.isclose(s['interest_saved'], baseline['total_interest'] - expected['total_interest'])
+
+
+def test_scenarios_are_evaluated_in_bounded_chunks(monkeypatch):
+    as_of = date(2026, 10, 17)
+    loans = [{'account_id': a, 'current_balance': -b, 'loan_interest_rate': 6.0, 'repayment_frequency': 'weekly',
+              'repayment_next_amount': 700, 'repayment_next_date': date(2026, 10, 20)}
+             for a, b in (('a', 300000), ('b', 150000))]
+    axes = dict(extra=[0, 50, 100], lump_sum=[0, 10000], frequency=[None, 'monthly'])
+    whole = evaluate_scenarios(loans, as_of, **axes)
+    # two loans x 50 years of weekly repayments: one scenario per chunk
+    monkeypatch.setattr('dashboard.amortization.MAX_GRID_CELLS', 2 * 50 * 52)
+    assert evaluate_scenarios(loans, as_of, **axes) == whole
@@ -1,9 +1,15 @@
+import asyncio
+import json
 import os
 import subprocess
 import sys
+import time
+from datetime import date, timedelta
+from email.utils import parsedate_to_datetime
+import pyarrow as pa
 import pytest
 
-from dashboard.app import app as flask_app
+from dashboard.app import app as flask_app, series_source
 
 
 def ensure_mock_db():
@@ -68,3 +74,575 @@ def test_accounts_ok(client):
         keys = set(j[0].keys())
         assert 'account_id' in keys
         assert 'is_credit_card' in keys
+
+
+def test_cached_response_etag_and_304(client):
+    r1 = client.get("/api/akahu/mortgage_over_time")
+    assert r1.status_code == 200
+    etag = r1.headers.get("ETag")
+    assert etag and not etag.startswith("W/")
+
+    r2 = client.get("/api/akahu/mortgage_over_time")
+    assert r2.headers.get("X-Cache") == "HIT"
+    assert r2.headers.get("ETag") == etag
+    assert r2.get_data() == r1.get_data()
+
+    r3 = client.get("/api/akahu/mortgage_over_time", headers={"If-None-Match": etag})
+    assert r3.status_code == 304
+    assert r3.get_data() == b""
+
+    stats = client.get("/api/cache/stats").get_json()
+    assert stats["hits"] >= 2
+    assert stats["not_modified"] >= 1
+
+
+def _date(value):
+    return parsedate_to_datetime(value).date()
+
+
+def test_mortgage_over_time_month_buckets_keep_last_value(client):
+    daily = client.get("/api/akahu/mortgage_over_time").get_json()
+    monthly = client.get("/api/akahu/mortgage_over_time?granularity=month").get_json()
+    assert 0 < len(monthly) < len(daily)
+
+    last_per_month = {}
+    for row in daily:
+        d = _date(row["snapshot_date"])
+        last_per_month[(d.year, d.month)] = row
+    assert monthly == sorted(last_per_month.values(), key=lambda r: _date(r["snapshot_date"]))
+
+
+def test_rollups_match_query_time_buckets(client):
+    accounts = client.get("/api/akahu/accounts").get_json()
+    # an end date that cuts through a week and a month forces query-time bucketing
+    unaligned = "2999-12-28"
+    for path in ("/api/akahu/mortgage_over_time", f"/api/akahu/account_balances/{accounts[0]['account_id']}"):
+        for granularity in ("week", "month"):
+            served = client.get(f"{path}?granularity={granularity}").get_json()
+            computed = client.get(f"{path}?granularity={granularity}&to={unaligned}").get_json()
+            assert served and served == computed
+    assert series_source("fct_mortgage_over_time", "month")[0].endswith("fct_mortgage_over_time_monthly")
+    assert series_source("fct_mortgage_over_time", "month", date_to=date.fromisoformat(unaligned))[1] == "month"
+
+
+def test_series_range_and_validation(client):
+    daily = client.get("/api/akahu/mortgage_over_time").get_json()
+    start, end = _date(daily[1]["snapshot_date"]), _date(daily[3]["snapshot_date"])
+    r = client.get(f"/api/akahu/mortgage_over_time?from={start.isoformat()}&to={end.isoformat()}")
+    assert r.status_code == 200
+    assert r.get_json() == daily[1:4]
+
+    assert client.get("/api/akahu/mortgage_over_time?granularity=year").status_code == 400
+    assert client.get("/api/akahu/mortgage_over_time?from=yesterday").status_code == 400
+
+
+def test_bulk_account_balances_matches_single_account(client):
+    accounts = client.get("/api/akahu/accounts").get_json()
+    ids = [a["account_id"] for a in accounts][:2]
+    r = client.get(f"/api/akahu/account_balances?account_ids={','.join(ids)}&granularity=week")
+    assert r.status_code == 200
+    bulk = r.get_json()["accounts"]
+    assert set(bulk) <= set(ids)
+    for account_id, cols in bulk.items():
+        rows = client.get(f"/api/akahu/account_balances/{account_id}?granularity=week").get_json()
+        assert cols["snapshot_date"] == [row["snapshot_date"] for row in rows]
+        assert cols["current_balance"] == [row["current_balance"] for row in rows]
+
+    everything = client.get("/api/akahu/account_balances?account_ids=all").get_json()["accounts"]
+    assert set(bulk) <= set(everything)
+
+
+def test_dashboard_bootstrap_matches_individual_endpoints(client):
+    r = client.get("/api/akahu/dashboard")
+    assert r.status_code == 200
+    j = r.get_json()
+    assert j["ok"] is True
+    assert j["mortgage_over_time"] == client.get("/api/akahu/mortgage_over_time").get_json()
+    assert j["accounts"] == client.get("/api/akahu/accounts").get_json()
+    assert j["account_balances"] == client.get("/api/akahu/account_balances").get_json()["accounts"]
+
+    kpis = client.get("/api/akahu/loan_kpis").get_json()
+    assert j["kpis"]["total_net_debt"] == pytest.approx(kpis["total_net_debt"])
+    assert j["kpis"]["monthly_change"] == pytest.approx(kpis["monthly_change"])
+    assert j["kpis"]["weighted_interest_rate"] == pytest.approx(kpis["weighted_interest_rate"])
+
+    lean = client.get("/api/akahu/dashboard?include_balances=0").get_json()
+    assert "account_balances" not in lean
+
+
+def test_columnar_and_arrow_formats(client):
+    rows = client.get("/api/akahu/mortgage_over_time").get_json()
+
+    r = client.get("/api/akahu/mortgage_over_time?format=columnar")
+    assert r.status_code == 200
+    j = r.get_json()
+    assert j["row_count"] == len(rows)
+    assert j["types"]["snapshot_date"] == "DATE"
+    assert j["columns"]["total_net_debt"] == pytest.approx([row["total_net_debt"] for row in rows])
+    assert all(len(d) == 10 for d in j["columns"]["snapshot_date"])
+
+    r = client.get("/api/akahu/mortgage_over_time?format=arrow")
+    assert r.status_code == 200
+    assert r.mimetype == "application/vnd.apache.arrow.stream"
+    tbl = pa.ipc.open_stream(r.get_data()).read_all()
+    assert tbl.num_rows == len(rows)
+    assert pa.types.is_date32(tbl.schema.field("snapshot_date").type)
+
+    bulk = client.get("/api/akahu/account_balances").get_json()["accounts"]
+    col = client.get("/api/akahu/account_balances?format=columnar").get_json()["accounts"]
+    assert set(col) == set(bulk)
+    for account_id, cols in col.items():
+        assert cols["current_balance"] == pytest.approx(bulk[account_id]["current_balance"])
+
+    assert client.get("/api/akahu/accounts?format=xml").status_code == 400
+
+
+def test_ndjson_streaming_releases_connection(client):
+    from dashboard.app import DB_POOL
+
+    rows = client.get("/api/akahu/mortgage_over_time?format=columnar").get_json()
+    r = client.get("/api/akahu/mortgage_over_time?format=ndjson")
+    assert r.status_code == 200
+    assert r.mimetype == "application/x-ndjson"
+    lines = [json.loads(line) for line in r.get_data(as_text=True).splitlines()]
+    r.close()
+    assert [line["snapshot_date"] for line in lines] == rows["columns"]["snapshot_date"]
+    assert DB_POOL._in_use == 0
+
+    assert client.get("/api/akahu/accounts?format=ndjson").status_code == 400
+
+
+def test_ndjson_streaming_on_a_closed_pool(client, monkeypatch):
+    import dashboard.app as dashboard_app
+
+    monkeypatch.setattr(dashboard_app.RESPONSE_CACHE, "max_entries", 0)
+    sources = []
+    series_sql = dashboard_app.series_sql
+
+    def recording_series_sql(source, *args, **kwargs):
+        sources.append(source)
+        return series_sql(source, *args, **kwargs)
+
+    monkeypatch.setattr(dashboard_app, "series_sql", recording_series_sql)
+    for path in ("/api/akahu/mortgage_over_time", "/api/akahu/account_balances/acc_mortgage_1"):
+        dashboard_app.DB_POOL.close_idle()  # the schema and tables are detected again on reopen
+        with client.get(f"{path}?format=ndjson&granularity=month") as r:
+            assert r.status_code == 200 and r.get_data()
+    # built after the pool reopened, so the monthly rollups were found
+    assert [source.endswith("_monthly") for source in sources] == [True, True]
+
+
+def test_max_points_downsamples_series(client):
+    daily = client.get("/api/akahu/mortgage_over_time").get_json()
+    r = client.get("/api/akahu/mortgage_over_time?max_points=12")
+    assert r.status_code == 200
+    thin = r.get_json()
+    assert len(thin) <= 12 < len(daily)
+    assert thin[0] == daily[0] and thin[-1] == daily[-1]
+
+    col = client.get("/api/akahu/mortgage_over_time?format=columnar&max_points=12&downsample=minmax").get_json()
+    assert col["row_count"] == len(col["columns"]["snapshot_date"]) <= 12
+
+    bulk = client.get("/api/akahu/account_balances?max_points=12").get_json()["accounts"]
+    assert all(len(cols["snapshot_date"]) <= 12 for cols in bulk.values())
+
+    assert client.get("/api/akahu/mortgage_over_time?max_points=12&format=arrow").status_code == 400
+    assert client.get("/api/akahu/mortgage_over_time?max_points=1").status_code == 400
+
+
+def test_loan_kpis_history_ends_at_current_kpis(client):
+    kpis = client.get("/api/akahu/loan_kpis").get_json()
+    r = client.get("/api/akahu/loan_kpis/history")
+    assert r.status_code == 200
+    history = r.get_json()
+    assert history
+    assert history[-1]["total_net_debt"] == pytest.approx(kpis["total_net_debt"])
+    assert history[-1]["monthly_change"] == pytest.approx(kpis["monthly_change"])
+
+
+def test_projection(client):
+    r = client.get("/api/akahu/projection")
+    assert r.status_code == 200
+    j = r.get_json()
+    for loan in j["loans"]:
+        schedule = loan["schedule"]
+        assert len(schedule["date"]) == len(schedule["balance"]) == (loan["periods_remaining"] or len(schedule["date"]))
+        if loan["payoff_date"]:
+            assert schedule["date"][-1] == loan["payoff_date"] and schedule["balance"][-1] == 0
+    summary = client.get("/api/akahu/projection?schedule=0").get_json()
+    assert all("schedule" not in loan for loan in summary["loans"])
+    assert client.get("/api/akahu/projection?years=500").status_code == 400
+
+
+def test_scenarios(client):
+    r = client.get("/api/akahu/scenarios?extra=0,250,500&lump_sum=0,20000&refix_rate=current,3.9&frequency=current,weekly")
+    assert r.status_code == 200
+    j = r.get_json()
+    assert len(j["scenarios"]) == 24
+    unchanged = j["scenarios"][0]
+    assert unchanged["interest_saved"] == 0 and unchanged["total_interest"] == j["baseline"]["total_interest"]
+    more = [s for s in j["scenarios"] if s["lump_sum"] == 0 and s["refix_rate"] is None and s["frequency"] is None]
+    assert [s["extra"] for s in more] == [0, 250, 500]
+    assert more[0]["interest_saved"] < more[1]["interest_saved"] < more[2]["interest_saved"]
+
+    assert client.get("/api/akahu/scenarios?frequency=daily").status_code == 400
+    assert client.get("/api/akahu/scenarios?extra=" + ",".join(["1"] * 5001)).status_code == 400
+
+
+def test_montecarlo(client, monkeypatch):
+    from dashboard.app import MONTE_CARLO
+
+    url = "/api/akahu/montecarlo/acc_mortgage_1?paths=2000&seed=3"
+    r = client.get(url)
+    for _ in range(600):
+        if r.status_code != 202:
+            break
+        assert 0 <= r.get_json()["progress"] <= 1
+        time.sleep(0.1)
+        r = client.get(url)
+    assert r.status_code == 200
+    j = r.get_json()
+    assert j["paths"] == 2000 and j["params"]["seed"] == 3
+    assert j["total_interest"]["p5"] <= j["total_interest"]["p95"]
+    assert len(j["refixes"]["date"]) == len(j["refixes"]["rate"]["p50"])
+    assert client.get(url).headers["X-Cache"] == "HIT"
+
+    assert client.get("/api/akahu/montecarlo/acc_unknown").status_code == 404
+    assert client.get("/api/akahu/montecarlo/acc_mortgage_1?paths=0").status_code == 400
+    assert client.delete(url).status_code == 404  # finished, nothing to cancel
+
+    monkeypatch.setattr(MONTE_CARLO, "max_jobs", 0)
+    busy = client.get("/api/akahu/montecarlo/acc_mortgage_1?paths=2000&seed=4")
+    assert busy.status_code == 503 and busy.headers["Retry-After"]
+    assert client.get(url).status_code == 200  # finished results are still served
+
+
+def _asgi_get(app, path, query=b"", headers=()):
+    """Run one GET through an ASGI app; returns (status, headers, body)."""
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "GET", "path": path, "query_string": query, "root_path": "",
+             "headers": [(k.encode(), v.encode()) for k, v in headers], "http_version": "1.1"}
+    asyncio.run(app(scope, receive, send))
+    start = sent[0]
+    return (start["status"], {k.decode().lower(): v.decode() for k, v in start["headers"]},
+            b"".join(m.get("body", b"") for m in sent[1:]))
+
+
+def test_asgi_serves_api_natively(client):
+    from dashboard.asgi import asgi_app
+
+    status, headers, body = _asgi_get(asgi_app, "/api/akahu/mortgage_over_time", b"granularity=month")
+    assert status == 200 and json.loads(body)
+    # now cached: answered on the event loop, with revalidation
+    status, headers, cached = _asgi_get(asgi_app, "/api/akahu/mortgage_over_time", b"granularity=month")
+    assert status == 200 and headers["x-cache"] == "HIT" and cached == body
+    status, _, _ = _asgi_get(asgi_app, "/api/akahu/mortgage_over_time", b"granularity=month",
+                             [("If-None-Match", headers["etag"])])
+    assert status == 304
+
+    status, headers, body = _asgi_get(asgi_app, "/api/akahu/account_balances/acc_mortgage_1", b"format=ndjson")
+    assert status == 200 and headers["content-type"].startswith("application/x-ndjson")
+    assert all(json.loads(line) for line in body.splitlines())
+
+    status, _, _ = _asgi_get(asgi_app, "/api/akahu/mortgage_over_time", b"granularity=bogus")
+    assert status == 400
+
+
+def test_asgi_rejects_when_saturated(client):
+    from dashboard.asgi import AsyncDashboard
+
+    app = AsyncDashboard(flask_app.wsgi_app, None, workers=1, max_pending=0)
+    app._in_flight = 1  # one request already running
+    status, headers, _ = _asgi_get(app, "/api/akahu/loan_kpis", b"uncached=1")
+    assert status == 503 and headers["retry-after"] == "1"
+
+    # a request still sending its body holds its slot
+    app._in_flight = 0
+    scope = {"type": "http", "method": "POST", "path": "/api/akahu/loan_kpis", "query_string": b"", "root_path": "",
+             "headers": [], "http_version": "1.1"}
+
+    async def scenario():
+        gate = asyncio.Event()
+        sent = []
+
+        async def slow_receive():
+            await gate.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        first = asyncio.create_task(app(scope, slow_receive, send))
+        await asyncio.sleep(0.2)
+        assert app._in_flight == 1
+        await app(scope, slow_receive, send)
+        assert sent[0]["status"] == 503
+        gate.set()
+        await first
+        assert app._in_flight == 0
+
+    asyncio.run(scenario())
+
+
+def test_events_stream_changes_without_a_thread(client):
+    from dashboard.asgi import EVENTS_PATH, AsyncDashboard, DataEvents
+
+    latest = client.get("/api/akahu/dashboard").get_json()["latest_snapshot_date"]
+    since = (date.fromisoformat(latest) - timedelta(days=2)).isoformat()
+    events = DataEvents(heartbeat=0.05)
+    app = AsyncDashboard(flask_app.wsgi_app, None, workers=2, events=events)
+    sent = []
+
+    async def scenario():
+        gone = asyncio.Event()
+
+        async def receive():
+            await gone.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            sent.append(message)
+
+        await events.publish(app.executor())  # first data version: nothing to send yet
+        assert events.latest.isoformat() == latest
+        scope = {"type": "http", "method": "GET", "path": EVENTS_PATH, "query_string": f"since={since}".encode(),
+                 "root_path": "", "headers": [], "http_version": "1.1"}
+        stream = asyncio.create_task(app(scope, receive, send))
+        await asyncio.sleep(0.3)
+        assert len(events.subscribers) == 1
+        # a new data version whose rows start at `since`
+        events.latest, events._published = date.fromisoformat(since), None
+        await events.publish(app.executor())
+        await asyncio.sleep(0.1)
+        gone.set()
+        await stream
+        assert not events.subscribers
+
+    asyncio.run(scenario())
+    assert sent[0]["status"] == 200 and (b"content-type", b"text/event-stream") in sent[0]["headers"]
+    stream = b"".join(m.get("body", b"") for m in sent[1:]).decode()
+    assert ": keepalive" in stream
+    changes = [json.loads(block.split("data: ", 1)[1]) for block in stream.split("\n\n") if "event: changes" in block]
+    assert len(changes) == 2  # the catch-up on connect, then the pushed update
+    for payload in changes:
+        assert payload["since"] == since and payload["latest_snapshot_date"] == latest
+        dates = [parsedate_to_datetime(r["snapshot_date"]).date() for r in payload["mortgage_over_time"]]
+        assert dates and min(dates).isoformat() == since
+        assert payload["account_balances"] and payload["kpis"]
+    assert client.get(f"/api/akahu/changes?since={since}").get_json() == changes[0]
+
+
+def test_warm_up_fills_cache_and_readiness(client):
+    from dashboard.app import ACCOUNT_WARM_PATH, RESPONSE_CACHE, WARM_PATHS, warm_up
+
+    assert warm_up() is not None
+    assert client.get("/ready").status_code == 200
+    r = client.get(WARM_PATHS[0])
+    assert r.status_code == 200 and r.headers["X-Cache"] == "HIT"
+    assert RESPONSE_CACHE.stats()["entries"] >= len(WARM_PATHS)
+    account_id = client.get("/api/akahu/accounts").get_json()[0]["account_id"]
+    r = client.get(ACCOUNT_WARM_PATH.format(account_id=account_id, granularity="week"))
+    assert r.status_code == 200 and r.headers["X-Cache"] == "HIT"
+
+
+def test_pipeline_sentinel_invalidates_and_rewarms(client, tmp_path, monkeypatch):
+    import dashboard.app as dashboard_app
+    from dashboard.app import RESPONSE_CACHE, WARM_UP_PENDING, data_version
+    from dashboard.asgi import AsyncDashboard
+
+    sentinel = tmp_path / "data_version.json"
+    monkeypatch.setattr(dashboard_app, "DATA_VERSION_SENTINEL", str(sentinel))
+    app = AsyncDashboard(flask_app.wsgi_app, None, workers=2, poll_interval=0.05)
+
+    async def scenario():
+        watcher = asyncio.create_task(app._watch_snapshots())
+        try:
+            while WARM_UP_PENDING.is_set() or not RESPONSE_CACHE.stats()["entries"]:
+                await asyncio.sleep(0.05)
+            RESPONSE_CACHE.put("stale", data_version(), b"old", "text/plain")
+            monkeypatch.setattr(dashboard_app.MARTS, "_rejected", data_version())
+            sentinel.write_text(json.dumps({"run_id": "run-1", "snapshot_version": None}))
+            deadline = time.monotonic() + 30
+            while (RESPONSE_CACHE.get("stale", data_version(), record_miss=False, use_shared=False) is not None
+                   or RESPONSE_CACHE.stats()["entries"] < len(dashboard_app.WARM_PATHS)):
+                assert time.monotonic() < deadline
+                await asyncio.sleep(0.05)
+        finally:
+            watcher.cancel()
+
+    WARM_UP_PENDING.set()
+    asyncio.run(scenario())
+    app.executor().shutdown(wait=True)  # let an in-progress warm-up finish
+    assert dashboard_app.MARTS._rejected is None  # the mart cache was cleared too
+    assert client.get(dashboard_app.WARM_PATHS[0]).headers["X-Cache"] == "HIT"
+
+
+def test_probes_answer_from_memory(client, monkeypatch):
+    from dashboard.app import RESPONSE_CACHE, HealthMonitor
+
+    class SharedTier:
+        def stats(self):
+            raise AssertionError("/health must not scan the shared cache")
+
+    assert client.get("/live").get_json()["ok"] is True
+    with monkeypatch.context() as m:
+        m.setattr(RESPONSE_CACHE, "shared", SharedTier())
+        health = client.get("/health").get_json()
+    assert health["ok"] and health["latest_snapshot_date"] and health["last_error"] is None
+    assert "hits" in health["cache"] and "shared" not in health["cache"]
+    assert client.get("/ready").status_code == 200
+
+    monitor = HealthMonitor(interval=3600)
+    assert monitor.snapshot()["ok"]
+
+    def broken(version):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(monitor, "_check", broken)
+    monitor.refresh()  # file unchanged: no database work
+    assert monitor.snapshot()["ok"]
+    monitor.refresh(force=True)
+    state = monitor.snapshot()
+    assert not state["ok"] and state["last_error"]["error"] == "boom"
+    assert state["latest_snapshot_date"] == health["latest_snapshot_date"]
+
+
+def _tenant_headers(name, secret="proxy-secret"):
+    from dashboard.app import tenant_signature
+
+    return {"X-Tenant": name, "X-Tenant-Signature": tenant_signature(name, secret)}
+
+
+def test_tenants_have_isolated_databases_and_caches(client, tmp_path, monkeypatch):
+    import shutil
+
+    import duckdb
+
+    import dashboard.app as dashboard_app
+    from dashboard.asgi import asgi_app
+
+    source = ensure_mock_db()
+    for name in ("alpha", "beta"):
+        (tmp_path / name).mkdir()
+        shutil.copy(source, tmp_path / name / "akahu.duckdb")
+    conn = duckdb.connect(str(tmp_path / "beta" / "akahu.duckdb"))
+    conn.execute("delete from akahu_prod.account_balances where snapshot_date > "
+                 "(select max(snapshot_date) - 10 from akahu_prod.account_balances)")
+    conn.close()
+    default = client.get("/api/akahu/dashboard").get_json()["latest_snapshot_date"]
+    monkeypatch.setattr(dashboard_app, "TENANTS_DIR", str(tmp_path))
+    monkeypatch.setattr(dashboard_app, "TENANT_SECRET", "proxy-secret")
+
+    def latest(tenant):
+        return client.get("/api/akahu/dashboard", headers=_tenant_headers(tenant)).get_json()["latest_snapshot_date"]
+
+    assert latest("alpha") == default
+    assert date.fromisoformat(latest("beta")) < date.fromisoformat(default)
+    # the same URL is cached per tenant
+    kpis = {t: client.get("/api/akahu/loan_kpis", headers=_tenant_headers(t)) for t in ("alpha", "beta")}
+    assert kpis["alpha"].get_json() != kpis["beta"].get_json()
+    assert client.get("/api/akahu/loan_kpis", headers=_tenant_headers("beta")).headers["X-Cache"] == "HIT"
+    status, headers, body = _asgi_get(asgi_app, "/api/akahu/loan_kpis", headers=_tenant_headers("beta").items())
+    assert status == 200 and headers["x-cache"] == "HIT" and json.loads(body) == kpis["beta"].get_json()
+
+    # no tenant, a bare or forged header, or another household's signature: rejected
+    forged = _tenant_headers("alpha", secret="guess")
+    stolen = {"X-Tenant": "alpha", "X-Tenant-Signature": _tenant_headers("beta")["X-Tenant-Signature"]}
+    for rejected in ({}, {"X-Tenant": "alpha"}, forged, stolen):
+        assert client.get("/api/akahu/loan_kpis", headers=rejected).status_code == 401
+        assert _asgi_get(asgi_app, "/api/akahu/loan_kpis", headers=rejected.items())[0] == 401
+    assert _asgi_get(asgi_app, "/api/akahu/events")[0] == 401
+    assert client.get("/live").status_code == 200  # probes need no tenant
+
+    assert client.get("/api/akahu/accounts", headers=_tenant_headers("gamma")).status_code == 404
+    assert client.get("/api/akahu/accounts", headers=_tenant_headers("../alpha")).status_code == 404
+    assert {"alpha", "beta"} <= set(dashboard_app.TENANTS.names())
+    stats = client.get("/api/cache/stats", headers=_tenant_headers("alpha")).get_json()
+    assert stats["tenants"]["open"] >= 2
+    for name in ("alpha", "beta"):
+        dashboard_app.TENANTS.get(name).close()
+
+
+def test_evicted_tenant_is_not_reopened(client, tmp_path, monkeypatch):
+    import shutil
+
+    import dashboard.app as dashboard_app
+
+    (tmp_path / "alpha").mkdir()
+    shutil.copy(ensure_mock_db(), tmp_path / "alpha" / "akahu.duckdb")
+    monkeypatch.setattr(dashboard_app, "TENANTS_DIR", str(tmp_path))
+    monkeypatch.setattr(dashboard_app, "TENANT_SECRET", "proxy-secret")
+    with flask_app.test_request_context(headers=_tenant_headers("alpha")):
+        dashboard_app.resolve_tenant()
+        stale = dashboard_app.current_tenant()
+        cur = stale.pool.acquire()
+        monkeypatch.setattr(dashboard_app.TENANTS, "idle_timeout", 1e-9)
+        dashboard_app.TENANTS.evict_idle()
+        assert "alpha" in dashboard_app.TENANTS.names()  # a cursor is checked out
+        # evicted after this request resolved it
+        stale.pool.release(cur)
+        dashboard_app.TENANTS.evict_idle()
+        assert stale.closed and stale.pool._base is None
+        assert stale.pool.acquire() is None  # never reopened
+        fresh = dashboard_app.current_tenant()
+        assert fresh is not stale and fresh.name == "alpha"
+        with dashboard_app.db_connection() as conn:
+            assert conn is not None
+        # closing with a cursor out releases the database once it is handed back
+        cur = fresh.pool.acquire()
+        fresh.close()
+        assert fresh.pool._base is not None
+        fresh.pool.release(cur)
+        assert fresh.pool._base is None
+
+
+def test_mart_cache_matches_duckdb(client, monkeypatch):
+    from dashboard.app import MARTS, RESPONSE_CACHE
+
+    monkeypatch.setattr(RESPONSE_CACHE, "max_entries", 0)
+    urls = ["/api/akahu/accounts", "/api/akahu/accounts?format=columnar", "/api/akahu/loan_kpis",
+            "/api/akahu/dashboard?granularity=week&max_points=50", "/api/akahu/projection?schedule=0"]
+    for query in ["", "granularity=week", "granularity=month&from=2026-05-03&to=2026-08-20", "from=2999-01-01"]:
+        for fmt in ["json", "columnar", "ndjson"]:
+            urls.append(f"/api/akahu/mortgage_over_time?{query}&format={fmt}")
+            urls.append(f"/api/akahu/account_balances/acc_mortgage_1?{query}&format={fmt}")
+        urls.append(f"/api/akahu/account_balances?{query}&account_ids=acc_mortgage_1,acc_check_1")
+        urls.append(f"/api/akahu/account_balances?{query}&format=columnar&max_points=20")
+
+    def body(url):
+        with client.get(url) as r:  # closing releases a streamed response's cursor
+            return r.get_data()
+
+    from_duckdb = [body(u) for u in urls]
+    monkeypatch.setattr(MARTS, "enabled", True)
+    from_memory = [body(u) for u in urls]
+    assert MARTS.stats()["bytes"] > 0
+    for url, expected, actual in zip(urls, from_duckdb, from_memory):
+        assert actual == expected, url
+
+    arrow_memory = pa.ipc.open_stream(client.get("/api/akahu/mortgage_over_time?format=arrow").get_data()).read_all()
+    monkeypatch.setattr(MARTS, "enabled", False)
+    arrow_duckdb = pa.ipc.open_stream(client.get("/api/akahu/mortgage_over_time?format=arrow").get_data()).read_all()
+    assert arrow_memory.equals(arrow_duckdb)
+
+
+def test_invalid_log_level_falls_back_to_info():
+    from dashboard.app import log_level
+    assert log_level("debug") == 10 and log_level(" Warning ") == 30
+    assert log_level("verbose") is None
+    # importing the app with a bad LOG_LEVEL must not fail
+    repo_root = os.path.dirname(os.path.dirname(__file__))
+    env = dict(os.environ, LOG_LEVEL="verbose")
+    code = "import logging, dashboard.app; print(logging.getLogger().level)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=repo_root, env=env,
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split()[-1] == "20"
+    assert "Unknown LOG_LEVEL 'verbose'" in result.stderr
@@ -0,0 +1,60 @@
+import sqlite3
+
+from dashboard.cache import ResponseCache, SharedCache
+
+
+def test_lru_eviction_and_version_invalidation():
+    cache = ResponseCache(max_entries=2)
+    cache.put("a", "v1", b"A", "application/json")
+    cache.put("b", "v1", b"B", "application/json")
+    assert cache.get("a", "v1")[0] == b"A"  # touch 'a' so 'b' is least recent
+    cache.put("c", "v1", b"C", "application/json")
+    assert cache.get("b", "v1") is None
+    assert cache.stats()["evictions"] == 1
+
+    # a new data version drops everything computed from the old one
+    assert cache.get("a", "v2") is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_etag_depends_on_version():
+    cache = ResponseCache(max_entries=4)
+    e1 = cache.put("a", "v1", b"A", "application/json")[1]
+    e2 = cache.put("a", "v2", b"A", "application/json")[1]
+    assert e1 != e2
+
+
+def test_shared_store_across_processes_and_restarts(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    worker_a = ResponseCache(max_entries=4, shared=SharedCache(path))
+    worker_b = ResponseCache(max_entries=4, shared=SharedCache(path))
+    entry = worker_a.put("a", "v1", b"A", "application/json")
+    assert worker_b.get("a", "v1") == entry
+    assert worker_b.stats()["shared_hits"] == 1
+    assert worker_b.get("a", "v2") is None
+
+    restarted = ResponseCache(max_entries=4, shared=SharedCache(path))
+    assert restarted.get("a", "v1") == entry
+
+
+def test_shared_store_evicts_least_recently_used(tmp_path):
+    shared = SharedCache(str(tmp_path / "cache.sqlite"), max_bytes=10)
+    for i, key in enumerate("abc"):
+        shared.put(key, "v1", (b"x" * 4, f"e{i}", "application/json"))
+    assert shared.get("a", "v1") is None
+    assert shared.get("c", "v1") is not None
+    assert shared.stats()["bytes"] <= 10
+
+
+def test_shared_store_keeps_a_running_byte_total(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    worker_a, worker_b = SharedCache(path, max_bytes=100), SharedCache(path, max_bytes=100)
+    worker_a.put("a", "v1", (b"x" * 30, "e1", "application/json"))
+    worker_b.put("b", "v1", (b"x" * 30, "e2", "application/json"))
+    worker_a.put("a", "v1", (b"x" * 10, "e3", "application/json"))  # replaced
+    worker_b.put("c", "v1", (b"x" * 70, "e4", "application/json"))  # evicts b, the least recently used
+    conn = sqlite3.connect(path)
+    actual = conn.execute("select coalesce(sum(size), 0) from responses").fetchone()[0]
+    conn.close()
+    assert worker_a.stats()["bytes"] == actual == 80
+    assert worker_a.get("a", "v1")[0] == b"x" * 10 and worker_a.get("b", "v1") is None
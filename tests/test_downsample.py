@@ -0,0 +1,31 @@
+import numpy as np
+
+from dashboard.downsample import lttb_indices, minmax_indices, select_indices
+
+
+def _series(n=5000):
+    x = np.arange(n, dtype=np.float64)
+    y = np.sin(x / 200.0) * 1000 + x
+    y[n // 4] = 50000  # a spike that must survive
+    return x, y
+
+
+def test_lttb_keeps_endpoints_and_budget():
+    x, y = _series()
+    idx = lttb_indices(x, y, 300)
+    assert len(idx) == 300
+    assert idx[0] == 0 and idx[-1] == len(x) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert len(x) // 4 in idx
+
+
+def test_minmax_keeps_extremes():
+    x, y = _series()
+    idx = minmax_indices(x, y, 300)
+    assert len(idx) <= 300
+    assert int(np.argmax(y)) in idx and int(np.argmin(y)) in idx
+
+
+def test_select_indices_short_series_untouched():
+    x, y = _series(50)
+    assert np.array_equal(select_indices(x, [y], 100), np.arange(50))
@@ -0,0 +1,73 @@
+import duckdb
+
+from dashboard.marts import MartBudget, MartCache, MartSnapshot
+
+QUERIES = {
+    'balances': """
+        select 'acc_' || (a % 3) as account_id, date '2026-01-01' + d::int as snapshot_date, (a * 1000 + d)::double as current_balance
+        from range(3) t(a), range(120) s(d)
+        order by account_id, snapshot_date
+    """,
+}
+
+
+def _load(version='v1'):
+    conn = duckdb.connect()
+    try:
+        return MartSnapshot.load(conn, version, QUERIES)
+    finally:
+        conn.close()
+
+
+def test_series_matches_sql_bucketing():
+    marts = _load()
+    conn = duckdb.connect()
+    conn.execute(f"create table balances as {QUERIES['balances']}")
+    for granularity in ('day', 'week', 'month'):
+        qualify = ''
+        if granularity != 'day':
+            qualify = (f"qualify row_number() over (partition by account_id, date_trunc('{granularity}', snapshot_date) "
+                       "order by snapshot_date desc) = 1")
+        expected = conn.execute(f"""
+            select account_id, snapshot_date, current_balance from balances
+            where account_id in ('acc_0', 'acc_2') and snapshot_date between date '2026-01-10' and date '2026-03-03'
+            {qualify}
+            order by account_id, snapshot_date
+        """).fetchall()
+        cur = marts.series('balances', ['account_id', 'snapshot_date', 'current_balance'], granularity,
+                           '2026-01-10', '2026-03-03', ['acc_2', 'acc_0'])
+        assert cur.fetchall() == expected
+    conn.close()
+
+
+def test_cache_reloads_per_version_and_respects_cap():
+    loads = []
+
+    def loader(version):
+        loads.append(version)
+        return _load(version)
+
+    cache = MartCache(loader, enabled=True)
+    assert cache.get('v1') is cache.get('v1')
+    assert cache.get('v2').version == 'v2'
+    assert loads == ['v1', 'v2']
+
+    capped = MartCache(loader, enabled=True, max_bytes=1)
+    assert capped.get('v3') is None and capped.get('v3') is None
+    assert loads[-1] == 'v3' and loads.count('v3') == 1
+
+
+def test_budget_bounds_all_caches_together():
+    size = _load('v1').nbytes
+    budget = MartBudget(max_bytes=2 * size)
+    a, b, c = (MartCache(_load, enabled=True, budget=budget) for _ in range(3))
+    assert a.get('v1') and b.get('v1')
+    a.get('v1')  # b is now the least recently used
+    assert c.get('v1')
+    assert budget.stats()["bytes"] <= 2 * size and budget.stats()["evictions"] == 1
+    assert a._snapshot is not None and b._snapshot is None
+    c.clear()
+    assert budget.stats()["caches"] == 1
+
+    tiny = MartCache(_load, enabled=True, budget=MartBudget(max_bytes=1))
+    assert tiny.get('v1') is None and tiny.stats()["bytes"] == 0
@@ -0,0 +1,105 @@
+import time
+from datetime import date
+
+import numpy as np
+
+from dashboard.amortization import loan_terms, project
+from dashboard.montecarlo import DEFAULTS, SimulationRunner, loan_plan, simulate_chunk, summarize
+
+LOAN = {
+    'account_id': 'acc_1',
+    'current_balance': -500_000,
+    'loan_interest_rate': 6.0,
+    'loan_interest_type': 'FIXED',
+    'loan_interest_expires_at': date(2027, 6, 1),
+    'loan_matures_at': date(2050, 10, 1),
+    'repayment_frequency': 'monthly',
+    'repayment_next_date': date(2026, 11, 1),
+    'repayment_next_amount': 0,
+}
+AS_OF = date(2026, 10, 17)
+
+
+def _wait(runner, key):
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        status = runner.status(key)
+        if status['state'] != 'running':
+            return status
+        time.sleep(0.05)
+    raise AssertionError('simulation did not finish')
+
+
+def test_zero_volatility_matches_projection():
+    plan = loan_plan(loan_terms([LOAN]), AS_OF)
+    params = dict(DEFAULTS, volatility=0.0)
+    result = summarize(plan, params, [simulate_chunk(plan, params, 50, np.random.SeedSequence(0))])
+    expected = project([LOAN], AS_OF, schedule=False)[0]
+    assert result['share_repaid'] == 1
+    assert set(result['payoff_date'].values()) == {expected['payoff_date']}
+    assert np.allclose(list(result['total_interest'].values()), expected['total_interest'])
+    assert result['refixes']['date'][:2] == ['2027-06-01', '2029-06-01']
+    assert set(result['refixes']['rate']['p50']) == {6.0}
+
+
+def test_results_depend_on_seed_not_workers():
+    plan = loan_plan(loan_terms([LOAN]), AS_OF)
+    params = dict(DEFAULTS, paths=4500)
+    results = []
+    for workers in (1, 3):
+        runner = SimulationRunner(max_workers=workers)
+        try:
+            runner.submit('k', plan, params)
+            status = _wait(runner, 'k')
+        finally:
+            runner.shutdown()
+        assert status['state'] == 'done'
+        results.append(status['result'])
+    assert results[0] == results[1]
+    assert results[0]['paths'] == 4500
+    bands = results[0]['total_interest']
+    assert bands['p5'] < bands['p50'] < bands['p95']
+
+
+def test_cancel():
+    plan = loan_plan(loan_terms([LOAN]), AS_OF)
+    runner = SimulationRunner(max_workers=1)
+    try:
+        runner.submit('k', plan, dict(DEFAULTS, paths=100_000))
+        assert runner.cancel('k')
+        assert runner.status('k') is None
+        assert not runner.cancel('k')
+    finally:
+        runner.shutdown()
+
+
+def test_failure_is_kept_until_cleared():
+    runner = SimulationRunner(max_workers=1)
+    try:
+        runner.submit('k', {}, DEFAULTS)  # an empty plan fails in the worker
+        failed = _wait(runner, 'k')
+        assert failed['state'] == 'failed' and failed['error']
+        assert runner.submit('k', {}, DEFAULTS) == failed  # not rerun
+        runner.clear(keep=lambda key: key != 'k')
+        assert runner.status('k') is None
+    finally:
+        runner.shutdown()
+
+
+def test_jobs_are_capped_and_failures_expire(monkeypatch):
+    plan = loan_plan(loan_terms([LOAN]), AS_OF)
+    runner = SimulationRunner(max_workers=1, max_results=2, max_jobs=1, failure_ttl=60)
+    try:
+        assert runner.submit('a', plan, dict(DEFAULTS, paths=100_000))['state'] == 'running'
+        assert runner.submit('b', plan, DEFAULTS) is None  # at capacity
+        assert runner.submit('a', plan, dict(DEFAULTS, paths=100_000))['state'] == 'running'  # known: not refused
+        runner.cancel('a')
+        for key in ('f1', 'f2', 'f3'):
+            runner.submit(key, {}, DEFAULTS)
+            assert _wait(runner, key)['state'] == 'failed'
+        assert runner.status('f1') is None  # only the newest max_results failures are kept
+        now = time.monotonic()
+        monkeypatch.setattr('dashboard.montecarlo.time.monotonic', lambda: now + 61)
+        assert runner.status('f3') is None  # expired
+    finally:
+        runner.shutdown()
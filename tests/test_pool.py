@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+
+import duckdb
+
+from dashboard.app import IDLE_REAPER, ConnectionPool
+
+
+def _write_db(path, value):
+    conn = duckdb.connect(path)
+    conn.execute(f"create or replace table fct_mortgage_over_time as select {value} as total_net_debt")
+    conn.close()
+
+
+def _publish(snapshots, version, value):
+    (snapshots / version).mkdir(parents=True)
+    _write_db(str(snapshots / version / "akahu.duckdb"), value)
+    os.symlink(version, snapshots / ".current")
+    os.replace(snapshots / ".current", snapshots / "current")
+
+
+def test_pool_reuses_cursors(tmp_path, monkeypatch):
+    path = str(tmp_path / "akahu.duckdb")
+    _write_db(path, 1)
+    monkeypatch.setenv("DUCKDB_PATH", path)
+
+    pool = ConnectionPool(size=2, timeout=1.0, idle_timeout=0)
+    cur = pool.acquire()
+    assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (1,)
+    pool.release(cur)
+    assert pool.acquire() is cur
+    pool.release(cur)
+    pool.close_idle()
+
+
+def test_pool_exhaustion_times_out(tmp_path, monkeypatch):
+    path = str(tmp_path / "akahu.duckdb")
+    _write_db(path, 1)
+    monkeypatch.setenv("DUCKDB_PATH", path)
+
+    pool = ConnectionPool(size=1, timeout=0.05, idle_timeout=0)
+    cur = pool.acquire()
+    assert pool.acquire() is None
+    pool.release(cur)
+    pool.close_idle()
+
+
+def test_pool_reopens_replaced_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "akahu.duckdb")
+    _write_db(path, 1)
+    monkeypatch.setenv("DUCKDB_PATH", path)
+
+    pool = ConnectionPool(size=2, timeout=1.0, idle_timeout=0, check_interval=0)
+    cur = pool.acquire()
+    assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (1,)
+    pool.release(cur)
+
+    # the pipeline publishes a new file by atomic rename
+    staged = str(tmp_path / "staged.duckdb")
+    _write_db(staged, 2)
+    os.replace(staged, path)
+
+    cur = pool.acquire()
+    assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (2,)
+    pool.release(cur)
+    pool.close_idle()
+
+
+def test_pool_follows_published_snapshot(tmp_path, monkeypatch):
+    path = str(tmp_path / "akahu.duckdb")
+    _write_db(path, 1)
+    monkeypatch.setenv("DUCKDB_PATH", path)
+    monkeypatch.delenv("DUCKDB_SNAPSHOT_DIR", raising=False)
+    snapshots = tmp_path / "snapshots"
+
+    pool = ConnectionPool(size=2, timeout=1.0, idle_timeout=0, check_interval=0)
+    cur = pool.acquire()
+    # nothing published yet: fall back to the live database
+    assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (1,)
+    pool.release(cur)
+
+    for version, value in (("v1", 2), ("v2", 3)):
+        _publish(snapshots, version, value)
+        cur = pool.acquire()
+        assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (value,)
+        pool.release(cur)
+    pool.close_idle()
+
+
+def test_idle_pool_is_closed_by_the_shared_reaper(tmp_path, monkeypatch):
+    path = str(tmp_path / "akahu.duckdb")
+    _write_db(path, 1)
+    monkeypatch.setenv("DUCKDB_PATH", path)
+
+    pool = ConnectionPool(size=2, timeout=1.0, idle_timeout=30)
+    threads = threading.active_count()
+    for _ in range(20):
+        pool.release(pool.acquire())
+    assert threading.active_count() <= threads + 1  # no thread per release
+    assert pool in IDLE_REAPER._pools
+
+    pool.close_if_idle(now=time.monotonic() + 10)
+    assert pool._base is not None
+    cur = pool.acquire()
+    pool.close_if_idle(now=time.monotonic() + 60)
+    assert pool._base is not None  # a cursor is checked out
+    pool.release(cur)
+    pool.close_if_idle(now=time.monotonic() + 60)
+    assert pool._base is None
+
+
+def test_publish_does_not_wait_for_slow_readers(tmp_path, monkeypatch):
+    path = str(tmp_path / "akahu.duckdb")
+    _write_db(path, 1)
+    monkeypatch.setenv("DUCKDB_PATH", path)
+    monkeypatch.delenv("DUCKDB_SNAPSHOT_DIR", raising=False)
+    snapshots = tmp_path / "snapshots"
+    _publish(snapshots, "v1", 2)
+
+    pool = ConnectionPool(size=2, timeout=5.0, idle_timeout=0, check_interval=0)
+    slow = pool.acquire()  # e.g. a long NDJSON stream
+    assert slow.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (2,)
+    _publish(snapshots, "v2", 3)
+
+    started = time.monotonic()
+    cur = pool.acquire()
+    assert time.monotonic() - started < 1
+    assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (3,)
+    pool.release(cur)
+    # the old snapshot keeps serving its reader, and is closed once it is handed back
+    assert slow.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (2,)
+    assert len(pool._retired) == 1
+    pool.release(slow)
+    assert not pool._retired and pool.acquire() is cur
+    pool.release(cur)
+    pool.close_idle()
+
+
+def test_staleness_check_is_throttled(tmp_path, monkeypatch):
+    path = str(tmp_path / "akahu.duckdb")
+    _write_db(path, 1)
+    monkeypatch.setenv("DUCKDB_PATH", path)
+
+    pool = ConnectionPool(size=2, timeout=1.0, idle_timeout=0, check_interval=3600)
+    pool.release(pool.acquire())
+    version = pool.data_version()
+    staged = str(tmp_path / "staged.duckdb")
+    _write_db(staged, 2)
+    os.replace(staged, path)
+    # within the interval the open database, and its version, are kept
+    cur = pool.acquire()
+    assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (1,)
+    assert pool.data_version() == version
+    pool.release(cur)
+
+    pool.check_interval = 0
+    assert pool.data_version() != version
+    cur = pool.acquire()
+    assert cur.execute("select total_net_debt from fct_mortgage_over_time").fetchone() == (2,)
+    pool.release(cur)
+    pool.close_idle()
@@ -0,0 +1,50 @@
+from dashboard.tenants import TenantRegistry, valid_tenant_name
+
+
+class FakeTenant:
+    def __init__(self, name):
+        self.name = name
+        self.in_use = False
+        self.closed = False
+
+    def busy(self):
+        return self.in_use
+
+    def close(self):
+        self.closed = True
+
+
+def test_registry_keeps_most_recent_tenants_open():
+    opened = {}
+
+    def factory(name):
+        if name == "unknown":
+            return None
+        opened[name] = FakeTenant(name)
+        return opened[name]
+
+    registry = TenantRegistry(factory, max_open=2, idle_timeout=0)
+    a = registry.get("a")
+    assert registry.get("a") is a
+    registry.get("b")
+    registry.get("a")  # b is now the least recently used
+    registry.get("c")
+    assert opened["b"].closed and not a.closed
+    assert registry.names() == ["a", "c"]
+    assert registry.get("unknown") is None
+    assert registry.get("../etc") is None and not valid_tenant_name("a/b")
+    assert registry.stats()["evictions"] == 1
+
+
+def test_registry_closes_idle_tenants_unless_busy(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("dashboard.tenants.time.monotonic", lambda: now[0])
+    registry = TenantRegistry(FakeTenant, max_open=8, idle_timeout=60)
+    a, b = registry.get("a"), registry.get("b")
+    a.in_use = True
+    now[0] += 120
+    assert registry.evict_idle() == 1
+    assert b.closed and not a.closed
+    a.in_use = False
+    assert registry.evict_idle() == 1 and a.closed
+    assert registry.get("a") is not a  # reopened on the next request